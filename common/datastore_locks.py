@@ -351,3 +351,19 @@ class DatastoreLock(object):
 
   def __exit__(self, *unused_args):
     self.Release()
+
+
+def GetHeldLockIds(lock_ids):
+  """Returns which of the given locks are currently held.
+
+  Args:
+    lock_ids: list<str>, The IDs of the locks to check.
+
+  Returns:
+    A set of the IDs of those locks which are acquired and not orphaned.
+  """
+  lock_keys = [ndb.Key(_DatastoreLockEntity, id_) for id_ in lock_ids]
+  lock_entities = ndb.get_multi(lock_keys, use_cache=False, use_memcache=False)
+  return set(
+      lock_entity.key.id() for lock_entity in lock_entities
+      if lock_entity is not None and lock_entity.lock_held)
@@ -28,12 +28,15 @@ from google.appengine.ext import ndb
 from common import memcache_decorator
 from common import datastore_locks
 
+from upvote.gae import settings
 from upvote.gae.bigquery import tables
+from upvote.gae.datastore import metadata_cache
 from upvote.gae.datastore import utils as datastore_utils
 from upvote.gae.datastore.models import base
 from upvote.gae.datastore.models import bit9
 from upvote.gae.datastore.models import host as host_models
 from upvote.gae.datastore.models import rule as rule_models
+from upvote.gae.datastore.models import singleton
 from upvote.gae.datastore.models import user as user_models
 from upvote.gae.datastore.models import utils as model_utils
 from upvote.gae.lib.analysis import metrics
@@ -65,12 +68,29 @@ _PULL_LOCK_MAX_ACQUIRE_ATTEMPTS = 5
 
 _PULL_BATCH_SIZE = 128
 
+# Ranged pulling won't split the backlog into windows smaller than this.
+_PULL_RANGE_MIN_SIZE = 10 * _PULL_BATCH_SIZE
+_PULL_RANGE_LOCK_ID = 'bit9-pull-range-%d'
+_PULL_RANGE_LOCK_MAX_ACQUIRE_ATTEMPTS = 1
+
 # The lock timeout should be just over the 10 minute task queue timeout, to
 # ensure that the lock isn't released prematurely during task execution, but
 # also is not held onto longer than is absolutely necessary.
 _PROCESS_LOCK_TIMEOUT = int(
     datetime.timedelta(minutes=10, seconds=30).total_seconds())
 _PROCESS_LOCK_MAX_ACQUIRE_ATTEMPTS = 1
+_PROCESS_LOCK_ID = 'bit9-process-%d'
+
+# Process tasks are named for their host and the window in which they were
+# dispatched, so that each host is dispatched at most once per window. A window
+# matches the once-a-minute Dispatch cron, so the name only deduplicates
+# overlapping Dispatch runs; hosts whose Process task is still running are
+# instead skipped because they hold their lock.
+_PROCESS_TASK_NAME = 'bit9-process-%d-%d'
+_PROCESS_TASK_WINDOW_SECS = 60
+
+# The number of distinct hosts dispatched at a time.
+_DISPATCH_PAGE_SIZE = 100
 
 _CERT_MEMCACHE_KEY = 'bit9_cert_%s'
 _CERT_MEMCACHE_TIMEOUT = datetime.timedelta(days=7).total_seconds()
@@ -81,6 +101,30 @@ _GET_CERT_ATTEMPTS = 3
 # Done for the sake of brevity.
 _POLICY = constants.RULE_POLICY
 
+# The Bit9 properties which are read when processing an _UnsyncedEvent. All
+# others are dropped from the API responses before they're persisted.
+_EVENT_PROPERTIES = (
+    api.Event.id, api.Event.timestamp, api.Event.subtype,
+    api.Event.description, api.Event.file_name, api.Event.path_name,
+    api.Event.user_name, api.Event.computer_id, api.Event.file_catalog_id)
+_FILE_CATALOG_PROPERTIES = (
+    api.FileCatalog.id, api.FileCatalog.computer_id, api.FileCatalog.sha256,
+    api.FileCatalog.sha256_hash_type, api.FileCatalog.sha1,
+    api.FileCatalog.md5, api.FileCatalog.file_name, api.FileCatalog.path_name,
+    api.FileCatalog.file_type, api.FileCatalog.file_size,
+    api.FileCatalog.file_flags, api.FileCatalog.date_created,
+    api.FileCatalog.company, api.FileCatalog.publisher,
+    api.FileCatalog.product_name, api.FileCatalog.product_version,
+    api.FileCatalog.file_state, api.FileCatalog.publisher_state,
+    api.FileCatalog.certificate_state)
+_COMPUTER_PROPERTIES = (
+    api.Computer.id, api.Computer.name, api.Computer.policy_id,
+    api.Computer.users)
+_CERTIFICATE_PROPERTIES = (
+    api.Certificate.id, api.Certificate.parent_certificate_id,
+    api.Certificate.thumbprint, api.Certificate.thumbprint_algorithm,
+    api.Certificate.valid_from, api.Certificate.valid_to)
+
 
 class Error(Exception):
   """Base error."""
@@ -90,20 +134,53 @@ class MalformedCertificateError(Error):
   """A malformed cert has been received from Bit9."""
 
 
+def _CompactRawDict(raw_dict, props, prefix=None):
+  """Returns the subset of a raw API dict corresponding to the given props."""
+  keys = (
+      prop.name if prefix is None else '_'.join((prefix, prop.name))
+      for prop in props)
+  return {key: raw_dict[key] for key in keys if key in raw_dict}
+
+
+class _UnsyncedCertChain(ndb.Model):
+  """Model for storing a signing chain shared by many _UnsyncedEvents.
+
+  The entity ID is the Bit9 ID of the leaf certificate. These entities aren't
+  deleted once their events are processed, as there's only one per distinct
+  leaf certificate and they're reused by all subsequent events.
+
+  Attributes:
+    signing_chain: List of raw api.Certificate dicts in Leaf->Root order.
+  """
+  signing_chain = ndb.JsonProperty(compressed=True)
+
+  @classmethod
+  def Generate(cls, signing_chain):
+    return cls(
+        id=signing_chain[0].id,
+        signing_chain=[
+            _CompactRawDict(cert.to_raw_dict(), _CERTIFICATE_PROPERTIES)
+            for cert in signing_chain])
+
+
 class _UnsyncedEvent(ndb.Model):
   """Model for storing unsynced Event protobufs.
 
   Attributes:
     event: An api.Event API response dict object with FileCatalog and Computer
-        expansions.
-    signing_chain: List[api.Certificate] the binary's signing chain.
+        expansions, reduced to the properties needed for processing.
+    signing_chain: List[api.Certificate] the binary's signing chain. Only
+        populated on entities written before signing_chain_key was added.
+    signing_chain_key: Key of the _UnsyncedCertChain holding the binary's
+        signing chain, or None if the binary is unsigned.
     occurred_dt: Timestamp of when this event occurred on the client.
     sha256: SHA256 string from the Event proto. Added primarily for easier
         debugging and investigating.
     bit9_id: The Bit9 database entity ID associated with this event.
   """
-  event = ndb.JsonProperty()
-  signing_chain = ndb.JsonProperty()
+  event = ndb.JsonProperty(compressed=True)
+  signing_chain = ndb.JsonProperty(compressed=True)
+  signing_chain_key = ndb.KeyProperty(kind=_UnsyncedCertChain)
   occurred_dt = ndb.DateTimeProperty()
   sha256 = ndb.StringProperty()
   host_id = ndb.IntegerProperty()
@@ -113,26 +190,186 @@ class _UnsyncedEvent(ndb.Model):
   def Generate(cls, event, signing_chain):
     file_catalog = event.get_expand(api.Event.file_catalog_id)
     computer = event.get_expand(api.Event.computer_id)
+
+    raw_event = event._obj_dict  # pylint: disable=protected-access
+    compact_event = _CompactRawDict(raw_event, _EVENT_PROPERTIES)
+    compact_event.update(_CompactRawDict(
+        raw_event, _FILE_CATALOG_PROPERTIES,
+        prefix=api.Event.file_catalog_id.name))
+    compact_event.update(_CompactRawDict(
+        raw_event, _COMPUTER_PROPERTIES, prefix=api.Event.computer_id.name))
+
+    signing_chain_key = (
+        ndb.Key(_UnsyncedCertChain, signing_chain[0].id)
+        if signing_chain else None)
+
     return cls(
-        event=event._obj_dict,  # pylint: disable=protected-access
-        signing_chain=[cert.to_raw_dict() for cert in signing_chain],
+        event=compact_event,
+        signing_chain_key=signing_chain_key,
         occurred_dt=event.timestamp,
         sha256=file_catalog.sha256,
         host_id=computer.id,
         bit9_id=event.id)
 
+  def GetSigningChain(self, cert_chains):
+    """Returns the signing chain of this event.
+
+    Args:
+      cert_chains: dict<ndb.Key, _UnsyncedCertChain>, The prefetched signing
+          chains referenced by a page of _UnsyncedEvents.
+
+    Returns:
+      A list of api.Certificates in Leaf->Root order.
+    """
+    if self.signing_chain_key is None:
+      raw_chain = self.signing_chain or []
+    else:
+      cert_chain = cert_chains.get(self.signing_chain_key)
+      if cert_chain is None:
+        logging.warning(
+            'Missing signing chain %s for event %s',
+            self.signing_chain_key.id(), self.bit9_id)
+        raw_chain = []
+      else:
+        raw_chain = cert_chain.signing_chain
+    return [api.Certificate.from_dict(cert) for cert in raw_chain]
+
+
+def _PersistUnsyncedEvents(event_tuples):
+  """Persists an _UnsyncedEvent for each (event, signing_chain) tuple.
+
+  Any signing chains which haven't been seen before are persisted alongside.
+
+  Args:
+    event_tuples: List of (api.Event, List[api.Certificate]) tuples.
+  """
+  signing_chains = {
+      signing_chain[0].id: signing_chain
+      for _, signing_chain in event_tuples if signing_chain}
+  chain_keys = [
+      ndb.Key(_UnsyncedCertChain, cert_id) for cert_id in signing_chains]
+  new_chains = [
+      _UnsyncedCertChain.Generate(signing_chains[key.id()])
+      for key, existing in zip(chain_keys, ndb.get_multi(chain_keys))
+      if existing is None]
+
+  ndb.put_multi(new_chains + [
+      _UnsyncedEvent.Generate(event, signing_chain)
+      for event, signing_chain in event_tuples])
+
 
 def _Now():
   """Returns the current datetime. Primarily for easier unit testing."""
   return datetime.datetime.utcnow()
 
 
-def GetLastSyncedId():
+class _PullWatermark(singleton.Singleton):
+  """Tracks the most recent Bit9 event ID that has been pulled into Upvote.
+
+  Updates happen in two phases so that a Pull which dies partway through can be
+  detected: pending_id is set before the _UnsyncedEvents are persisted, and is
+  folded into last_synced_id (and cleared) once the put has succeeded.
+
+  Attributes:
+    last_synced_id: The largest Bit9 event ID known to be persisted.
+    pending_id: The largest Bit9 event ID of an in-progress put, if any.
+  """
+  last_synced_id = ndb.IntegerProperty(default=0)
+  pending_id = ndb.IntegerProperty()
+  updated_dt = ndb.DateTimeProperty(auto_now=True)
+
+  @classmethod
+  def GetOrCreate(cls):
+    return cls.GetInstance() or cls(id=cls._GetId())
+
+
+class _PullRange(ndb.Model):
+  """A window of Bit9 event IDs that is pulled by a single PullRange task.
+
+  The entity ID is the inclusive upper bound of the window (end_id).
+
+  Attributes:
+    start_id: The exclusive lower bound of the window.
+    end_id: The inclusive upper bound of the window.
+    cursor_id: The largest Bit9 event ID in the window pulled so far.
+    completed: Whether every event in the window has been pulled.
+  """
+  start_id = ndb.IntegerProperty()
+  end_id = ndb.IntegerProperty()
+  cursor_id = ndb.IntegerProperty()
+  completed = ndb.BooleanProperty(default=False)
+  recorded_dt = ndb.DateTimeProperty(auto_now_add=True)
+
+
+def _RecomputeLastSyncedId():
+  """Computes the last synced ID from the persisted events themselves."""
   event = bit9.Bit9Event.query().order(-bit9.Bit9Event.bit9_id).get()
   unsynced_event = _UnsyncedEvent.query().order(-_UnsyncedEvent.bit9_id).get()
-  return max(
+  last_synced_id = max(
       event and event.bit9_id, unsynced_event and unsynced_event.bit9_id, 0)
 
+  # Events above an unfinished _PullRange may already be persisted, so the
+  # watermark can't be allowed to skip past the gap.
+  for pull_range in _PullRange.query().order(_PullRange.start_id):
+    if not pull_range.completed:
+      last_synced_id = min(last_synced_id, pull_range.start_id)
+      break
+
+  return last_synced_id
+
+
+@ndb.transactional
+def _BeginWatermarkUpdate(pending_id):
+  """Records that events up to pending_id are about to be persisted."""
+  watermark = _PullWatermark.GetOrCreate()
+  watermark.pending_id = pending_id
+  watermark.put()
+
+
+@ndb.transactional
+def _CommitWatermarkUpdate(pending_id):
+  """Advances the watermark once events up to pending_id have been persisted."""
+  watermark = _PullWatermark.GetOrCreate()
+  watermark.last_synced_id = max(watermark.last_synced_id, pending_id)
+  watermark.pending_id = None
+  watermark.put()
+
+
+def _RepairWatermark():
+  """Rebuilds the watermark from the Bit9Event and _UnsyncedEvent kinds.
+
+  Returns:
+    The recomputed last synced ID.
+  """
+  logging.warning('Recomputing the Bit9 pull watermark')
+  last_synced_id = _RecomputeLastSyncedId()
+
+  @ndb.transactional
+  def _Repair():
+    watermark = _PullWatermark.GetOrCreate()
+    watermark.last_synced_id = last_synced_id
+    watermark.pending_id = None
+    watermark.put()
+
+  _Repair()
+  return last_synced_id
+
+
+def GetLastSyncedId():
+  """Returns the ID of the most recent Bit9 event pulled into Upvote.
+
+  This is normally a single key get on the watermark. The (much more expensive)
+  event queries are only run if the watermark doesn't exist yet, or if a
+  previous Pull failed between persisting events and committing the watermark.
+
+  Returns:
+    The last synced Bit9 event ID, or 0 if no events have been synced.
+  """
+  watermark = _PullWatermark.GetInstance()
+  if watermark is None or watermark.pending_id is not None:
+    return _RepairWatermark()
+  return watermark.last_synced_id
+
 
 def BuildEventSubtypeFilter():
   filter_expr = None
@@ -186,7 +423,27 @@ def _GetSigningChain(cert_id):
   return signing_chain
 
 
-def GetEvents(last_synced_id, limit=_PULL_BATCH_SIZE):
+def _BuildEventQuery(last_synced_id, max_id=None):
+  """Builds a query for the Bit9 events which still need to be pulled.
+
+  Args:
+    last_synced_id: The exclusive lower bound of the event IDs to query.
+    max_id: int, If provided, the inclusive upper bound of the event IDs.
+
+  Returns:
+    An api.Event query.
+  """
+  query = (
+      api.Event.query()
+      .filter(api.Event.id > last_synced_id)
+      .filter(api.Event.file_catalog_id > 0)
+      .filter(BuildEventSubtypeFilter()))
+  if max_id is not None:
+    query = query.filter(api.Event.id < max_id + 1)
+  return query
+
+
+def GetEvents(last_synced_id, limit=_PULL_BATCH_SIZE, max_id=None):
   """Get one or more events from Bit9.
 
   If events have been retrieved in the last five minutes, gets all recent
@@ -198,17 +455,18 @@ def GetEvents(last_synced_id, limit=_PULL_BATCH_SIZE):
         synced to Upvote.
     limit: int, If provided, the maximum number of events to pull from the
         events table. Otherwise, the module default is used.
+    max_id: int, If provided, the largest event ID that will be pulled.
 
   Returns:
-    A list of events not yet pushed to Upvote.
+    A (event_cert_tuples, max_fetched_id) tuple. event_cert_tuples is a list of
+    events not yet pushed to Upvote, and max_fetched_id is the largest ID among
+    all events retrieved from Bit9, including any which were skipped, or None if
+    no events were retrieved.
   """
   logging.info('Retrieving events after ID=%s (Max %s)', last_synced_id, limit)
 
   events = (
-      api.Event.query()
-      .filter(api.Event.id > last_synced_id)
-      .filter(api.Event.file_catalog_id > 0)
-      .filter(BuildEventSubtypeFilter())
+      _BuildEventQuery(last_synced_id, max_id=max_id)
       .expand(api.Event.file_catalog_id)
       .expand(api.Event.computer_id)
       .limit(limit)
@@ -216,6 +474,8 @@ def GetEvents(last_synced_id, limit=_PULL_BATCH_SIZE):
 
   logging.info('Retrieved %d event(s)', len(events))
 
+  max_fetched_id = max(event.id for event in events) if events else None
+
   event_cert_tuples = []
 
   # Maintain a set of (host_id, sha256) tuples for deduping purposes, in case
@@ -286,7 +546,9 @@ def GetEvents(last_synced_id, limit=_PULL_BATCH_SIZE):
 
   # Flip the event tuples back into order of increasing event ID before
   # returning.
-  return sorted(event_cert_tuples, key=lambda t: t[0].id, reverse=False)
+  event_cert_tuples = sorted(
+      event_cert_tuples, key=lambda t: t[0].id, reverse=False)
+  return event_cert_tuples, max_fetched_id
 
 
 def Pull(batch_size=_PULL_BATCH_SIZE):
@@ -310,7 +572,7 @@ def Pull(batch_size=_PULL_BATCH_SIZE):
         # Make an API call for a batch of events. If it fails, just log it and
         # try again.
         try:
-          event_tuples = GetEvents(last_synced_id, batch_size)
+          event_tuples, _ = GetEvents(last_synced_id, batch_size)
         except Exception as e:  # pylint: disable=broad-except
           logging.warning('Event retrieval failed: %s', e)
           continue
@@ -322,10 +584,13 @@ def Pull(batch_size=_PULL_BATCH_SIZE):
             total_pull_count)
         monitoring.events_pulled.IncrementBy(pull_count)
 
-        # Persist an _UnsyncedEvent for each retrieved Event proto.
-        ndb.put_multi(
-            _UnsyncedEvent.Generate(event, signing_chain)
-            for event, signing_chain in event_tuples)
+        # Persist an _UnsyncedEvent for each retrieved Event proto, bracketed
+        # by watermark updates so that a failed put can be detected later.
+        if event_tuples:
+          max_id = event_tuples[-1][0].id
+          _BeginWatermarkUpdate(max_id)
+          _PersistUnsyncedEvents(event_tuples)
+          _CommitWatermarkUpdate(max_id)
 
         # Briefly pause between requests in order to avoid hammering the Bit9
         # server too hard.
@@ -334,22 +599,215 @@ def Pull(batch_size=_PULL_BATCH_SIZE):
     logging.info('Unable to acquire datastore lock')
 
 
+def _GetMaxEventId(last_synced_id):
+  """Returns the largest Bit9 event ID that still needs to be pulled."""
+  events = (
+      _BuildEventQuery(last_synced_id)
+      .order(-api.Event.id)
+      .limit(1)
+      .execute(bit9_utils.CONTEXT))
+  return events[0].id if events else last_synced_id
+
+
+def _PartitionIdRange(start_id, end_id, range_count):
+  """Splits the ID range (start_id, end_id] into disjoint, contiguous windows.
+
+  Args:
+    start_id: The exclusive lower bound of the range.
+    end_id: The inclusive upper bound of the range.
+    range_count: The maximum number of windows to create.
+
+  Returns:
+    A list of (start_id, end_id) tuples in increasing ID order.
+  """
+  total = end_id - start_id
+  if total <= 0:
+    return []
+
+  range_count = max(1, min(range_count, total // _PULL_RANGE_MIN_SIZE))
+  range_size = -(-total // range_count)  # Ceiling division.
+
+  windows = []
+  lower = start_id
+  while lower < end_id:
+    upper = min(lower + range_size, end_id)
+    windows.append((lower, upper))
+    lower = upper
+  return windows
+
+
+def _FoldCompletedRanges():
+  """Advances the watermark past contiguous, completed _PullRanges.
+
+  A window is only folded once every window below it has completed, so the
+  watermark never skips over events which haven't been pulled yet.
+
+  Returns:
+    The resulting last synced ID.
+  """
+  last_synced_id = GetLastSyncedId()
+
+  folded_keys = []
+  for pull_range in _PullRange.query().order(_PullRange.start_id):
+    if not pull_range.completed or pull_range.start_id > last_synced_id:
+      break
+    last_synced_id = max(last_synced_id, pull_range.end_id)
+    folded_keys.append(pull_range.key)
+
+  if folded_keys:
+    logging.info(
+        'Folding %d completed range(s) up to ID=%s', len(folded_keys),
+        last_synced_id)
+    _CommitWatermarkUpdate(last_synced_id)
+    ndb.delete_multi(folded_keys)
+
+  return last_synced_id
+
+
+def PullRanges(range_count=None):
+  """Coordinates pulling the Bit9 backlog in concurrent ID windows.
+
+  Each run folds any completed windows into the watermark, partitions the
+  outstanding backlog into new windows once the previous set has finished, and
+  (re-)defers a PullRange task for each unfinished window. Windows whose task is
+  still running are skipped by that task's lock.
+
+  Args:
+    range_count: int, The maximum number of windows to pull concurrently.
+        Defaults to settings.BIT9_PULL_RANGE_COUNT.
+  """
+  range_count = range_count or settings.BIT9_PULL_RANGE_COUNT
+
+  try:
+    with datastore_locks.DatastoreLock(
+        _PULL_LOCK_ID, default_timeout=_PULL_LOCK_TIMEOUT,
+        default_max_acquire_attempts=_PULL_LOCK_MAX_ACQUIRE_ATTEMPTS):
+
+      last_synced_id = _FoldCompletedRanges()
+
+      # pylint: disable=g-explicit-bool-comparison, singleton-comparison
+      open_ranges = _PullRange.query(_PullRange.completed == False).fetch()
+      # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+
+      if not open_ranges:
+        max_id = _GetMaxEventId(last_synced_id)
+        windows = _PartitionIdRange(last_synced_id, max_id, range_count)
+        logging.info(
+            'Partitioning IDs (%s, %s] into %d range(s)', last_synced_id,
+            max_id, len(windows))
+        open_ranges = [
+            _PullRange(
+                id=end_id, start_id=start_id, end_id=end_id,
+                cursor_id=start_id)
+            for start_id, end_id in windows]
+        ndb.put_multi(open_ranges)
+
+      for pull_range in open_ranges:
+        deferred.defer(
+            PullRange, pull_range.key.id(),
+            _queue=constants.TASK_QUEUE.BIT9_PULL_RANGE)
+
+  except datastore_locks.AcquireLockError:
+    logging.info('Unable to acquire datastore lock')
+
+
+def PullRange(range_id, batch_size=_PULL_BATCH_SIZE):
+  """Retrieves the events within a single _PullRange window from Bit9.
+
+  Args:
+    range_id: int, The ID of the _PullRange to pull.
+    batch_size: int, The number of events to retrieve in each batch.
+  """
+  start_time = _Now()
+  logging.info('Starting a new pull task for range %d', range_id)
+
+  try:
+    with datastore_locks.DatastoreLock(
+        _PULL_RANGE_LOCK_ID % range_id, default_timeout=_PULL_LOCK_TIMEOUT,
+        default_max_acquire_attempts=_PULL_RANGE_LOCK_MAX_ACQUIRE_ATTEMPTS):
+
+      pull_range = _PullRange.get_by_id(range_id)
+      if pull_range is None or pull_range.completed:
+        logging.info('Range %d has already been pulled', range_id)
+        return
+
+      while time_utils.TimeRemains(start_time, _TASK_DURATION):
+        logging.info(
+            'Syncing range (%s, %s] from ID=%s', pull_range.start_id,
+            pull_range.end_id, pull_range.cursor_id)
+
+        try:
+          event_tuples, max_fetched_id = GetEvents(
+              pull_range.cursor_id, batch_size, max_id=pull_range.end_id)
+        except Exception as e:  # pylint: disable=broad-except
+          logging.warning('Event retrieval failed: %s', e)
+          continue
+
+        # The window is only exhausted once Bit9 returns no events at all. A
+        # batch whose events were all skipped must still advance the cursor.
+        if max_fetched_id is None:
+          pull_range.completed = True
+          pull_range.put()
+          break
+
+        if event_tuples:
+          monitoring.events_pulled.IncrementBy(len(event_tuples))
+          _PersistUnsyncedEvents(event_tuples)
+
+        # Only advance the cursor once the events have been persisted. It moves
+        # past any skipped events too, so that they aren't retrieved again.
+        pull_range.cursor_id = max_fetched_id
+        pull_range.put()
+
+        # Briefly pause between requests in order to avoid hammering the Bit9
+        # server too hard.
+        time.sleep(0.25)
+
+  except datastore_locks.AcquireLockError:
+    logging.info('Unable to acquire datastore lock')
+
+
+def _GetDispatchWindow():
+  """Returns the index of the current Process task dispatch window."""
+  return int(time.time()) // _PROCESS_TASK_WINDOW_SECS
+
+
 def Dispatch():
-  """Dispatches per-host tasks onto the event processing queue."""
+  """Dispatches per-host tasks onto the event processing queue.
+
+  Hosts whose Process task is still running are skipped, as are hosts which have
+  already been dispatched during the current window.
+  """
   total_dispatch_count = 0
+  total_skip_count = 0
   logging.info('Starting a new dispatch task')
 
+  window = _GetDispatchWindow()
+
   # Query for all distinct host_id values among the _UnsyncedEvents, in batches,
   # either until we run out, or the task nears its deadline.
   query = _UnsyncedEvent.query(
       projection=[_UnsyncedEvent.host_id], distinct=True)
-  for event_page in datastore_utils.Paginate(query, page_size=25):
+  for event_page in datastore_utils.Paginate(
+      query, page_size=_DISPATCH_PAGE_SIZE):
     host_ids = [event.host_id for event in event_page]
-    for host_id in host_ids:
-      deferred.defer(Process, host_id, _queue=constants.TASK_QUEUE.BIT9_PROCESS)
-      total_dispatch_count += 1
+    held_lock_ids = datastore_locks.GetHeldLockIds(
+        [_PROCESS_LOCK_ID % host_id for host_id in host_ids])
 
-  logging.info('Dispatched %d task(s)', total_dispatch_count)
+    tasks = [
+        taskqueue_utils.CreateDeferredTask(
+            Process, host_id, _name=_PROCESS_TASK_NAME % (host_id, window))
+        for host_id in host_ids
+        if _PROCESS_LOCK_ID % host_id not in held_lock_ids]
+    dispatch_count = taskqueue_utils.AddTasks(
+        tasks, queue=constants.TASK_QUEUE.BIT9_PROCESS)
+
+    total_dispatch_count += dispatch_count
+    total_skip_count += len(host_ids) - dispatch_count
+
+  logging.info(
+      'Dispatched %d task(s), skipping %d host(s) already in flight',
+      total_dispatch_count, total_skip_count)
 
 
 def Process(host_id):
@@ -361,7 +819,7 @@ def Process(host_id):
   try:
 
     with datastore_locks.DatastoreLock(
-        'bit9-process-%d' % host_id, default_timeout=_PROCESS_LOCK_TIMEOUT,
+        _PROCESS_LOCK_ID % host_id, default_timeout=_PROCESS_LOCK_TIMEOUT,
         default_max_acquire_attempts=_PROCESS_LOCK_MAX_ACQUIRE_ATTEMPTS):
 
       total_process_count = 0
@@ -375,12 +833,16 @@ def Process(host_id):
       event_pages = datastore_utils.Paginate(query, page_size=25)
       event_page = next(event_pages, None)
       while time_utils.TimeRemains(start_time, _TASK_DURATION) and event_page:
+
+        # Fetch the signing chains shared by this page of events all at once.
+        chain_keys = list({
+            unsynced_event.signing_chain_key for unsynced_event in event_page
+            if unsynced_event.signing_chain_key is not None})
+        cert_chains = dict(zip(chain_keys, ndb.get_multi(chain_keys)))
+
         for unsynced_event in event_page:
           event = api.Event.from_dict(unsynced_event.event)
-          signing_chain = [
-              api.Certificate.from_dict(cert)
-              for cert in unsynced_event.signing_chain
-          ]
+          signing_chain = unsynced_event.GetSigningChain(cert_chains)
           file_catalog = event.get_expand(api.Event.file_catalog_id)
           computer = event.get_expand(api.Event.computer_id)
 
@@ -425,10 +887,13 @@ def _PersistBit9Certificates(signing_chain):
   if not signing_chain:
     return datastore_utils.GetNoOpFuture()
 
+  cert_keys = [
+      ndb.Key(bit9.Bit9Certificate, cert.thumbprint) for cert in signing_chain]
+  existing_certs = metadata_cache.GetMulti(cert_keys)
+
   to_create = []
-  for cert in signing_chain:
+  for cert, existing_cert in zip(signing_chain, existing_certs):
     thumbprint = cert.thumbprint
-    existing_cert = bit9.Bit9Certificate.get_by_id(thumbprint)
     if existing_cert is None:
       cert = bit9.Bit9Certificate(
           id=thumbprint,
@@ -653,6 +1118,11 @@ def _PersistBanNote(file_catalog):
   return datastore_utils.GetNoOpFuture()
 
 
+def _GetRuleCopyKey(rule):
+  """Returns an incomplete key for a copy of a rule on the same Blockable."""
+  return ndb.Key(rule.key.kind(), None, parent=rule.key.parent())
+
+
 @ndb.tasklet
 def _CopyLocalRules(user_key, dest_host_id):
   """Copy over a user's local rules to a newly-associated host.
@@ -689,12 +1159,10 @@ def _CopyLocalRules(user_key, dest_host_id):
 
   # Copy the local rules to the new host.
   logging.info('Copying %d rule(s) to host %s', len(src_rules), dest_host_id)
-  new_rules = []
-  for src_rule in src_rules:
-    new_rule = datastore_utils.CopyEntity(
-        src_rule, new_parent=src_rule.key.parent(), host_id=dest_host_id,
-        user_key=user_key)
-    new_rules.append(new_rule)
+  new_rules = datastore_utils.CopyEntities(
+      src_rules, key_func=_GetRuleCopyKey, host_id=dest_host_id,
+      user_key=user_key)
+  for new_rule in new_rules:
     new_rule.InsertBigQueryRow()
   yield ndb.put_multi_async(new_rules)
 
@@ -979,16 +1447,18 @@ class CommitAllChangeSets(handler_utils.CronJobHandler):
 
     # Randomly sample from the outstanding changes in order to avoid
     # head-of-the-line blocking due to unsynced hosts, for example.
-    sample_size = min(len(blockable_keys), 3 * available_seconds)
+    batch_size = change_set.COMMIT_BATCH_SIZE
+    sample_size = min(len(blockable_keys), 3 * available_seconds * batch_size)
     selected_keys = random.sample(blockable_keys, sample_size)
     logging.info('Deferring %d pending change(s)', len(selected_keys))
 
-    for selected_key in selected_keys:
+    # Each task commits all pending changes for a batch of blockables.
+    for i in xrange(0, len(selected_keys), batch_size):
 
       # Schedule the task for a random time in the remaining cron period.
       countdown = random.randint(0, available_seconds)
-      change_set.DeferCommitBlockableChangeSet(
-          selected_key, countdown=countdown)
+      change_set.DeferCommitChangeSets(
+          selected_keys[i:i + batch_size], countdown=countdown)
 
 
 class UpdateBit9Policies(handler_utils.CronJobHandler):
@@ -1037,10 +1507,8 @@ class UpdateBit9Policies(handler_utils.CronJobHandler):
 class CountEventsToPull(handler_utils.CronJobHandler):
 
   def get(self):
-    queue_length = (
-        api.Event.query().filter(api.Event.id > GetLastSyncedId())
-        .filter(api.Event.file_catalog_id > 0).filter(
-            BuildEventSubtypeFilter()).count(bit9_utils.CONTEXT))
+    queue_length = _BuildEventQuery(GetLastSyncedId()).count(
+        bit9_utils.CONTEXT)
     logging.info(
         'There are currently %d events waiting in Bit9', queue_length)
     monitoring.events_to_pull.Set(queue_length)
@@ -1049,8 +1517,9 @@ class CountEventsToPull(handler_utils.CronJobHandler):
 class PullEvents(handler_utils.CronJobHandler):
 
   def get(self):
+    pull_func = Pull if settings.BIT9_PULL_RANGE_COUNT <= 1 else PullRanges
     taskqueue_utils.CappedDefer(
-        Pull, _PULL_MAX_QUEUE_SIZE, queue=constants.TASK_QUEUE.BIT9_PULL)
+        pull_func, _PULL_MAX_QUEUE_SIZE, queue=constants.TASK_QUEUE.BIT9_PULL)
 
 
 class CountEventsToProcess(handler_utils.CronJobHandler):
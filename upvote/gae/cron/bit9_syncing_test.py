@@ -174,13 +174,110 @@ class UnsyncedEventTest(basetest.UpvoteTestCase):
     key = bit9_syncing._UnsyncedEvent.Generate(event, [cert]).put()
     entity = key.get()
 
-    self.assertLen(entity.signing_chain, 1)
-    self.assertEqual(event._obj_dict, entity.event)
+    self.assertEqual(cert.id, entity.signing_chain_key.id())
+    self.assertIsNone(entity.signing_chain)
 
     self.assertEqual(file_catalog.sha256, entity.sha256)
     self.assertEqual(event.timestamp, entity.occurred_dt)
     self.assertEqual(event.computer_id, entity.host_id)
 
+  def testCompactEvent(self):
+    event, _ = _CreateEventAndCert()
+    file_catalog = event.get_expand(api.Event.file_catalog_id)
+    computer = event.get_expand(api.Event.computer_id)
+
+    entity = bit9_syncing._UnsyncedEvent.Generate(event, [])
+    self.assertLessEqual(
+        set(entity.event.keys()), set(event._obj_dict.keys()))
+    self.assertNotIn(api.Event.received_timestamp.name, entity.event)
+
+    compact_event = api.Event.from_dict(entity.event)
+    self.assertEqual(event.id, compact_event.id)
+    self.assertEqual(event.file_name, compact_event.file_name)
+    self.assertEqual(
+        file_catalog.sha256,
+        compact_event.get_expand(api.Event.file_catalog_id).sha256)
+    self.assertEqual(
+        computer.users,
+        compact_event.get_expand(api.Event.computer_id).users)
+
+  def testGetSigningChain(self):
+    event, cert = _CreateEventAndCert()
+    bit9_syncing._PersistUnsyncedEvents([(event, [cert])])
+
+    entity = bit9_syncing._UnsyncedEvent.query().get()
+    cert_chains = {entity.signing_chain_key: entity.signing_chain_key.get()}
+    signing_chain = entity.GetSigningChain(cert_chains)
+
+    self.assertLen(signing_chain, 1)
+    self.assertEqual(cert.thumbprint, signing_chain[0].thumbprint)
+    self.assertEqual(cert.valid_to, signing_chain[0].valid_to)
+
+  def testGetSigningChain_Legacy(self):
+    event, cert = _CreateEventAndCert()
+    entity = bit9_syncing._UnsyncedEvent.Generate(event, [])
+    entity.signing_chain = [cert.to_raw_dict()]
+
+    signing_chain = entity.GetSigningChain({})
+
+    self.assertLen(signing_chain, 1)
+    self.assertEqual(cert.thumbprint, signing_chain[0].thumbprint)
+
+
+class PersistUnsyncedEventsTest(basetest.UpvoteTestCase):
+
+  def testSharedSigningChain(self):
+    events, certs = _CreateEventsAndCerts(count=3)
+    bit9_syncing._PersistUnsyncedEvents(
+        [(event, [certs[0]]) for event in events])
+
+    self.assertEntityCount(bit9_syncing._UnsyncedEvent, 3)
+    self.assertEntityCount(bit9_syncing._UnsyncedCertChain, 1)
+
+
+class GetLastSyncedIdTest(basetest.UpvoteTestCase):
+
+  def testNoWatermark_NoEvents(self):
+    self.assertEqual(0, bit9_syncing.GetLastSyncedId())
+    self.assertEqual(
+        0, bit9_syncing._PullWatermark.GetInstance().last_synced_id)
+
+  def testNoWatermark_Repaired(self):
+    binary = test_utils.CreateBit9Binary()
+    test_utils.CreateBit9Event(binary, bit9_id=123)
+    event, _ = _CreateEventAndCert(event_kwargs={'id': 456})
+    bit9_syncing._UnsyncedEvent.Generate(event, []).put()
+
+    self.assertEqual(456, bit9_syncing.GetLastSyncedId())
+    self.assertEqual(
+        456, bit9_syncing._PullWatermark.GetInstance().last_synced_id)
+
+  @mock.patch.object(bit9_syncing, '_RecomputeLastSyncedId')
+  def testWatermarkExists(self, mock_recompute):
+    bit9_syncing._PullWatermark.SetInstance(last_synced_id=789)
+
+    self.assertEqual(789, bit9_syncing.GetLastSyncedId())
+    self.assertFalse(mock_recompute.called)
+
+  def testPendingUpdate_Repaired(self):
+    binary = test_utils.CreateBit9Binary()
+    test_utils.CreateBit9Event(binary, bit9_id=123)
+    bit9_syncing._PullWatermark.SetInstance(last_synced_id=100, pending_id=200)
+
+    self.assertEqual(123, bit9_syncing.GetLastSyncedId())
+    watermark = bit9_syncing._PullWatermark.GetInstance()
+    self.assertEqual(123, watermark.last_synced_id)
+    self.assertIsNone(watermark.pending_id)
+
+  def testCommitWatermarkUpdate(self):
+    bit9_syncing._BeginWatermarkUpdate(50)
+    self.assertEqual(50, bit9_syncing._PullWatermark.GetInstance().pending_id)
+
+    bit9_syncing._CommitWatermarkUpdate(50)
+    watermark = bit9_syncing._PullWatermark.GetInstance()
+    self.assertEqual(50, watermark.last_synced_id)
+    self.assertIsNone(watermark.pending_id)
+
 
 class BuildEventSubtypeFilterTest(basetest.UpvoteTestCase):
 
@@ -304,7 +401,7 @@ class GetEventsTest(SyncTestCase):
 
     self._AppendMockApiResults(event, signing_chain)
 
-    results = bit9_syncing.GetEvents(0)
+    results, _ = bit9_syncing.GetEvents(0)
     self.assertLen(results, 0)
     self.assertTrue(bit9_syncing.monitoring.events_skipped.Increment.called)
 
@@ -323,7 +420,7 @@ class GetEventsTest(SyncTestCase):
 
     self._AppendMockApiResults(event, signing_chain)
 
-    results = bit9_syncing.GetEvents(0)
+    results, _ = bit9_syncing.GetEvents(0)
     self.assertLen(results, 0)
     self.assertTrue(bit9_syncing.monitoring.events_skipped.Increment.called)
 
@@ -340,7 +437,7 @@ class GetEventsTest(SyncTestCase):
 
     self._AppendMockApiResults(event, signing_chain)
 
-    results = bit9_syncing.GetEvents(0)
+    results, _ = bit9_syncing.GetEvents(0)
     self.assertLen(results, 0)
     self.assertTrue(bit9_syncing.monitoring.events_skipped.Increment.called)
 
@@ -356,8 +453,9 @@ class GetEventsTest(SyncTestCase):
 
     self._AppendMockApiResults(events, *certs)
 
-    results = bit9_syncing.GetEvents(0)
+    results, max_fetched_id = bit9_syncing.GetEvents(0)
     self.assertLen(results, 1)
+    self.assertEqual(max(event.id for event in events), max_fetched_id)
     self.assertEqual(expected_event_id, results[0][0].id)
     self.assertEqual(expected_cert_id, results[0][1][0].id)
 
@@ -408,7 +506,7 @@ class GetEventsTest(SyncTestCase):
         signing_chain_3, bit9_syncing.MalformedCertificateError, signing_chain_1
     ]
 
-    results = bit9_syncing.GetEvents(0)
+    results, _ = bit9_syncing.GetEvents(0)
     self.assertLen(results, 2)
     self.assertTrue(bit9_syncing.monitoring.events_skipped.Increment.called)
 
@@ -466,7 +564,7 @@ class GetEventsTest(SyncTestCase):
     mock_get_signing_chain.side_effect = [
         signing_chain_3, Exception, signing_chain_1]
 
-    results = bit9_syncing.GetEvents(0)
+    results, _ = bit9_syncing.GetEvents(0)
     self.assertLen(results, 2)
     self.assertTrue(bit9_syncing.monitoring.events_skipped.Increment.called)
 
@@ -507,7 +605,7 @@ class GetEventsTest(SyncTestCase):
 
     self._AppendMockApiResults([event_1, event_2], cert_2, cert_1)
 
-    results = bit9_syncing.GetEvents(0)
+    results, _ = bit9_syncing.GetEvents(0)
     self.assertLen(results, 2)
     self.assertListEqual([103, 203], [e.id for e, _ in results])
     self.assertListEqual(
@@ -533,9 +631,10 @@ class PullTest(SyncTestCase):
               .order(bit9_syncing._UnsyncedEvent.bit9_id)
               .fetch())
     self.assertLen(events, 2)
-    self.assertEqual(event_1._obj_dict, events[0].event)
-    self.assertEqual(event_2._obj_dict, events[1].event)
+    self.assertEqual(event_1.id, events[0].bit9_id)
+    self.assertEqual(event_2.id, events[1].bit9_id)
     self.assertEqual(2, self.mock_events_pulled.IncrementBy.call_count)
+    self.assertEqual(event_2.id, bit9_syncing.GetLastSyncedId())
 
   def testMultiple(self):
 
@@ -571,7 +670,118 @@ class PullTest(SyncTestCase):
               .order(bit9_syncing._UnsyncedEvent.bit9_id)
               .fetch())
     self.assertLen(events, 1)
-    self.assertEqual(event._obj_dict, events[0].event)
+    self.assertEqual(event.id, events[0].bit9_id)
+
+
+class PartitionIdRangeTest(absltest.TestCase):
+
+  def testEmpty(self):
+    self.assertEqual([], bit9_syncing._PartitionIdRange(10, 10, 4))
+
+  def testSmallBacklog(self):
+    self.assertEqual([(0, 100)], bit9_syncing._PartitionIdRange(0, 100, 4))
+
+  def testContiguous(self):
+    end_id = bit9_syncing._PULL_RANGE_MIN_SIZE * 10 + 7
+    windows = bit9_syncing._PartitionIdRange(5, end_id, 4)
+
+    self.assertLen(windows, 4)
+    self.assertEqual(5, windows[0][0])
+    self.assertEqual(end_id, windows[-1][1])
+    for (_, upper), (lower, _) in zip(windows, windows[1:]):
+      self.assertEqual(upper, lower)
+
+
+class PullRangesTest(SyncTestCase):
+
+  def _CreateRange(self, start_id, end_id, completed=False):
+    pull_range = bit9_syncing._PullRange(
+        id=end_id, start_id=start_id, end_id=end_id, cursor_id=start_id,
+        completed=completed)
+    pull_range.put()
+    return pull_range
+
+  def testPartitionsBacklog(self):
+    bit9_syncing._PullWatermark.SetInstance(last_synced_id=0)
+    max_id = bit9_syncing._PULL_RANGE_MIN_SIZE * 4
+    event, _ = _CreateEventAndCert(event_kwargs={'id': max_id})
+    self._AppendMockApiResults([event])
+
+    bit9_syncing.PullRanges(range_count=4)
+
+    self.assertEntityCount(bit9_syncing._PullRange, 4)
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_PULL_RANGE, 4)
+
+  def testFoldsContiguousRanges(self):
+    bit9_syncing._PullWatermark.SetInstance(last_synced_id=0)
+    self._CreateRange(0, 10, completed=True)
+    self._CreateRange(10, 20, completed=False)
+    self._CreateRange(20, 30, completed=True)
+
+    bit9_syncing.PullRanges(range_count=4)
+
+    # Only the first range can be folded, and the unfinished one is retried.
+    self.assertEqual(10, bit9_syncing.GetLastSyncedId())
+    self.assertEntityCount(bit9_syncing._PullRange, 2)
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_PULL_RANGE, 1)
+
+  def testRepairRespectsOpenRanges(self):
+    self._CreateRange(0, 10, completed=False)
+    event, _ = _CreateEventAndCert(event_kwargs={'id': 15})
+    bit9_syncing._UnsyncedEvent.Generate(event, []).put()
+
+    self.assertEqual(0, bit9_syncing.GetLastSyncedId())
+
+
+class PullRangeTest(SyncTestCase):
+
+  def setUp(self):
+    super(PullRangeTest, self).setUp()
+    self.Patch(time_utils, 'TimeRemains', return_value=True)
+
+  def testPullsUntilExhausted(self):
+    pull_range = bit9_syncing._PullRange(
+        id=200, start_id=0, end_id=200, cursor_id=0)
+    pull_range.put()
+    event, cert = _CreateEventAndCert()
+    self._AppendMockApiResults([event], cert, [])
+
+    bit9_syncing.PullRange(200)
+
+    self.assertEntityCount(bit9_syncing._UnsyncedEvent, 1)
+    pull_range = pull_range.key.get()
+    self.assertTrue(pull_range.completed)
+    self.assertEqual(event.id, pull_range.cursor_id)
+
+  def testSkippedEventsAtEndOfRange(self):
+    pull_range = bit9_syncing._PullRange(
+        id=200, start_id=0, end_id=200, cursor_id=0)
+    pull_range.put()
+    event, cert = _CreateEventAndCert(event_kwargs={'id': 100})
+
+    # The last event in the range has no fileCatalog, so is skipped.
+    computer = bit9_test_utils.CreateComputer(id=300)
+    skipped_event = bit9_test_utils.CreateEvent(
+        id=150, computer_id=300, file_catalog_id=301)
+    skipped_event = bit9_test_utils.Expand(
+        skipped_event, api.Event.computer_id, computer)
+
+    self._AppendMockApiResults([event, skipped_event], cert, [])
+
+    bit9_syncing.PullRange(200)
+
+    self.assertEntityCount(bit9_syncing._UnsyncedEvent, 1)
+    pull_range = pull_range.key.get()
+    self.assertTrue(pull_range.completed)
+    self.assertEqual(150, pull_range.cursor_id)
+
+  def testAlreadyCompleted(self):
+    bit9_syncing._PullRange(
+        id=200, start_id=0, end_id=200, cursor_id=200, completed=True).put()
+
+    bit9_syncing.PullRange(200)
+
+    self.assertFalse(bit9_utils.CONTEXT.ExecuteRequest.called)
 
 
 class DispatchTest(SyncTestCase):
@@ -589,6 +799,41 @@ class DispatchTest(SyncTestCase):
     actual_host_ids = [task[1][0] for task in tasks]
     self.assertEqual(expected_host_ids, actual_host_ids)
 
+  def testDispatch_Deduplicated(self):
+    self.Patch(bit9_syncing, '_GetDispatchWindow', return_value=1)
+    _CreateUnsyncedEvents(host_count=3)
+
+    bit9_syncing.Dispatch()
+    bit9_syncing.Dispatch()
+
+    # The second Dispatch falls in the same window, so adds no tasks.
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_PROCESS, 3)
+
+  def testDispatch_NextWindow(self):
+    self.Patch(bit9_syncing, '_GetDispatchWindow', side_effect=[1, 2])
+    _CreateUnsyncedEvents(host_count=3)
+
+    bit9_syncing.Dispatch()
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_PROCESS, 3)
+
+    # Let the Process tasks finish without handling the events, as though more
+    # events arrived for each host once its backlog was drained.
+    self.Patch(bit9_syncing, 'Process')
+    self.DrainTaskQueue(constants.TASK_QUEUE.BIT9_PROCESS)
+
+    # Each host should be dispatched again in the next cron tick.
+    bit9_syncing.Dispatch()
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_PROCESS, 3)
+
+  def testDispatch_SkipsInFlight(self):
+    _CreateUnsyncedEvents(host_count=3)
+    datastore_locks.DatastoreLock('bit9-process-1').Acquire()
+
+    bit9_syncing.Dispatch()
+
+    tasks = self.UnpackTaskQueue(queue_name=constants.TASK_QUEUE.BIT9_PROCESS)
+    self.assertEqual([0, 2], [task[1][0] for task in tasks])
+
 
 class ProcessTest(SyncTestCase):
 
@@ -608,7 +853,7 @@ class ProcessTest(SyncTestCase):
 
   def testInsertsCertificateRow(self):
     event, cert = _CreateEventAndCert()
-    bit9_syncing._UnsyncedEvent.Generate(event, [cert]).put()
+    bit9_syncing._PersistUnsyncedEvents([(event, [cert])])
 
     # Patch out the all methods except _PersistBit9Certificates.
     methods = [
@@ -1311,19 +1556,23 @@ class CommitAllChangeSetsTest(bit9test.Bit9TestCase):
     binary = test_utils.CreateBit9Binary()
     change = test_utils.CreateRuleChangeSet(binary.key)
     other_binary = test_utils.CreateBit9Binary()
-    # Create two changesets so we're sure we're doing only 1 task per blockable.
-    real_change = test_utils.CreateRuleChangeSet(other_binary.key)
-    unused_change = test_utils.CreateRuleChangeSet(other_binary.key)
-    self.assertTrue(real_change.recorded_dt < unused_change.recorded_dt)
+    # Create two changesets so we're sure that all of them get committed.
+    first_change = test_utils.CreateRuleChangeSet(other_binary.key)
+    second_change = test_utils.CreateRuleChangeSet(other_binary.key)
+    self.assertTrue(first_change.recorded_dt < second_change.recorded_dt)
 
     self.testapp.get(self.ROUTE, headers={'X-AppEngine-Cron': 'true'})
 
     self.assertEqual(2, mock_metric.Set.call_args_list[0][0][0])
-    self.assertTaskCount(constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, 2)
+
+    # Both blockables should be handled by a single batch task.
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, 1)
     with mock.patch.object(change_set, '_CommitChangeSet') as mock_commit:
       self.RunDeferredTasks(constants.TASK_QUEUE.BIT9_COMMIT_CHANGE)
 
-      expected_calls = [mock.call(change.key), mock.call(real_change.key)]
+      expected_calls = [
+          mock.call(change.key), mock.call(first_change.key),
+          mock.call(second_change.key)]
       self.assertSameElements(expected_calls, mock_commit.mock_calls)
 
 
@@ -20,7 +20,9 @@ from webapp2_extras import routes
 
 from upvote.gae.cron import bit9_syncing
 from upvote.gae.cron import datastore_backup
+from upvote.gae.cron import retention
 from upvote.gae.cron import role_syncing
+from upvote.gae.cron import voting_audit
 
 _ALL_ROUTES = [
     routes.PathPrefixRoute(
@@ -28,7 +30,9 @@ _ALL_ROUTES = [
         [
             bit9_syncing.ROUTES,
             datastore_backup.ROUTES,
-            role_syncing.ROUTES
+            retention.ROUTES,
+            role_syncing.ROUTES,
+            voting_audit.ROUTES
         ]),
 ]
 
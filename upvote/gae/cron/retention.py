@@ -0,0 +1,174 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Cron jobs which remove Event and Vote history that exceeds retention."""
+
+import collections
+import datetime
+import logging
+
+import webapp2
+from webapp2_extras import routes
+
+from google.appengine.ext import ndb
+
+from upvote.gae import settings
+from upvote.gae.datastore import utils as datastore_utils
+from upvote.gae.datastore.models import base as base_models
+from upvote.gae.datastore.models import event_summary as event_summary_models
+from upvote.gae.datastore.models import exemption as exemption_models
+from upvote.gae.datastore.models import vote as vote_models
+from upvote.gae.utils import handler_utils
+from upvote.shared import constants
+
+
+# The number of Events examined by each retention task.
+_EVENT_PAGE_SIZE = 200
+
+# The number of archived Votes deleted by each retention task.
+_VOTE_PAGE_SIZE = 500
+
+# The Exemption states in which the Events of the exempted Host are retained.
+_OPEN_EXEMPTION_STATES = frozenset([
+    constants.EXEMPTION_STATE.REQUESTED, constants.EXEMPTION_STATE.PENDING,
+    constants.EXEMPTION_STATE.APPROVED, constants.EXEMPTION_STATE.ESCALATED])
+
+
+def _GetCutoffDt(retention_days):
+  return datetime.datetime.utcnow() - datetime.timedelta(days=retention_days)
+
+
+def _GetHostIdsWithOpenExemptions(host_ids):
+  exm_keys = [
+      exemption_models.Exemption.CreateKey(host_id) for host_id in host_ids]
+  return set(
+      host_id for host_id, exm in zip(host_ids, ndb.get_multi(exm_keys))
+      if exm is not None and exm.state in _OPEN_EXEMPTION_STATES)
+
+
+def _GetRecentlyActiveBlockableKeys(blockable_keys, cutoff_dt):
+  # Voting on a Blockable updates it, so any Blockable updated since the cutoff
+  # may still have voting pending.
+  return set(
+      blockable.key for blockable in ndb.get_multi(blockable_keys)
+      if blockable is not None and blockable.updated_dt >= cutoff_dt)
+
+
+def _RetireEvents(events, cutoff_dt):
+  """Rolls up and deletes any of the given Events which should not be retained.
+
+  Events are retained if they have recurred since the cutoff, if their Host has
+  an open Exemption, or if their Blockable has been updated since the cutoff.
+
+  NOTE: The rollups and deletion aren't atomic, so if a task is retried
+  after the rollups succeed, its Events may be counted twice by the summaries.
+
+  Args:
+    events: list<Event>, The Events which, according to an eventually
+        consistent query, haven't recurred since the cutoff.
+    cutoff_dt: datetime, The time before which history isn't retained.
+
+  Returns:
+    The number of Events deleted.
+  """
+  host_ids = list(set(event.host_id for event in events if event.host_id))
+  blockable_keys = list(set(event.blockable_key for event in events))
+  retained_host_ids = _GetHostIdsWithOpenExemptions(host_ids)
+  retained_blockable_keys = _GetRecentlyActiveBlockableKeys(
+      blockable_keys, cutoff_dt)
+
+  # The Events were selected by an eventually consistent index scan, so any
+  # which have since recurred must be re-checked against their fresh state.
+  expired_events = [
+      event for event in events
+      if event.last_blocked_dt < cutoff_dt and
+      event.host_id not in retained_host_ids and
+      event.blockable_key not in retained_blockable_keys]
+  if not expired_events:
+    return 0
+
+  events_by_blockable_key = collections.defaultdict(list)
+  events_by_host_id = collections.defaultdict(list)
+  for event in expired_events:
+    events_by_blockable_key[event.blockable_key].append(event)
+    if event.host_id:
+      events_by_host_id[event.host_id].append(event)
+
+  futures = [
+      event_summary_models.BlockableEventSummary.RollUpAsync(
+          blockable_key.id(), blockable_events)
+      for blockable_key, blockable_events in
+      events_by_blockable_key.iteritems()]
+  futures += [
+      event_summary_models.HostEventSummary.RollUpAsync(host_id, host_events)
+      for host_id, host_events in events_by_host_id.iteritems()]
+  ndb.Future.wait_all(futures)
+  for future in futures:
+    future.check_success()
+
+  ndb.delete_multi(event.key for event in expired_events)
+  base_models.DeferCountDeletedEvents(expired_events)
+
+  logging.info(
+      'Retired %d of %d Event(s)', len(expired_events), len(events))
+  return len(expired_events)
+
+
+def _DeleteArchivedVotes(vote_keys):
+  ndb.delete_multi(vote_keys)
+  logging.info('Deleted %d archived Vote(s)', len(vote_keys))
+
+
+def RetireEvents():
+  """Rolls up and deletes all Events which haven't recurred within retention."""
+  if settings.EVENT_RETENTION_DAYS is None:
+    logging.info('Event retention is disabled')
+    return
+
+  cutoff_dt = _GetCutoffDt(settings.EVENT_RETENTION_DAYS)
+  query = base_models.Event.query(base_models.Event.last_blocked_dt < cutoff_dt)
+  datastore_utils.QueuedPaginatedBatchApply(
+      query, _RetireEvents, extra_args=[cutoff_dt], page_size=_EVENT_PAGE_SIZE,
+      queue=constants.TASK_QUEUE.QUERY)
+
+
+def DeleteArchivedVotes():
+  """Deletes all Votes which were archived before the retention period."""
+  if settings.ARCHIVED_VOTE_RETENTION_DAYS is None:
+    logging.info('Archived Vote retention is disabled')
+    return
+
+  cutoff_dt = _GetCutoffDt(settings.ARCHIVED_VOTE_RETENTION_DAYS)
+  # pylint: disable=g-explicit-bool-comparison, singleton-comparison
+  query = vote_models.Vote.query(
+      vote_models.Vote.in_effect == False,
+      vote_models.Vote.recorded_dt < cutoff_dt)
+  # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+  datastore_utils.QueuedPaginatedBatchApply(
+      query, _DeleteArchivedVotes, page_size=_VOTE_PAGE_SIZE,
+      queue=constants.TASK_QUEUE.QUERY, keys_only=True)
+
+
+class EnforceRetention(handler_utils.CronJobHandler):
+  """Removes Event and Vote history which exceeds retention."""
+
+  def get(self):  # pylint: disable=g-bad-name
+    logging.info('Enforcing Event and Vote retention...')
+    RetireEvents()
+    DeleteArchivedVotes()
+
+
+ROUTES = routes.PathPrefixRoute('/retention', [
+    webapp2.Route('/enforce', handler=EnforceRetention),
+])
@@ -0,0 +1,200 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for retention.py."""
+
+import datetime
+import httplib
+
+import webapp2
+
+from google.appengine.ext import ndb
+
+from upvote.gae.cron import retention
+from upvote.gae.datastore import test_utils
+from upvote.gae.datastore.models import base as base_models
+from upvote.gae.datastore.models import event_summary as event_summary_models
+from upvote.gae.datastore.models import host as host_models
+from upvote.gae.datastore.models import user as user_models
+from upvote.gae.datastore.models import utils as model_utils
+from upvote.gae.datastore.models import vote as vote_models
+from upvote.gae.lib.testing import basetest
+from upvote.shared import constants
+
+
+class RetentionTest(basetest.UpvoteTestCase):
+
+  def setUp(self, **kwargs):
+    super(RetentionTest, self).setUp(**kwargs)
+    self.now = datetime.datetime.utcnow()
+    self.blockable = test_utils.CreateSantaBlockable()
+    self.user = test_utils.CreateUser()
+
+  def _CreateEvent(self, host_id, blockable=None, **kwargs):
+    blockable = blockable or self.blockable
+    key = ndb.Key(
+        pairs=[
+            (user_models.User, self.user.key.id()),
+            (host_models.Host, host_id)] +
+        blockable.key.pairs() + [(base_models.Event, '1')])
+    kwargs.setdefault('last_blocked_dt', self.now)
+    return test_utils.CreateSantaEvent(
+        blockable, key=key, host_id=host_id, executing_user=self.user.nickname,
+        first_blocked_dt=self.now, **kwargs)
+
+
+class RetireEventsTest(RetentionTest):
+
+  def testRollUp(self):
+    events = [
+        self._CreateEvent('host1', count=2), self._CreateEvent('host2')]
+    cutoff_dt = self.now + datetime.timedelta(days=1)
+
+    self.assertEqual(2, retention._RetireEvents(events, cutoff_dt))
+
+    self.assertEntityCount(base_models.Event, 0)
+    blockable_summary = event_summary_models.BlockableEventSummary.get_by_id(
+        self.blockable.key.id())
+    self.assertEqual(2, blockable_summary.unique_event_count)
+    self.assertEqual(3, blockable_summary.event_count)
+    self.assertEqual(self.now, blockable_summary.last_blocked_dt)
+
+    host_summary = event_summary_models.HostEventSummary.get_by_id('host1')
+    self.assertEqual(1, host_summary.unique_event_count)
+    self.assertEqual([self.user.nickname], host_summary.executing_users)
+    self.assertEqual([self.user.key], host_summary.user_keys)
+
+  def testRollUp_Associations(self):
+    event = self._CreateEvent('host1')
+    retention._RetireEvents([event], self.now + datetime.timedelta(days=1))
+
+    # The Host should remain associated with the User through the summary.
+    self.assertEqual(
+        [self.user.nickname],
+        model_utils.GetUsersAssociatedWithSantaHost('host1'))
+    self.assertIn('host1', model_utils.GetSantaHostIdsForUser(self.user))
+
+  def testRetain_OpenExemption(self):
+    test_utils.CreateExemption('host1')
+    events = [self._CreateEvent('host1'), self._CreateEvent('host2')]
+
+    retention._RetireEvents(events, self.now + datetime.timedelta(days=1))
+
+    self.assertIsNotNone(events[0].key.get())
+    self.assertIsNone(events[1].key.get())
+
+  def testRetain_ClosedExemption(self):
+    test_utils.CreateExemption(
+        'host1', initial_state=constants.EXEMPTION_STATE.EXPIRED)
+    event = self._CreateEvent('host1')
+
+    retention._RetireEvents([event], self.now + datetime.timedelta(days=1))
+
+    self.assertIsNone(event.key.get())
+
+  def testRetain_RecurredEvent(self):
+    self.Patch(
+        retention, '_GetRecentlyActiveBlockableKeys', return_value=set())
+    event = self._CreateEvent('host1')
+
+    # The Event was blocked again after this cutoff.
+    self.assertEqual(
+        0, retention._RetireEvents(
+            [event], self.now - datetime.timedelta(days=1)))
+    self.assertIsNotNone(event.key.get())
+    self.assertEntityCount(event_summary_models.BlockableEventSummary, 0)
+
+  def testRetain_RecentlyActiveBlockable(self):
+    event = self._CreateEvent(
+        'host1', last_blocked_dt=self.now - datetime.timedelta(days=2))
+
+    # The Blockable was updated after this cutoff.
+    self.assertEqual(
+        0, retention._RetireEvents(
+            [event], self.now - datetime.timedelta(days=1)))
+    self.assertIsNotNone(event.key.get())
+
+  def testUniqueEventCounter(self):
+    counter = constants.BLOCKABLE_COUNTER.UNIQUE_EVENTS
+    event = self._CreateEvent('host1')
+    base_models.BlockableCounterShard.Initialize(
+        self.blockable.key, counter, 1)
+
+    retention._RetireEvents([event], self.now + datetime.timedelta(days=1))
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertEqual(
+        0, base_models.BlockableCounterShard.GetCount(
+            self.blockable.key, counter))
+
+  def testRetireEvents(self):
+    self.PatchSetting('EVENT_RETENTION_DAYS', -1)
+    for host_id in ('host1', 'host2', 'host3'):
+      self._CreateEvent(host_id)
+
+    retention.RetireEvents()
+    self.DrainTaskQueue(constants.TASK_QUEUE.QUERY)
+
+    self.assertEntityCount(base_models.Event, 0)
+    self.assertEqual(
+        3, event_summary_models.BlockableEventSummary.get_by_id(
+            self.blockable.key.id()).unique_event_count)
+
+  def testRetireEvents_Disabled(self):
+    self.PatchSetting('EVENT_RETENTION_DAYS', None)
+    self._CreateEvent('host1')
+
+    retention.RetireEvents()
+
+    self.assertTaskCount(constants.TASK_QUEUE.QUERY, 0)
+    self.assertEntityCount(base_models.Event, 1)
+
+
+class DeleteArchivedVotesTest(RetentionTest):
+
+  def testDeleteArchivedVotes(self):
+    self.PatchSetting('ARCHIVED_VOTE_RETENTION_DAYS', -1)
+    vote = test_utils.CreateVote(self.blockable)
+    archived_vote = test_utils.CreateVote(self.blockable)
+    archived_vote.key.delete()
+    archived_vote.key = vote_models.Vote.GetKey(
+        self.blockable.key, archived_vote.user_key, in_effect=False)
+    archived_vote.put()
+
+    retention.DeleteArchivedVotes()
+    self.DrainTaskQueue(constants.TASK_QUEUE.QUERY)
+
+    self.assertIsNotNone(vote.key.get())
+    self.assertIsNone(archived_vote.key.get())
+
+
+class EnforceRetentionTest(RetentionTest):
+
+  ROUTE = '/retention/enforce'
+
+  def setUp(self):
+    app = webapp2.WSGIApplication(routes=[retention.ROUTES])
+    super(EnforceRetentionTest, self).setUp(wsgi_app=app)
+
+  def testSuccess(self):
+    response = self.testapp.get(
+        self.ROUTE, headers={'X-AppEngine-Cron': 'true'})
+    self.assertEqual(httplib.OK, response.status_int)
+
+    # One task chain for each of Events and Votes.
+    self.assertTaskCount(constants.TASK_QUEUE.QUERY, 2)
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -38,6 +38,9 @@ from upvote.shared import constants
 # This number may need tweaking.
 BATCH_SIZE = 1000
 
+# The number of key ranges the LockSpider crawls concurrently.
+_LOCK_SPIDER_RANGE_COUNT = 10
+
 # Done for the sake of brevity.
 _SANTA_CLIENT_MODE = constants.SANTA_CLIENT_MODE
 
@@ -218,7 +221,8 @@ class LockSpider(handler_utils.CronJobHandler):
         host_models.SantaHost.client_mode_lock == False)
     datastore_utils.QueuedPaginatedBatchApply(
         query, _SpiderBite, page_size=BATCH_SIZE,
-        queue=constants.TASK_QUEUE.QUERY, keys_only=True)
+        queue=constants.TASK_QUEUE.QUERY, range_count=_LOCK_SPIDER_RANGE_COUNT,
+        keys_only=True)
 
 
 def _SpiderBite(host_keys):
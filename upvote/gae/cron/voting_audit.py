@@ -0,0 +1,37 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Cron job which audits the voting state of all Blockables."""
+
+import logging
+
+import webapp2
+from webapp2_extras import routes
+
+from upvote.gae.lib.voting import api as voting_api
+from upvote.gae.utils import handler_utils
+
+
+class AuditBlockables(handler_utils.CronJobHandler):
+  """Recounts any Blockables whose state is inconsistent with their votes."""
+
+  def get(self):  # pylint: disable=g-bad-name
+    logging.info('Auditing all Blockables...')
+    voting_api.AuditAll()
+
+
+ROUTES = routes.PathPrefixRoute('/voting', [
+    webapp2.Route('/audit-blockables', handler=AuditBlockables),
+])
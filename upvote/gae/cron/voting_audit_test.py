@@ -0,0 +1,55 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+"""Unit tests for voting_audit.py."""
+
+import httplib
+
+import webapp2
+
+from upvote.gae.cron import voting_audit
+from upvote.gae.datastore import test_utils
+from upvote.gae.lib.testing import basetest
+from upvote.shared import constants
+
+
+class AuditBlockablesTest(basetest.UpvoteTestCase):
+
+  ROUTE = '/voting/audit-blockables'
+
+  def setUp(self):
+    app = webapp2.WSGIApplication(routes=[voting_audit.ROUTES])
+    super(AuditBlockablesTest, self).setUp(wsgi_app=app)
+
+  def testSuccess(self):
+    blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateVote(blockable)
+
+    # Knock the stored score out of sync with the Votes.
+    blockable.score = 0
+    blockable.put()
+
+    response = self.testapp.get(
+        self.ROUTE, headers={'X-AppEngine-Cron': 'true'})
+    self.assertEqual(httplib.OK, response.status_int)
+
+    self.assertTaskCount(constants.TASK_QUEUE.QUERY, 1)
+    self.DrainTaskQueue(constants.TASK_QUEUE.QUERY)
+
+    self.assertEqual(1, blockable.key.get().score)
+
+
+if __name__ == '__main__':
+  basetest.main()
@@ -0,0 +1,136 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""An instance-level read-through cache of immutable entity metadata.
+
+Models opt in by listing the properties which never change after creation in
+an IMMUTABLE_PROPERTIES class attribute. Only those properties are cached, so
+mutable state (e.g. a Blockable's state and score) must still be read from
+Datastore.
+
+The cache is local to each instance. Invalidation is therefore best-effort, and
+callers must only rely on properties that are genuinely immutable.
+"""
+
+import collections
+import threading
+
+from google.appengine.ext import ndb
+
+
+# The maximum number of entities whose metadata is cached by each instance.
+_MAX_SIZE = 10000
+
+
+class Metadata(collections.namedtuple('Metadata', ['key', 'properties'])):
+  """The immutable metadata of an entity.
+
+  Attributes:
+    key: Key, The key of the entity.
+    properties: dict, The values of the entity's immutable properties.
+  """
+
+
+class _LruCache(object):
+  """A thread-safe cache which evicts its least-recently-used entries."""
+
+  def __init__(self, max_size):
+    self._max_size = max_size
+    self._entries = collections.OrderedDict()
+    self._lock = threading.Lock()
+
+  def Get(self, key):
+    with self._lock:
+      value = self._entries.pop(key, None)
+      if value is not None:
+        self._entries[key] = value
+      return value
+
+  def Set(self, key, value):
+    with self._lock:
+      self._entries.pop(key, None)
+      self._entries[key] = value
+      while len(self._entries) > self._max_size:
+        self._entries.popitem(last=False)
+
+  def Delete(self, key):
+    with self._lock:
+      self._entries.pop(key, None)
+
+  def Clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def __len__(self):
+    return len(self._entries)
+
+
+_CACHE = _LruCache(_MAX_SIZE)
+
+
+def _GetImmutableProperties(entity):
+  return getattr(type(entity), 'IMMUTABLE_PROPERTIES', None)
+
+
+def _ToMetadata(entity):
+  immutable_properties = _GetImmutableProperties(entity) or ()
+  return Metadata(
+      key=entity.key,
+      properties={
+          name: getattr(entity, name) for name in immutable_properties})
+
+
+@ndb.tasklet
+def GetMultiAsync(keys):
+  """Gets the immutable metadata of several entities.
+
+  Args:
+    keys: list<Key>, The keys of the entities.
+
+  Returns:
+    A Future resolving to a list containing the Metadata of each entity, or None
+    for those which don't exist.
+  """
+  keys = list(keys)
+  results = [_CACHE.Get(key) for key in keys]
+
+  missing_keys = [key for key, result in zip(keys, results) if result is None]
+  if missing_keys:
+    entities = yield ndb.get_multi_async(missing_keys)
+    fetched = {}
+    for entity in entities:
+      if entity is None:
+        continue
+      metadata = _ToMetadata(entity)
+      fetched[entity.key] = metadata
+
+      # Only those models which declare their immutable properties are cached.
+      if _GetImmutableProperties(entity) is not None:
+        _CACHE.Set(entity.key, metadata)
+    results = [result or fetched.get(key) for key, result in zip(keys, results)]
+
+  raise ndb.Return(results)
+
+
+def GetMulti(keys):
+  return GetMultiAsync(keys).get_result()
+
+
+def Invalidate(key):
+  """Discards any metadata cached for an entity by this instance."""
+  _CACHE.Delete(key)
+
+
+def Clear():
+  _CACHE.Clear()
@@ -0,0 +1,96 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Unit tests for metadata_cache.py."""
+
+from google.appengine.ext import ndb
+
+from upvote.gae.datastore import metadata_cache
+from upvote.gae.datastore import test_utils
+from upvote.gae.datastore.models import santa
+from upvote.gae.lib.testing import basetest
+
+
+class GetMultiTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(GetMultiTest, self).setUp()
+    self.cert = test_utils.CreateSantaCertificate(organization='Acme')
+    self.binary = test_utils.CreateSantaBlockable(cert_key=self.cert.key)
+
+  def testGetMulti(self):
+    missing_key = ndb.Key(santa.SantaBlockable, 'missing')
+
+    cert_metadata, binary_metadata, missing_metadata = (
+        metadata_cache.GetMulti([self.cert.key, self.binary.key, missing_key]))
+
+    self.assertEqual(self.cert.key, cert_metadata.key)
+    self.assertEqual('Acme', cert_metadata.properties['organization'])
+    self.assertEqual(self.cert.key, binary_metadata.properties['cert_key'])
+    self.assertIsNone(missing_metadata)
+
+  def testGetMulti_Cached(self):
+    metadata_cache.GetMulti([self.cert.key])
+    mock_get_multi = self.Patch(ndb, 'get_multi_async')
+
+    metadata = metadata_cache.GetMulti([self.cert.key])[0]
+
+    self.assertEqual('Acme', metadata.properties['organization'])
+    self.assertFalse(mock_get_multi.called)
+
+  def testGetMulti_MutablePropertiesExcluded(self):
+    metadata = metadata_cache.GetMulti([self.cert.key])[0]
+
+    self.assertNotIn('state', metadata.properties)
+    self.assertNotIn('score', metadata.properties)
+
+  def testGetMulti_NotCacheable(self):
+    bundle = test_utils.CreateSantaBundle()
+    metadata_cache.GetMulti([bundle.key])
+
+    # Bundles don't declare any immutable properties, so must be re-read.
+    bundle.key.delete()
+    self.assertIsNone(metadata_cache.GetMulti([bundle.key])[0])
+
+  def testInvalidate_Put(self):
+    metadata_cache.GetMulti([self.cert.key])
+    self.cert.organization = 'Acme Corp'
+    self.cert.put()
+
+    metadata = metadata_cache.GetMulti([self.cert.key])[0]
+
+    self.assertEqual('Acme Corp', metadata.properties['organization'])
+
+  def testInvalidate_Delete(self):
+    metadata_cache.GetMulti([self.cert.key])
+    self.cert.key.delete()
+
+    self.assertIsNone(metadata_cache.GetMulti([self.cert.key])[0])
+
+  def testEviction(self):
+    self.Patch(
+        metadata_cache, '_CACHE',
+        metadata_cache._LruCache(1))  # pylint: disable=protected-access
+    metadata_cache.GetMulti([self.cert.key])
+    metadata_cache.GetMulti([self.binary.key])
+
+    # The certificate should have been evicted to make room for the binary.
+    mock_get_multi = self.Patch(
+        ndb, 'get_multi_async', wraps=ndb.get_multi_async)
+    metadata_cache.GetMulti([self.cert.key])
+    mock_get_multi.assert_called_once_with([self.cert.key])
+
+
+if __name__ == '__main__':
+  basetest.main()
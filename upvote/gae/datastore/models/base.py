@@ -13,14 +13,21 @@
 # limitations under the License.
 
 """Model definitions for Upvote."""
+import collections
 import datetime
+import functools
 import hashlib
 import logging
+import random
+import time
 
+from google.appengine.api import taskqueue
+from google.appengine.ext import deferred
 from google.appengine.ext import ndb
 from google.appengine.ext.ndb import polymodel
 
 from upvote.gae.bigquery import tables
+from upvote.gae.datastore import metadata_cache
 from upvote.gae.datastore import utils as datastore_utils
 from upvote.gae.datastore.models import mixin
 from upvote.gae.datastore.models import user as user_models
@@ -28,6 +35,22 @@ from upvote.gae.datastore.models import vote as vote_models
 from upvote.shared import constants
 
 
+# How long updates to existing Events are buffered as EventUpdates before they're
+# flushed into the Events in bulk.
+_EVENT_UPDATE_FLUSH_INTERVAL = datetime.timedelta(minutes=1)
+
+# The number of EventUpdates read at a time when flushing.
+_EVENT_UPDATE_FLUSH_PAGE_SIZE = 500
+
+# The maximum number of EventUpdates applied per transaction. Each EventUpdate
+# is its own entity group and, along with the user's entity group, a transaction
+# may span at most 25 of them.
+_EVENT_UPDATE_FLUSH_BATCH_SIZE = 24
+
+# The number of shards across which each of a Blockable's counters is spread.
+_BLOCKABLE_COUNTER_SHARD_COUNT = 10
+
+
 class Error(Exception):
   """Base error for models."""
 
@@ -76,6 +99,10 @@ class Event(mixin.Base, polymodel.PolyModel):
   last_blocked_dt = ndb.DateTimeProperty()
   count = ndb.IntegerProperty(default=1)
 
+  SUMMARY_PROPERTIES = frozenset([
+      'blockable_key', 'file_name', 'host_id', 'executing_user', 'event_type',
+      'last_blocked_dt', 'count'])
+
   @property
   def run_by_local_admin(self):
     """Whether the Event was generated by the platform's admin user.
@@ -144,6 +171,186 @@ class Event(mixin.Base, polymodel.PolyModel):
     return result
 
 
+class EventUpdate(ndb.Model):
+  """A buffered update to an existing Event.
+
+  When an Event that already exists is reported again, the report is stored as
+  an EventUpdate rather than being deduped into the Event right away. Each
+  EventUpdate is a root entity, so buffering one doesn't contend with the
+  Event's entity group. The EventUpdates are periodically applied to their
+  Events in bulk by FlushEventUpdates.
+
+  Attributes:
+    event: Event, the reported duplicate of the Event, including its key.
+    recorded_dt: datetime, when the update was buffered.
+  """
+  event = ndb.LocalStructuredProperty(Event, keep_keys=True)
+  recorded_dt = ndb.DateTimeProperty(auto_now_add=True)
+
+  @classmethod
+  @ndb.tasklet
+  def BufferAsync(cls, events):
+    """Buffers updates to existing Events and schedules a flush.
+
+    Args:
+      events: list<Event>, The reported duplicates of existing Events.
+    """
+    updates = [cls(event=event) for event in events]
+    yield ndb.put_multi_async(updates)
+    logging.info('Buffered updates to %d Event(s)', len(updates))
+    _ScheduleEventUpdateFlush()
+
+
+def _ScheduleEventUpdateFlush():
+  """Schedules a flush of the EventUpdates at the end of the current interval.
+
+  The flush task is named after the current interval, so only one is scheduled
+  no matter how many updates are buffered during it.
+  """
+  interval_secs = int(_EVENT_UPDATE_FLUSH_INTERVAL.total_seconds())
+  interval = int(time.time()) // interval_secs
+  try:
+    deferred.defer(
+        FlushEventUpdates, _name='flush-event-updates-%d' % interval,
+        _countdown=interval_secs, _queue=constants.TASK_QUEUE.DEFAULT)
+  except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+    pass
+
+
+@ndb.tasklet
+def _ApplyEventUpdateBatch(update_keys):
+  """Applies a batch of EventUpdates for a single user to their Events."""
+  # Re-read the EventUpdates inside the transaction so that any which were
+  # already applied by a concurrent flush aren't applied again.
+  updates = yield ndb.get_multi_async(update_keys)
+  updates = sorted(
+      (update for update in updates if update is not None),
+      key=lambda update: update.recorded_dt)
+  if not updates:
+    return
+
+  event_keys = list({update.event.key for update in updates})
+  events = yield ndb.get_multi_async(event_keys)
+  events_by_key = {event.key: event for event in events if event is not None}
+
+  recreated_events = []
+  for update in updates:
+    event = events_by_key.get(update.event.key)
+    # If the Event was deleted in the meantime, the update recreates it.
+    if event is None:
+      events_by_key[update.event.key] = update.event
+      recreated_events.append(update.event)
+    else:
+      event.Dedupe(update.event)
+  DeferCountNewEvents(recreated_events)
+
+  yield (
+      ndb.put_multi_async(events_by_key.values()),
+      ndb.delete_multi_async(update.key for update in updates))
+
+
+@ndb.tasklet
+def _ApplyUserEventUpdates(update_keys):
+  # The batches share the user's entity group, so they're applied sequentially
+  # to avoid contention.
+  batch_size = _EVENT_UPDATE_FLUSH_BATCH_SIZE
+  for i in xrange(0, len(update_keys), batch_size):
+    batch = update_keys[i:i + batch_size]
+    yield ndb.transaction_async(
+        functools.partial(_ApplyEventUpdateBatch, batch), xg=True)
+
+
+def FlushEventUpdates():
+  """Applies all buffered EventUpdates to their Events."""
+  total_count = 0
+  query = EventUpdate.query()
+  for page in datastore_utils.Paginate(
+      query, page_size=_EVENT_UPDATE_FLUSH_PAGE_SIZE):
+
+    # Each user's Events share an entity group, so apply each user's updates
+    # separately, and all users' updates concurrently.
+    update_keys_by_user = collections.defaultdict(list)
+    for update in page:
+      update_keys_by_user[update.event.user_key].append(update.key)
+    futures = [
+        _ApplyUserEventUpdates(update_keys)
+        for update_keys in update_keys_by_user.itervalues()]
+    ndb.Future.wait_all(futures)
+    for future in futures:
+      future.check_success()
+
+    total_count += len(page)
+
+  logging.info('Flushed %d Event update(s)', total_count)
+
+
+def DeferCounterIncrements(counter, deltas):
+  """Defers incrementing a counter for several Blockables.
+
+  If called within a transaction, the counters are only incremented if the
+  transaction commits.
+
+  Args:
+    counter: str, The statistic being counted.
+    deltas: dict, Maps the keys of the Blockables whose counters should be
+        updated to the amount by which to increment each.
+  """
+  if deltas:
+    deferred.defer(
+        BlockableCounterShard.IncrementMulti, counter, dict(deltas),
+        _queue=constants.TASK_QUEUE.DEFAULT,
+        _transactional=ndb.in_transaction())
+
+
+def DeferCounterReset(blockable_key, counter):
+  """Defers resetting a Blockable's counter so it will be recomputed.
+
+  If called within a transaction, the counter is only reset if the transaction
+  commits.
+
+  Args:
+    blockable_key: Key, The Blockable whose counter should be reset.
+    counter: str, The statistic being counted.
+  """
+  deferred.defer(
+      BlockableCounterShard.Reset, blockable_key, counter,
+      _queue=constants.TASK_QUEUE.DEFAULT,
+      _transactional=ndb.in_transaction())
+
+
+def _DeferCountEvents(events, delta):
+  deltas = collections.Counter()
+  for event in events:
+    deltas[event.blockable_key] += delta
+    if event.cert_key:
+      deltas[event.cert_key] += delta
+  DeferCounterIncrements(constants.BLOCKABLE_COUNTER.UNIQUE_EVENTS, deltas)
+
+
+def DeferCountNewEvents(events):
+  """Defers incrementing the unique Event counters for newly-created Events.
+
+  If called within a transaction, the counters are only incremented if the
+  transaction commits.
+
+  Args:
+    events: list<Event>, The newly-created Events.
+  """
+  _DeferCountEvents(events, 1)
+
+
+def DeferCountDeletedEvents(events):
+  """Defers decrementing the unique Event counters for deleted Events.
+
+  If called within a transaction, the counters are only decremented if the
+  transaction commits.
+
+  Args:
+    events: list<Event>, The deleted Events.
+  """
+  _DeferCountEvents(events, -1)
+
+
 class Note(polymodel.PolyModel):
   """An entity used for annotating other entities.
 
@@ -167,6 +374,100 @@ class Note(polymodel.PolyModel):
     return ndb.Key(Note, key_hash, parent=parent)
 
 
+class BlockableCounterShard(ndb.Model):
+  """A shard of a maintained counter of some statistic about a Blockable.
+
+  key = Key(BlockableCounterShard, '<counter>/<blockable id>/<shard index>')
+
+  Each counter is spread across several root entities so that it can be
+  updated concurrently without contention, and read with a single get_multi.
+
+  A counter has no value until it's initialized from a count of the entities
+  it tracks. Initialization marks the first shard and adjusts its count so
+  that the shards add up to the freshly computed value. Resetting a counter
+  deletes its shards, so it's initialized again the next time it's read.
+
+  Attributes:
+    blockable_key: Key, The Blockable whose statistic is counted.
+    counter: str, The statistic being counted.
+    count: int, This shard's part of the counter's value.
+    initialized: bool, Whether the counter has been initialized. Only set on the
+        first shard.
+    updated_dt: datetime, When the shard was last updated.
+  """
+  blockable_key = ndb.KeyProperty()
+  counter = ndb.StringProperty(choices=constants.BLOCKABLE_COUNTER.SET_ALL)
+  count = ndb.IntegerProperty(default=0, indexed=False)
+  initialized = ndb.BooleanProperty(default=False, indexed=False)
+  updated_dt = ndb.DateTimeProperty(auto_now=True)
+
+  @classmethod
+  def GetKeys(cls, blockable_key, counter):
+    return [
+        ndb.Key(cls, '%s/%s/%d' % (counter, blockable_key.id(), i))
+        for i in xrange(_BLOCKABLE_COUNTER_SHARD_COUNT)]
+
+  @classmethod
+  def GetCount(cls, blockable_key, counter):
+    """Returns the value of a counter, or None if it isn't initialized."""
+    shards = ndb.get_multi(cls.GetKeys(blockable_key, counter))
+    if shards[0] is None or not shards[0].initialized:
+      return None
+    return sum(shard.count for shard in shards if shard is not None)
+
+  @classmethod
+  @ndb.transactional_tasklet
+  def _IncrementShard(cls, shard_key, blockable_key, counter, delta):
+    shard = yield shard_key.get_async()
+    if shard is None:
+      shard = cls(key=shard_key, blockable_key=blockable_key, counter=counter)
+    shard.count += delta
+    yield shard.put_async()
+
+  @classmethod
+  def IncrementMulti(cls, counter, deltas):
+    """Increments a counter for several Blockables at once.
+
+    Args:
+      counter: str, The statistic being counted.
+      deltas: dict, Maps the keys of the Blockables whose counters should be
+          updated to the amount by which to increment each.
+    """
+    futures = [
+        cls._IncrementShard(
+            random.choice(cls.GetKeys(blockable_key, counter)), blockable_key,
+            counter, delta)
+        for blockable_key, delta in deltas.iteritems()]
+    ndb.Future.wait_all(futures)
+    for future in futures:
+      future.check_success()
+
+  @classmethod
+  @ndb.transactional(xg=True)
+  def Initialize(cls, blockable_key, counter, value):
+    """Initializes a counter with a freshly computed value.
+
+    Args:
+      blockable_key: Key, The Blockable whose statistic is counted.
+      counter: str, The statistic being counted.
+      value: int, The current value of the statistic.
+    """
+    keys = cls.GetKeys(blockable_key, counter)
+    shards = ndb.get_multi(keys)
+
+    first_shard = shards[0] or cls(
+        key=keys[0], blockable_key=blockable_key, counter=counter)
+    first_shard.count = value - sum(
+        shard.count for shard in shards[1:] if shard is not None)
+    first_shard.initialized = True
+    first_shard.put()
+
+  @classmethod
+  def Reset(cls, blockable_key, counter):
+    """Discards a counter's value, so it will be re-initialized when read."""
+    ndb.delete_multi(cls.GetKeys(blockable_key, counter))
+
+
 class Blockable(mixin.Base, polymodel.PolyModel):
   """An entity that has been blocked.
 
@@ -193,24 +494,6 @@ class Blockable(mixin.Base, polymodel.PolyModel):
     state_change_dt: datetime, when the state of this blockable changed.
   """
 
-  def _CalculateScore(self):
-    # NOTE: Since the 'score' property is a ComputedProperty, it will
-    # be re-computed before every put. Consequently, when a Blockable is put for
-    # the first time, we won't see a pre-existing value for 'score'. Here, we
-    # avoid the score calculation for newly-created Blockables as they shouldn't
-    # have any Votes associated with them and, thus, should have a score of 0.
-    if not datastore_utils.HasValue(self, 'score'):
-      return 0
-
-    tally = 0
-    votes = self.GetVotes()
-    for vote in votes:
-      if vote.was_yes_vote:
-        tally += vote.weight
-      else:
-        tally -= vote.weight
-    return tally
-
   id_type = ndb.StringProperty(choices=constants.ID_TYPE.SET_ALL, required=True)
   blockable_hash = ndb.StringProperty()
   file_name = ndb.StringProperty()
@@ -231,7 +514,24 @@ class Blockable(mixin.Base, polymodel.PolyModel):
       default=constants.STATE.UNTRUSTED)
   state_change_dt = ndb.DateTimeProperty(auto_now_add=True)
 
-  score = ndb.ComputedProperty(_CalculateScore)
+  # NOTE: The score is maintained incrementally by the voting code
+  # and is only reconciled against the Votes themselves by a Recount.
+  score = ndb.IntegerProperty(default=0)
+
+  # The properties which never change after creation, and so may be cached by
+  # metadata_cache. None if the model's metadata shouldn't be cached.
+  IMMUTABLE_PROPERTIES = None
+
+  SUMMARY_PROPERTIES = frozenset([
+      'class_', 'id_type', 'file_name', 'publisher', 'product_name', 'version',
+      'flagged', 'state', 'score', 'recorded_dt'])
+
+  def _post_put_hook(self, future):
+    metadata_cache.Invalidate(self.key)
+
+  @classmethod
+  def _post_delete_hook(cls, key, future):
+    metadata_cache.Invalidate(key)
 
   # FBN
   is_compiler = ndb.BooleanProperty(default=False)
@@ -249,6 +549,23 @@ class Blockable(mixin.Base, polymodel.PolyModel):
     self.InsertBigQueryRow(
         constants.BLOCK_ACTION.STATE_CHANGE, timestamp=self.state_change_dt)
 
+  def CalculateScore(self, votes=None):
+    """Calculates the score of this Blockable from its in-effect Votes.
+
+    This requires a query over every Vote cast for this Blockable and is only
+    intended for reconciling the stored score (e.g. during a Recount).
+
+    Args:
+      votes: list<Vote>, If provided, the already-fetched in-effect Votes for
+          this Blockable. Otherwise, they'll be queried.
+
+    Returns:
+      int, The sum of the effective weights of all in-effect Votes.
+    """
+    if votes is None:
+      votes = self.GetVotes()
+    return sum(vote.effective_weight for vote in votes)
+
   def GetVotes(self):
     """Queries for all Votes cast for this Blockable.
 
@@ -326,23 +643,15 @@ class Blockable(mixin.Base, polymodel.PolyModel):
     self.state = constants.STATE.UNTRUSTED
     self.state_change_dt = datetime.datetime.utcnow()
     self.flagged = False
+    self.score = 0
     self.put()
 
     self.InsertBigQueryRow(
         constants.BLOCK_ACTION.RESET, timestamp=self.state_change_dt)
 
   def to_dict(self, include=None, exclude=None):  # pylint: disable=g-bad-name
-    if exclude is None: exclude = []
-    exclude += ['score']
     result = super(Blockable, self).to_dict(include=include, exclude=exclude)
 
-    # NOTE: This is not ideal but it prevents CalculateScore from being
-    # called when serializing Blockables. This will return an inaccurate value
-    # if a vote was cast after the Blockable was retrieved but this can be
-    # avoided by wrapping the call to to_dict in a transaction.
-    result['score'] = datastore_utils.GetLocalComputedPropertyValue(
-        self, 'score')
-
     allowed, reason = self.IsVotingAllowed()
     result['is_voting_allowed'] = allowed
     result['voting_prohibited_reason'] = reason
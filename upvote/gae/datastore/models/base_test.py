@@ -23,6 +23,7 @@ from google.appengine.ext import ndb
 from upvote.gae.datastore import test_utils
 from upvote.gae.datastore import utils as datastore_utils
 from upvote.gae.datastore.models import base
+from upvote.gae.datastore.models import santa
 from upvote.gae.datastore.models import utils as model_utils
 from upvote.gae.datastore.models import vote as vote_models
 from upvote.gae.lib.testing import basetest
@@ -135,6 +136,148 @@ class EventTest(basetest.UpvoteTestCase):
     self.assertEqual(3, events[0].count)
 
 
+class EventUpdateTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(EventUpdateTest, self).setUp()
+
+    self.PatchSetting('EVENT_CREATION', constants.EVENT_CREATION.EXECUTING_USER)
+
+    self.now = datetime.datetime.utcnow()
+    self.blockable = test_utils.CreateSantaBlockable()
+    self.user = test_utils.CreateUser()
+    self.event = test_utils.CreateSantaEvent(
+        self.blockable, first_blocked_dt=self.now, last_blocked_dt=self.now,
+        executing_user=self.user.nickname, file_name='original')
+    self.event.key = model_utils.GetEventKeysToInsert(self.event, [], [])[0]
+    self.event.put()
+
+  def _ReportAgain(self, seconds_later, file_name='later'):
+    return datastore_utils.CopyEntity(
+        self.event, new_key=self.event.key, file_name=file_name,
+        last_blocked_dt=self.now + datetime.timedelta(seconds=seconds_later))
+
+  def testBufferAsync(self):
+    base.EventUpdate.BufferAsync([self._ReportAgain(1)]).get_result()
+    base.EventUpdate.BufferAsync([self._ReportAgain(2)]).get_result()
+
+    # The Event itself shouldn't be touched until the updates are flushed.
+    self.assertEntityCount(base.EventUpdate, 2)
+    self.assertEqual(1, self.event.key.get().count)
+
+    # Only a single flush should be scheduled for the interval.
+    self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
+
+  def testFlush(self):
+    base.EventUpdate.BufferAsync([
+        self._ReportAgain(2, file_name='latest'),
+        self._ReportAgain(1)]).get_result()
+
+    base.FlushEventUpdates()
+
+    event = self.event.key.get()
+    self.assertIsInstance(event, santa.SantaEvent)
+    self.assertEqual(3, event.count)
+    self.assertEqual(self.now, event.first_blocked_dt)
+    self.assertEqual(
+        self.now + datetime.timedelta(seconds=2), event.last_blocked_dt)
+    self.assertEqual('latest', event.file_name)
+    self.assertEntityCount(base.EventUpdate, 0)
+
+  def testFlush_Deferred(self):
+    base.EventUpdate.BufferAsync([self._ReportAgain(1)]).get_result()
+
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertEqual(2, self.event.key.get().count)
+    self.assertEntityCount(base.EventUpdate, 0)
+
+  def testFlush_Batched(self):
+    self.Patch(base, '_EVENT_UPDATE_FLUSH_BATCH_SIZE', 2)
+    base.EventUpdate.BufferAsync(
+        [self._ReportAgain(i) for i in xrange(1, 6)]).get_result()
+
+    base.FlushEventUpdates()
+
+    self.assertEqual(6, self.event.key.get().count)
+    self.assertEntityCount(base.EventUpdate, 0)
+
+  def testFlush_DeletedEvent(self):
+    base.EventUpdate.BufferAsync([self._ReportAgain(1)]).get_result()
+    self.event.key.delete()
+
+    base.FlushEventUpdates()
+
+    # The update should recreate the Event.
+    event = self.event.key.get()
+    self.assertIsNotNone(event)
+    self.assertEqual(1, event.count)
+    self.assertEqual('later', event.file_name)
+
+
+class BlockableCounterShardTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(BlockableCounterShardTest, self).setUp()
+    self.blockable = test_utils.CreateBlockable()
+    self.counter = constants.BLOCKABLE_COUNTER.UNIQUE_EVENTS
+
+  def testGetCount_Uninitialized(self):
+    base.BlockableCounterShard.IncrementMulti(
+        self.counter, {self.blockable.key: 1})
+
+    self.assertIsNone(
+        base.BlockableCounterShard.GetCount(self.blockable.key, self.counter))
+
+  def testInitialize(self):
+    base.BlockableCounterShard.IncrementMulti(
+        self.counter, {self.blockable.key: 3})
+    base.BlockableCounterShard.Initialize(self.blockable.key, self.counter, 5)
+
+    self.assertEqual(
+        5, base.BlockableCounterShard.GetCount(self.blockable.key, self.counter))
+
+  def testIncrementMulti(self):
+    other_blockable = test_utils.CreateBlockable()
+    for blockable in (self.blockable, other_blockable):
+      base.BlockableCounterShard.Initialize(blockable.key, self.counter, 0)
+
+    for _ in xrange(4):
+      base.BlockableCounterShard.IncrementMulti(
+          self.counter, {self.blockable.key: 1, other_blockable.key: 2})
+
+    self.assertEqual(
+        4, base.BlockableCounterShard.GetCount(self.blockable.key, self.counter))
+    self.assertEqual(
+        8, base.BlockableCounterShard.GetCount(other_blockable.key, self.counter))
+
+  def testReset(self):
+    base.BlockableCounterShard.Initialize(self.blockable.key, self.counter, 5)
+
+    base.DeferCounterReset(self.blockable.key, self.counter)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertIsNone(
+        base.BlockableCounterShard.GetCount(self.blockable.key, self.counter))
+
+  def testDeferCountNewEvents(self):
+    cert = test_utils.CreateSantaCertificate()
+    binary = test_utils.CreateSantaBlockable(cert_key=cert.key)
+    for blockable in (binary, cert):
+      base.BlockableCounterShard.Initialize(blockable.key, self.counter, 0)
+    events = [
+        test_utils.CreateSantaEvent(binary, cert_key=cert.key, host_id=host_id)
+        for host_id in ('host1', 'host2')]
+
+    base.DeferCountNewEvents(events)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertEqual(
+        2, base.BlockableCounterShard.GetCount(binary.key, self.counter))
+    self.assertEqual(
+        2, base.BlockableCounterShard.GetCount(cert.key, self.counter))
+
+
 class NoteTest(basetest.UpvoteTestCase):
 
   def setUp(self):
@@ -161,16 +304,22 @@ class BlockableTest(basetest.UpvoteTestCase):
     self.user = test_utils.CreateUser(email=_TEST_EMAIL)
     self.Login(self.user.email)
 
-  def testAvoidInitialScoreCalculation(self):
+  def testPut_AvoidScoreCalculation(self):
     b = base.Blockable(id_type='SHA256')
     with mock.patch.object(b, 'GetVotes', return_value=[]) as get_votes_mock:
-      # First put should just set the score to be 0 and avoid the Vote query.
+      # No put should ever require the Vote query.
+      b.put()
       b.put()
       self.assertFalse(get_votes_mock.called)
+      self.assertEqual(0, b.key.get().score)
 
-      # Now that b has a score value, it should do the Vote query to update it.
-      b.put()
-      self.assertTrue(get_votes_mock.called)
+  def testCalculateScore(self):
+    self.assertEqual(0, self.blockable_1.CalculateScore())
+
+    test_utils.CreateVotes(self.blockable_1, 3, weight=2)
+    test_utils.CreateVote(self.blockable_1, was_yes_vote=False, weight=1)
+
+    self.assertEqual(5, self.blockable_1.CalculateScore())
 
   def testGetVotes(self):
     self.assertLen(self.blockable_1.GetVotes(), 0)
@@ -276,14 +425,11 @@ class BlockableTest(basetest.UpvoteTestCase):
   def testToDict_Score(self):
     blockable = test_utils.CreateBlockable()
     test_utils.CreateVote(blockable)
-    # Recalculate the 'score' property
-    blockable.put()
 
-    # Mock out the blockable's _CalculateScore function.
-    with mock.patch.object(
-        blockable._properties['score'], '_func') as calc_mock:  # pylint: disable=protected-access
+    # Serializing the blockable shouldn't require the Vote query.
+    with mock.patch.object(blockable, 'GetVotes') as get_votes_mock:
       blockable_dict = blockable.to_dict()
-      self.assertFalse(calc_mock.called)
+      self.assertFalse(get_votes_mock.called)
       self.assertIn('score', blockable_dict)
       self.assertEqual(1, blockable_dict['score'])
 
@@ -164,6 +164,10 @@ class Bit9Certificate(mixin.Bit9, base.Certificate):
   valid_to_dt = ndb.DateTimeProperty()
   parent_certificate_thumbprint = ndb.StringProperty()
 
+  IMMUTABLE_PROPERTIES = frozenset([
+      'id_type', 'valid_from_dt', 'valid_to_dt',
+      'parent_certificate_thumbprint'])
+
   def InsertBigQueryRow(self, action, **kwargs):
 
     defaults = {
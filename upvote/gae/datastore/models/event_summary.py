@@ -0,0 +1,118 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Models which summarize Events that have been removed by retention."""
+
+from google.appengine.ext import ndb
+
+from upvote.shared import constants
+
+
+class _EventSummary(ndb.Model):
+  """A rollup of the Events that have been deleted for exceeding retention.
+
+  Attributes:
+    unique_event_count: int, The number of Events rolled up.
+    event_count: int, The number of executions counted by the rolled up Events.
+    first_blocked_dt: datetime, The earliest execution of any rolled up Event.
+    last_blocked_dt: datetime, The latest execution of any rolled up Event.
+    updated_dt: datetime, When Events were last rolled up.
+  """
+  unique_event_count = ndb.IntegerProperty(default=0)
+  event_count = ndb.IntegerProperty(default=0)
+  first_blocked_dt = ndb.DateTimeProperty()
+  last_blocked_dt = ndb.DateTimeProperty()
+  updated_dt = ndb.DateTimeProperty(auto_now=True)
+
+  def _AddEvents(self, events):
+    for event in events:
+      self.unique_event_count += 1
+      self.event_count += event.count or 1
+      if event.first_blocked_dt and (
+          not self.first_blocked_dt or
+          event.first_blocked_dt < self.first_blocked_dt):
+        self.first_blocked_dt = event.first_blocked_dt
+      if event.last_blocked_dt and (
+          not self.last_blocked_dt or
+          event.last_blocked_dt > self.last_blocked_dt):
+        self.last_blocked_dt = event.last_blocked_dt
+
+  @classmethod
+  def _Create(cls, summary_id, event):
+    return cls(id=summary_id)
+
+  @classmethod
+  @ndb.transactional_tasklet
+  def RollUpAsync(cls, summary_id, events):
+    """Adds Events to a summary, creating it if necessary.
+
+    Args:
+      summary_id: str, The ID of the summary entity.
+      events: list<Event>, The Events to add, all of which share the summary.
+    """
+    summary = yield cls.get_by_id_async(summary_id)
+    if summary is None:
+      summary = cls._Create(summary_id, events[0])
+    summary._AddEvents(events)
+    yield summary.put_async()
+
+
+class BlockableEventSummary(_EventSummary):
+  """A rollup of the deleted Events for a Blockable.
+
+  key = Key(BlockableEventSummary, blockable_id)
+
+  Attributes:
+    blockable_key: Key, The Blockable whose Events were rolled up.
+  """
+  blockable_key = ndb.KeyProperty()
+
+  @classmethod
+  def _Create(cls, summary_id, event):
+    return cls(id=summary_id, blockable_key=event.blockable_key)
+
+
+class HostEventSummary(_EventSummary):
+  """A rollup of the deleted Events for a Host.
+
+  key = Key(HostEventSummary, host_id)
+
+  Attributes:
+    host_id: str, The Host whose Events were rolled up.
+    executing_users: list<str>, The users who executed the rolled up Events.
+    user_keys: list<Key>, The Users under whom the rolled up Events were stored.
+  """
+  host_id = ndb.StringProperty()
+  executing_users = ndb.StringProperty(repeated=True)
+  user_keys = ndb.KeyProperty(repeated=True)
+
+  @classmethod
+  def _Create(cls, summary_id, event):
+    return cls(id=summary_id, host_id=summary_id)
+
+  def _AddEvents(self, events):
+    super(HostEventSummary, self)._AddEvents(events)
+    executing_users = set(self.executing_users)
+    user_keys = set(self.user_keys)
+    for event in events:
+      if event.executing_user:
+        executing_users.add(event.executing_user)
+      user_keys.add(ndb.Key(pairs=event.key.pairs()[:1]))
+    self.executing_users = sorted(executing_users)
+    self.user_keys = list(user_keys)
+
+  def GetAssociatedUsers(self):
+    return [
+        user for user in self.executing_users
+        if user != constants.LOCAL_ADMIN.MACOS]
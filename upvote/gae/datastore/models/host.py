@@ -38,6 +38,9 @@ class Host(mixin.Base, polymodel.PolyModel):
   hidden = ndb.BooleanProperty(default=False)
   primary_user = ndb.StringProperty()
 
+  SUMMARY_PROPERTIES = frozenset([
+      'hostname', 'primary_user', 'hidden', 'recorded_dt'])
+
   @staticmethod
   def NormalizeId(host_id):
     return host_id.upper()
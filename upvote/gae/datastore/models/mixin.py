@@ -20,6 +20,10 @@ from upvote.shared import constants
 class Base(object):
   """Mixin for base NDB Models."""
 
+  # The properties to include when an entity is summarized in a list view. None
+  # if the model has no summary, in which case the whole entity is used.
+  SUMMARY_PROPERTIES = None
+
   def GetPlatformName(self):
     return None
 
@@ -43,6 +47,17 @@ class Base(object):
 
     return result
 
+  def ToSummaryDict(self):
+    """Convert the model to a dict containing only its SUMMARY_PROPERTIES.
+
+    Unlike the to_dict() overrides of subclasses, no fields are computed, so no
+    further Datastore lookups are made.
+
+    Returns:
+      The summary dict.
+    """
+    return Base.to_dict(self, include=self.SUMMARY_PROPERTIES)
+
 
 class Bit9(Base):
   """Mixin for Bit9 NDB Models."""
@@ -31,6 +31,19 @@ class TestPlatformModel(mixin.Base, ndb.Model):
     return 'some_platform'
 
 
+class TestSummaryModel(mixin.Base, ndb.Model):
+  int_prop = ndb.IntegerProperty()
+  str_prop = ndb.StringProperty()
+
+  SUMMARY_PROPERTIES = frozenset(['int_prop'])
+
+  def to_dict(self, include=None, exclude=None):  # pylint: disable=g-bad-name
+    result = super(TestSummaryModel, self).to_dict(
+        include=include, exclude=exclude)
+    result['computed'] = True
+    return result
+
+
 class BaseMixinTest(basetest.UpvoteTestCase):
 
   def testToDict_Put(self):
@@ -86,6 +99,15 @@ class BaseMixinTest(basetest.UpvoteTestCase):
     self.assertDictEqual(expected, test_model.to_dict(
         exclude=['operating_system_family']))
 
+  def testToSummaryDict(self):
+    test_model = TestSummaryModel(int_prop=111, str_prop='abc')
+    test_model.put()
+    expected = {
+        'int_prop': 111,
+        'id': test_model.key.id(),
+        'key': test_model.key.urlsafe()}
+    self.assertDictEqual(expected, test_model.ToSummaryDict())
+
 
 if __name__ == '__main__':
   basetest.main()
@@ -27,6 +27,15 @@ from upvote.gae.datastore.models import user as user_models
 from upvote.shared import constants
 
 
+# How long a SantaBundle's cached flagged-member status may be trusted before
+# it's re-verified by scanning the bundle's contents. This bounds the impact of
+# a member flag change that didn't invalidate the cache (e.g. a direct put).
+_FLAGGED_MEMBER_STATUS_MAX_AGE = datetime.timedelta(days=1)
+
+# The number of pages of a bundle's contents fetched at once when scanning it.
+_BUNDLE_SCAN_READ_AHEAD = 4
+
+
 class QuarantineMetadata(ndb.Model):
   """Metadata provided by macOS File Quarantine.
 
@@ -113,6 +122,10 @@ class SantaBlockable(mixin.Santa, base.Binary):
   # DEPRECATED
   cert_sha256 = ndb.StringProperty()  # Use base.Binary.cert_key
 
+  IMMUTABLE_PROPERTIES = frozenset([
+      'id_type', 'blockable_hash', 'file_name', 'publisher', 'product_name',
+      'version', 'bundle_id', 'cert_key', 'cert_sha256'])
+
   @property
   def cert_id(self):
     return (self.cert_key and self.cert_key.id()) or self.cert_sha256
@@ -156,6 +169,13 @@ class SantaCertificate(mixin.Santa, base.Certificate):
   valid_from_dt = ndb.DateTimeProperty()
   valid_until_dt = ndb.DateTimeProperty()
 
+  IMMUTABLE_PROPERTIES = frozenset([
+      'id_type', 'common_name', 'organization', 'organizational_unit',
+      'valid_from_dt', 'valid_until_dt'])
+
+  SUMMARY_PROPERTIES = base.Blockable.SUMMARY_PROPERTIES.union([
+      'common_name', 'organization'])
+
   def InsertBigQueryRow(self, action, **kwargs):
 
     defaults = {
@@ -197,6 +217,43 @@ class SantaBundleBinary(mixin.Santa, ndb.Model):
     return result
 
 
+class BundleFlagStatus(ndb.Model):
+  """The cached result of scanning a SantaBundle for flagged members.
+
+  This is stored as a root entity, separate from the SantaBundle, so that
+  refreshing the cache doesn't write to the bundle's entity group (and contend
+  with voting) or modify the bundle itself.
+
+  key = SantaBundle key id
+
+  Attributes:
+    has_flagged_binary: bool, The result of the last scan for flagged binaries
+        in the bundle. Only valid while the status is fresh.
+    has_flagged_cert: bool, The result of the last scan for flagged signing
+        certs in the bundle. Only valid while the status is fresh.
+    checked_dt: datetime, The time at which the last scan began.
+    changed_dt: datetime, The last time the flagged status of one of the
+        bundle's binaries or certs was known to change.
+  """
+  has_flagged_binary = ndb.BooleanProperty()
+  has_flagged_cert = ndb.BooleanProperty()
+  checked_dt = ndb.DateTimeProperty()
+  changed_dt = ndb.DateTimeProperty()
+
+  @classmethod
+  def GetKey(cls, bundle_key):
+    return ndb.Key(cls, bundle_key.id())
+
+  def IsFresh(self):
+    """Returns whether the cached status can be trusted."""
+    if self.checked_dt is None:
+      return False
+    if self.changed_dt is not None and self.changed_dt >= self.checked_dt:
+      return False
+    age = datetime.datetime.utcnow() - self.checked_dt
+    return age < _FLAGGED_MEMBER_STATUS_MAX_AGE
+
+
 class SantaBundle(mixin.Santa, base.Package):
   """A macOS Bundle representing 1 or more SantaBlockables.
 
@@ -233,14 +290,6 @@ class SantaBundle(mixin.Santa, base.Package):
         never be populated.
   """
 
-  def _CalculateScore(self):
-    # NOTE: This workaround prevents score calculations before the
-    # bundle has been uploaded. Voting is disabled on bundles before upload is
-    # complete so there shouldn't be any Votes available to count.
-    if not self.has_been_uploaded:
-      return 0
-    return super(SantaBundle, self)._CalculateScore()
-
   name = ndb.StringProperty()
   bundle_id = ndb.StringProperty()
   version = ndb.StringProperty()
@@ -252,8 +301,16 @@ class SantaBundle(mixin.Santa, base.Package):
   main_executable_key = ndb.KeyProperty()
   main_cert_key = ndb.KeyProperty()
 
-  # Overrides base.Blockable.score to suppress score calculation during upload.
-  score = ndb.ComputedProperty(_CalculateScore)
+  SUMMARY_PROPERTIES = base.Blockable.SUMMARY_PROPERTIES.union([
+      'name', 'bundle_id'])
+
+  def CalculateScore(self, votes=None):
+    # NOTE: This workaround prevents score calculations before the
+    # bundle has been uploaded. Voting is disabled on bundles before upload is
+    # complete so there shouldn't be any Votes available to count.
+    if not self.has_been_uploaded:
+      return 0
+    return super(SantaBundle, self).CalculateScore(votes=votes)
 
   def InsertBigQueryRow(self, action, **kwargs):
 
@@ -299,7 +356,8 @@ class SantaBundle(mixin.Santa, base.Package):
     query = SantaBundleBinary.query(ancestor=self.key)
     futures = [
         self._PageHasFlaggedBinary(page)
-        for page in datastore_utils.Paginate(query, page_size=1000)]
+        for page in datastore_utils.Paginate(
+            query, page_size=1000, read_ahead=_BUNDLE_SCAN_READ_AHEAD)]
     return any(future.get_result() for future in futures)
 
   @classmethod
@@ -318,9 +376,58 @@ class SantaBundle(mixin.Santa, base.Package):
         ancestor=self.key)
     futures = [
         self._PageHasFlaggedCert(page)
-        for page in datastore_utils.Paginate(query, page_size=1000)]
+        for page in datastore_utils.Paginate(
+            query, page_size=1000, read_ahead=_BUNDLE_SCAN_READ_AHEAD)]
     return any(future.get_result() for future in futures)
 
+  def GetFlaggedMemberStatus(self):
+    """Returns whether any of the bundle's binaries or certs are flagged.
+
+    The cached BundleFlagStatus is used while fresh. Otherwise, the bundle's
+    contents are scanned and the result is cached for subsequent calls.
+
+    Returns:
+      A (has_flagged_binary, has_flagged_cert) tuple of bools.
+    """
+    status = BundleFlagStatus.GetKey(self.key).get()
+    if status is not None and status.IsFresh():
+      return status.has_flagged_binary, status.has_flagged_cert
+
+    # Record the time before scanning so that any member change which occurs
+    # during the scan will cause the cached result to be considered stale.
+    checked_dt = datetime.datetime.utcnow()
+    has_flagged_binary = self._HasFlaggedBinary()
+    has_flagged_cert = self._HasFlaggedCert()
+
+    _CacheFlaggedMemberStatus(
+        self.key, has_flagged_binary, has_flagged_cert, checked_dt)
+
+    return has_flagged_binary, has_flagged_cert
+
+  @classmethod
+  def InvalidateFlaggedMemberStatus(cls, member_key):
+    """Marks stale the cached status of all bundles containing a member.
+
+    Args:
+      member_key: Key, The key of the SantaBlockable or SantaCertificate whose
+          flagged status has changed.
+    """
+    changed_dt = datetime.datetime.utcnow()
+    queries = [
+        SantaBundleBinary.query(SantaBundleBinary.blockable_key == member_key),
+        SantaBundleBinary.query(SantaBundleBinary.cert_key == member_key)]
+
+    bundle_keys = set()
+    for query in queries:
+      for page in datastore_utils.Paginate(
+          query, page_size=1000, keys_only=True):
+        bundle_keys.update(key.parent() for key in page)
+
+    futures = [
+        _MarkFlaggedMembersChanged(bundle_key, changed_dt)
+        for bundle_key in bundle_keys]
+    ndb.Future.wait_all(futures)
+
   def IsVotingAllowed(self, current_user=None, enable_flagged_checks=True):
     """Method to check if voting is allowed."""
     # Even admins can't vote on a Bundle that hasn't been uploaded.
@@ -332,9 +439,10 @@ class SantaBundle(mixin.Santa, base.Package):
     # Allow the flagged checks to be suppressed in situations where, for
     # instance, this call must be made from within a transaction.
     if enable_flagged_checks:
-      if self._HasFlaggedBinary():
+      has_flagged_binary, has_flagged_cert = self.GetFlaggedMemberStatus()
+      if has_flagged_binary:
         return (False, constants.VOTING_PROHIBITED_REASONS.FLAGGED_BINARY)
-      elif self._HasFlaggedCert():
+      elif has_flagged_cert:
         return (False, constants.VOTING_PROHIBITED_REASONS.FLAGGED_CERT)
 
     return super(SantaBundle, self).IsVotingAllowed(current_user=current_user)
@@ -344,3 +452,39 @@ class SantaBundle(mixin.Santa, base.Package):
     result['has_been_uploaded'] = self.has_been_uploaded
     result['cert_id'] = self.main_cert_key.id() if self.main_cert_key else None
     return result
+
+
+@ndb.transactional
+def _CacheFlaggedMemberStatus(
+    bundle_key, has_flagged_binary, has_flagged_cert, checked_dt):
+  """Stores the result of a flagged-member scan unless a newer one exists.
+
+  Any recorded changed_dt is preserved, so a member change recorded while the
+  scan was running still marks the stored result as stale.
+  """
+  status_key = BundleFlagStatus.GetKey(bundle_key)
+  status = status_key.get() or BundleFlagStatus(key=status_key)
+  if status.checked_dt is not None and status.checked_dt >= checked_dt:
+    return
+  status.has_flagged_binary = has_flagged_binary
+  status.has_flagged_cert = has_flagged_cert
+  status.checked_dt = checked_dt
+  status.put()
+
+
+def _MarkFlaggedMembersChanged(bundle_key, changed_dt):
+  """Asynchronously records a member flag change on a bundle's status."""
+
+  def _Mark():
+    status_key = BundleFlagStatus.GetKey(bundle_key)
+    status = status_key.get()
+    # Record the change even if no status has been cached yet, as the bundle's
+    # first scan may still be running and its result mustn't be trusted.
+    if status is None:
+      status = BundleFlagStatus(key=status_key)
+    elif status.changed_dt is not None and status.changed_dt >= changed_dt:
+      return
+    status.changed_dt = changed_dt
+    status.put()
+
+  return ndb.transaction_async(_Mark)
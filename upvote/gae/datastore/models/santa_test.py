@@ -292,12 +292,12 @@ class SantaBundleTest(SantaModelTest):
     bundle = test_utils.CreateSantaBundle(uploaded_dt=None)
     test_utils.CreateVote(bundle)
 
-    # Trigger the SantaBundle.score ComputedProperty calculation.
-    bundle.put()
-
     # The score should have not reflected the real score until the bundle is
     # uploaded.
-    self.assertEqual(0, bundle.key.get().score)
+    self.assertEqual(0, bundle.CalculateScore())
+
+    bundle.uploaded_dt = datetime.datetime.utcnow()
+    self.assertEqual(1, bundle.CalculateScore())
 
   def testTranslatePropertyQuery_CertId(self):
     field, val = 'cert_id', 'bar'
@@ -341,7 +341,9 @@ class SantaBundleTest(SantaModelTest):
       # Now flag one of the binaries.
       blockables[0].flagged = True
       blockables[0].put()
+      santa.SantaBundle.InvalidateFlaggedMemberStatus(blockables[0].key)
 
+      bundle = bundle.key.get()
       allowed, reason = bundle.IsVotingAllowed()
       self.assertFalse(allowed)
       self.assertEqual(
@@ -358,7 +360,10 @@ class SantaBundleTest(SantaModelTest):
 
       self.santa_certificate.flagged = True
       self.santa_certificate.put()
+      santa.SantaBundle.InvalidateFlaggedMemberStatus(
+          self.santa_certificate.key)
 
+      bundle = bundle.key.get()
       allowed, reason = bundle.IsVotingAllowed()
       self.assertFalse(allowed)
       self.assertEqual(constants.VOTING_PROHIBITED_REASONS.FLAGGED_CERT, reason)
@@ -380,6 +385,7 @@ class SantaBundleTest(SantaModelTest):
 
       # In a transaction, the 26 searched blockables should exceed the allowed
       # limit of 25.
+      santa.BundleFlagStatus.GetKey(bundle.key).delete()
       with self.assertRaises(db.BadRequestError):
         ndb.transaction(
             lambda: bundle.IsVotingAllowed(enable_flagged_checks=True), xg=True)
@@ -392,6 +398,84 @@ class SantaBundleTest(SantaModelTest):
 
       ndb.transaction(Test, xg=True)
 
+  def testGetFlaggedMemberStatus_Cached(self):
+    blockables = test_utils.CreateSantaBlockables(2)
+    bundle = test_utils.CreateSantaBundle(bundle_binaries=blockables)
+
+    self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+
+    # The scan result should be persisted apart from the bundle itself.
+    self.assertEqual(bundle.updated_dt, bundle.key.get().updated_dt)
+    status = santa.BundleFlagStatus.GetKey(bundle.key).get()
+    self.assertFalse(status.has_flagged_binary)
+    self.assertFalse(status.has_flagged_cert)
+    self.assertIsNotNone(status.checked_dt)
+
+    # Subsequent calls shouldn't scan the bundle's contents.
+    with mock.patch.object(
+        santa.SantaBundle, '_HasFlaggedBinary') as mock_scan:
+      self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+      self.assertFalse(mock_scan.called)
+
+  def testGetFlaggedMemberStatus_Invalidated(self):
+    blockable = test_utils.CreateSantaBlockable(
+        cert_key=self.santa_certificate.key)
+    bundle = test_utils.CreateSantaBundle(bundle_binaries=[blockable])
+    other_bundle = test_utils.CreateSantaBundle(
+        bundle_binaries=test_utils.CreateSantaBlockables(1))
+
+    self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+    self.assertEqual((False, False), other_bundle.GetFlaggedMemberStatus())
+
+    self.santa_certificate.flagged = True
+    self.santa_certificate.put()
+    santa.SantaBundle.InvalidateFlaggedMemberStatus(self.santa_certificate.key)
+
+    # Only the bundle containing the cert should be invalidated.
+    status = santa.BundleFlagStatus.GetKey(bundle.key).get()
+    other_status = santa.BundleFlagStatus.GetKey(other_bundle.key).get()
+    self.assertIsNotNone(status.changed_dt)
+    self.assertIsNone(other_status.changed_dt)
+
+    self.assertEqual((False, True), bundle.GetFlaggedMemberStatus())
+    self.assertEqual((False, False), other_bundle.GetFlaggedMemberStatus())
+
+  def testGetFlaggedMemberStatus_ChangedDuringFirstScan(self):
+    blockable = test_utils.CreateSantaBlockable()
+    bundle = test_utils.CreateSantaBundle(bundle_binaries=[blockable])
+
+    def _FlagDuringScan():
+      blockable.flagged = True
+      blockable.put()
+      santa.SantaBundle.InvalidateFlaggedMemberStatus(blockable.key)
+      return False
+
+    # The binary is flagged after the scan has started but before its result
+    # is cached.
+    with mock.patch.object(
+        santa.SantaBundle, '_HasFlaggedBinary', side_effect=_FlagDuringScan):
+      self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+
+    status = santa.BundleFlagStatus.GetKey(bundle.key).get()
+    self.assertFalse(status.IsFresh())
+    self.assertEqual((True, False), bundle.GetFlaggedMemberStatus())
+
+  def testGetFlaggedMemberStatus_Expired(self):
+    blockables = test_utils.CreateSantaBlockables(1)
+    bundle = test_utils.CreateSantaBundle(bundle_binaries=blockables)
+    self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+
+    # Flag the binary without invalidating the cache.
+    blockables[0].flagged = True
+    blockables[0].put()
+    self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+
+    # Once the cached status is old enough, the contents should be re-scanned.
+    status = santa.BundleFlagStatus.GetKey(bundle.key).get()
+    status.checked_dt -= datetime.timedelta(days=2)
+    status.put()
+    self.assertEqual((True, False), bundle.GetFlaggedMemberStatus())
+
   def testIsVotingAllowed_CallTheSuper(self):
     bundle = test_utils.CreateSantaBundle()
     with self.LoggedInUser():
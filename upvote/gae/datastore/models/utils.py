@@ -18,6 +18,7 @@ from google.appengine.ext import ndb
 
 from upvote.gae import settings
 from upvote.gae.datastore.models import base as base_models
+from upvote.gae.datastore.models import event_summary as event_summary_models
 from upvote.gae.datastore.models import exemption as exemption_models
 from upvote.gae.datastore.models import host as host_models
 from upvote.gae.datastore.models import rule as rule_models
@@ -78,9 +79,17 @@ def GetSantaHostKeysForUser(user):
       distinct=True)
   events_future = events_query.fetch_async()
 
+  # Associations recorded by Events which have since been removed by retention
+  # are kept in HostEventSummaries.
+  summaries_query = event_summary_models.HostEventSummary.query(
+      event_summary_models.HostEventSummary.user_keys == user.key)
+  summaries_future = summaries_query.fetch_async(keys_only=True)
+
   all_keys = set(hosts_future.get_result())
   for event in events_future.get_result():
     all_keys.add(ndb.Key(host_models.SantaHost, event.host_id))
+  for summary_key in summaries_future.get_result():
+    all_keys.add(ndb.Key(host_models.SantaHost, summary_key.id()))
   return list(all_keys)
 
 
@@ -197,11 +206,21 @@ def GetUsersAssociatedWithSantaHost(host_id):
       base_models.Event.host_id == host_id,
       projection=[base_models.Event.executing_user],
       distinct=True)
+  events_future = event_query.fetch_async()
+  summary_future = event_summary_models.HostEventSummary.get_by_id_async(
+      host_id)
 
-  return [
-      e.executing_user for e in event_query.fetch()
+  users = [
+      e.executing_user for e in events_future.get_result()
       if e.executing_user != constants.LOCAL_ADMIN.MACOS]
 
+  # Include the users of any Events which have been removed by retention.
+  summary = summary_future.get_result()
+  if summary is not None:
+    users.extend(
+        user for user in summary.GetAssociatedUsers() if user not in users)
+  return users
+
 
 def GetBundleBinaryIdsForRule(rule):
   if rule.rule_type == constants.RULE_TYPE.PACKAGE:
@@ -74,3 +74,34 @@ class Vote(mixin.Base, ndb.Model):
   @property
   def user_key(self):
     return ndb.Key(user_models.User, self.user_email.lower())
+
+
+class PendingVote(ndb.Model):
+  """A vote which has been cast but not yet applied to its blockable.
+
+  PendingVotes are root entities so that votes can be recorded without touching
+  the blockable's entity group. Each is later turned into a Vote and applied to
+  the blockable, after which it is deleted.
+
+  key = Key(PendingVote, '<blockable ID>/<user email>')
+
+  Attributes:
+    blockable_key: Key, the key of the blockable being voted on.
+    user_email: str, the email of the voting user at the time of the vote.
+    was_yes_vote: boolean, True if the vote was "Yes."
+    weight: int, the weight with which the vote was cast.
+    recorded_dt: DateTime, time of vote.
+  """
+  blockable_key = ndb.KeyProperty()
+  user_email = ndb.StringProperty(required=True)
+  was_yes_vote = ndb.BooleanProperty(required=True, default=True)
+  weight = ndb.IntegerProperty(default=0)
+  recorded_dt = ndb.DateTimeProperty(auto_now_add=True)
+
+  @classmethod
+  def GetKey(cls, blockable_key, user_key):
+    return ndb.Key(cls, '%s/%s' % (blockable_key.id(), user_key.id()))
+
+  @property
+  def user_key(self):
+    return ndb.Key(user_models.User, self.user_email.lower())
@@ -89,5 +89,23 @@ class VoteTest(basetest.UpvoteTestCase):
     self.assertFalse(vote.in_effect)
 
 
+class PendingVoteTest(basetest.UpvoteTestCase):
+
+  def testGetKey(self):
+    blockable = test_utils.CreateBlockable()
+    user = test_utils.CreateUser()
+
+    key = vote_models.PendingVote.GetKey(blockable.key, user.key)
+
+    self.assertIsNone(key.parent())
+    self.assertEqual(
+        '%s/%s' % (blockable.key.id(), user.key.id()), key.id())
+
+  def testUserKey(self):
+    user = test_utils.CreateUser()
+    pending_vote = vote_models.PendingVote(user_email=user.email.upper())
+    self.assertEqual(user.key, pending_vote.user_key)
+
+
 if __name__ == '__main__':
   basetest.main()
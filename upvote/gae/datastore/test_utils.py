@@ -341,6 +341,12 @@ def CreateVote(blockable, **kwargs):
   vote.key = vote_models.Vote.GetKey(
       blockable.key, ndb.Key(user_models.User, defaults['user_email']))
   vote.put()
+
+  # Keep the Blockable's stored score consistent with its Votes, as the voting
+  # code would.
+  blockable.score = blockable.CalculateScore()
+  blockable.put()
+
   return vote
 
 
@@ -17,6 +17,7 @@
 import contextlib
 import functools
 import itertools
+import logging
 
 from google.appengine.ext import deferred
 from google.appengine.ext import ndb
@@ -28,6 +29,10 @@ from upvote.shared import constants
 _BATCH_SIZE = 2000
 _SMALL_BATCH_SIZE = 500
 
+# The number of __scatter__ samples taken for each range when splitting a
+# query's key space into ranges.
+_SCATTER_OVERSAMPLING_FACTOR = 32
+
 
 class Error(Exception):
   """Base error for the ndb utils module."""
@@ -79,13 +84,30 @@ def CopyEntity(entity, new_key=None, new_parent=None, **updated_properties):
       if prop_name in model._properties and  # pylint: disable=protected-access
       not isinstance(entity_properties[prop_name], ndb.ComputedProperty)}
 
-  # Check updated_properties for invalid properties
+  _CheckUpdatedProperties(
+      entity_properties, type(entity).__name__, updated_properties)
+
+  entity_values.update(updated_properties)
+  return model(key=new_key, parent=new_parent, **entity_values)
+
+
+def _CheckUpdatedProperties(properties, model_name, updated_properties):
+  """Checks that the given properties may be overridden on a copied entity.
+
+  Args:
+    properties: dict, The Properties of the entity being copied.
+    model_name: str, The name of the entity's Model.
+    updated_properties: The names of the properties to be overridden.
+
+  Raises:
+    PropertyError: An invalid property was provided in `updated_properties`.
+  """
   for property_name in updated_properties:
-    prop = entity_properties.get(property_name, None)
+    prop = properties.get(property_name, None)
     if not prop and property_name != 'id':
       raise PropertyError(
           'Property "%s" cannot be set: Not found on model %s' % (
-              property_name, type(entity).__name__))
+              property_name, model_name))
     elif getattr(prop, '_auto_now', None):
       # DateTimeProperties marked with auto_now cannot be overridden. Without
       # this error, the operation would fail silently upon datastore insertion.
@@ -98,8 +120,77 @@ def CopyEntity(entity, new_key=None, new_parent=None, **updated_properties):
           'Property "%s" of type %s cannot be set: read-only' % (
               property_name, type(prop).__name__))
 
-  entity_values.update(updated_properties)
-  return model(key=new_key, parent=new_parent, **entity_values)
+
+def CopyEntities(
+    entities, key_func=None, new_keys=None, **updated_properties):
+  """Creates new entities based on each of `entities`.
+
+  This is a cheaper alternative to calling CopyEntity on each entity. The
+  properties which can be copied are determined once per Model, and the
+  property values are copied as they're stored on each entity, without being
+  converted or re-validated. Only the `updated_properties` are validated.
+
+  Args:
+    entities: iterable of ndb.Model, The bases for the copied entities.
+    key_func: func, If provided, a function which is called with each entity and
+        returns the key of its copy. An incomplete key (i.e. one with an ID of
+        None) results in a new ID being generated when the copy is stored.
+        Otherwise, each copy's key is None.
+    new_keys: iterable of ndb.Key, If provided instead of key_func, the keys of
+        the copies, in the same order as `entities`.
+    **updated_properties: The name-value mappings of properties to override on
+        every copy.
+
+  Returns:
+    A list of the new entities, in the same order as `entities`.
+
+  Raises:
+    Error: Both key_func and new_keys were provided.
+    PropertyError: An invalid property was provided in `updated_properties`.
+  """
+  if key_func is not None and new_keys is not None:
+    raise Error('Only one of key_func and new_keys may be provided')
+  if 'id' in updated_properties:
+    raise PropertyError('Keys of copied entities must be set using key_func')
+
+  copyable_names_by_model = {}
+  entities = list(entities)
+  if new_keys is None:
+    new_keys = (key_func(entity) if key_func else None for entity in entities)
+
+  copies = []
+  for entity, new_key in itertools.izip(entities, new_keys):
+    model = entity.__class__
+    copyable_names = copyable_names_by_model.get(model)
+    if copyable_names is None:
+      model_properties = model._properties  # pylint: disable=protected-access
+      _CheckUpdatedProperties(
+          model_properties, model.__name__, updated_properties)
+
+      # ComputedProperties and the PolyModel 'class' property are recomputed by
+      # the copy itself, and any properties which no longer appear on the Model
+      # are dropped.
+      is_polymodel = issubclass(model, polymodel.PolyModel)
+      copyable_names = frozenset(
+          prop_name for prop_name, prop in model_properties.iteritems()
+          if not isinstance(prop, ndb.ComputedProperty) and
+          not (is_polymodel and prop_name == 'class'))
+      copyable_names_by_model[model] = copyable_names
+
+    entity_copy = model(key=new_key)
+
+    # Repeated values are stored as lists which ndb may modify in place, so each
+    # copy needs its own.
+    entity_copy._values = {  # pylint: disable=protected-access
+        prop_name: list(value) if isinstance(value, list) else value
+        for prop_name, value in entity._values.iteritems()  # pylint: disable=protected-access
+        if prop_name in copyable_names}
+
+    for prop_name, value in updated_properties.iteritems():
+      setattr(entity_copy, prop_name, value)
+    copies.append(entity_copy)
+
+  return copies
 
 
 def DeleteProperty(entity, property_name):
@@ -308,71 +399,321 @@ def GetMultiFuture(futures):
   return mf
 
 
-def Paginate(query, page_size=_SMALL_BATCH_SIZE, **query_options):
+def Paginate(
+    query, page_size=_SMALL_BATCH_SIZE, read_ahead=1, range_count=1,
+    ordered=True, **query_options):
   """Performs the given query and breaks the results up into batches.
 
+  By default, the next page is fetched while the current one is being consumed.
+  A greater read_ahead fetches that many pages at once. Alternatively, if
+  range_count is greater than 1, the query's key space is split into that many
+  ranges which are scanned concurrently.
+
   Args:
     query: ndb.Query, the ndb query to paginate through and collect the results.
     page_size: int, The number of entities to request in each page.
+    read_ahead: int, The number of pages to fetch concurrently. Pages beyond the
+        first are fetched using offsets, so the Datastore still has to skip over
+        the preceding results. Only used if range_count is 1.
+    range_count: int, The number of key ranges to scan concurrently. When
+        greater than 1, the query must not have sort orders or inequality
+        filters.
+    ordered: bool, Whether the pages of each key range are yielded in key order
+        after all pages of the preceding ranges. If False, pages are yielded as
+        soon as they arrive. Only used if range_count is greater than 1.
     **query_options: dict, Any query option keyword args to pass to the query.
 
-  Yields:
-    Lists of results from the given query, at most page_size in length.
+  Returns:
+    A generator of lists of results from the given query, at most page_size in
+    length.
+
+  Raises:
+    Error: The query can't be split into key ranges.
   """
-  results = []
+  if range_count > 1:
+    if query.orders is not None:
+      raise Error('Queries with sort orders cannot be split into ranges')
+    range_queries = _SplitQuery(query, range_count)
+    if ordered:
+      return _PaginateRangesInOrder(range_queries, page_size, **query_options)
+    return _PaginateRangesAsCompleted(range_queries, page_size, **query_options)
+
+  return _PaginateRange(query, page_size, read_ahead, **query_options)
+
+
+def _PaginateRange(query, page_size, read_ahead, **query_options):
+  """Implementation function for Paginate over a single range."""
   cursor = None
   more = True
+  pages = []
 
   while more:
-    # Asynchronously fetch the next page.
-    page_future = query.fetch_page_async(
-        page_size, start_cursor=cursor, **query_options)
+    # Asynchronously fetch the next pages.
+    page_futures = [
+        query.fetch_page_async(
+            page_size, start_cursor=cursor, offset=i * page_size,
+            **query_options)
+        for i in xrange(read_ahead)]
+
+    for page in pages:
+      yield page
+
+    pages = []
+    for page_future in page_futures:
+      # According to the docs, if more is True, there are *probably* more
+      # results. An empty page means a read-ahead went past the last result.
+      results, page_cursor, more = page_future.get_result()
+      if not results:
+        more = False
+        break
+      pages.append(results)
+      cursor = page_cursor
+      if not more:
+        break
 
-    # According to the docs, if more is True, there are *probably* more results.
+  # Don't forget the last batch.
+  for page in pages:
+    yield page
+
+
+def _PaginateRangesInOrder(range_queries, page_size, **query_options):
+  """Yields the pages of each range in turn, while prefetching the others."""
+  first_page_futures = [
+      range_query.fetch_page_async(page_size, **query_options)
+      for range_query in range_queries]
+
+  for range_query, page_future in zip(range_queries, first_page_futures):
+    while page_future is not None:
+      results, cursor, more = page_future.get_result()
+      page_future = (
+          range_query.fetch_page_async(
+              page_size, start_cursor=cursor, **query_options)
+          if more else None)
+      if results:
+        yield results
+
+
+def _PaginateRangesAsCompleted(range_queries, page_size, **query_options):
+  """Yields the pages of all ranges in whichever order they arrive."""
+  page_futures = {
+      range_query.fetch_page_async(page_size, **query_options): range_query
+      for range_query in range_queries}
+
+  while page_futures:
+    page_future = ndb.Future.wait_any(page_futures)
+    range_query = page_futures.pop(page_future)
+    results, cursor, more = page_future.get_result()
+    if more:
+      next_page_future = range_query.fetch_page_async(
+          page_size, start_cursor=cursor, **query_options)
+      page_futures[next_page_future] = range_query
     if results:
       yield results
 
-    results, cursor, more = page_future.get_result()
 
-  # Don't forget the last batch.
-  if results:
-    yield results
+def _GetScatterSplitKeys(kind, range_count):
+  """Returns Keys which split the key space of a kind into roughly equal ranges.
+
+  The split points are chosen from a random sample of the kind's entities,
+  obtained through the Datastore's __scatter__ property.
+
+  Args:
+    kind: str, The kind whose key space should be split.
+    range_count: int, The desired number of ranges.
+
+  Returns:
+    A sorted list of at most range_count - 1 distinct Keys. Fewer Keys are
+    returned if the kind is too small to be sampled meaningfully.
+  """
+  query = ndb.Query(kind=kind).order(ndb.GenericProperty('__scatter__'))
+  sample_keys = query.fetch(
+      range_count * _SCATTER_OVERSAMPLING_FACTOR, keys_only=True)
+  if not sample_keys:
+    return []
+  sample_keys.sort()
+
+  split_keys = []
+  for i in xrange(1, range_count):
+    split_key = sample_keys[i * len(sample_keys) // range_count]
+    if not split_keys or split_keys[-1] != split_key:
+      split_keys.append(split_key)
+  return split_keys
+
+
+def _SplitQuery(query, range_count):
+  """Splits a query into queries over consecutive ranges of keys.
+
+  Args:
+    query: ndb.Query, The query to split. It must not have sort orders or
+        inequality filters.
+    range_count: int, The desired number of ranges.
+
+  Returns:
+    A list of at most range_count ndb.Query objects which together cover all
+    results of the original query.
+  """
+  split_keys = _GetScatterSplitKeys(query.kind, range_count)
+  range_queries = []
+  for start_key, end_key in zip([None] + split_keys, split_keys + [None]):
+    range_query = query
+    if start_key is not None:
+      range_query = range_query.filter(ndb.Model.key >= start_key)
+    if end_key is not None:
+      range_query = range_query.filter(ndb.Model.key < end_key)
+    range_queries.append(range_query)
+  return range_queries
+
+
+class _BatchApplyProgress(ndb.Model):
+  """Tracks the ranges of a fanned-out QueuedPaginatedBatchApply.
+
+  Attributes:
+    range_count: int, The number of ranges being processed.
+    finished_ranges: list<int>, The indices of the ranges which have finished.
+  """
+  range_count = ndb.IntegerProperty()
+  finished_ranges = ndb.IntegerProperty(repeated=True)
+
+
+@ndb.transactional
+def _FinishRange(progress_key, range_index, completion_callback, queue):
+  """Records that a range has finished, and reports completion if it's last.
+
+  This is idempotent, as a retried task may report the same range more than
+  once.
+  """
+  progress = progress_key.get()
+  if progress is None:
+    logging.info('Completion was already reported')
+    return
+  if range_index in progress.finished_ranges:
+    logging.info('Range %d was already finished', range_index)
+    return
+
+  progress.finished_ranges.append(range_index)
+  if len(progress.finished_ranges) < progress.range_count:
+    progress.put()
+    return
+
+  progress_key.delete()
+  deferred.defer(completion_callback, _queue=queue, _transactional=True)
 
 
 def QueuedPaginatedBatchApply(
     query, callback, extra_args=None, extra_kwargs=None,
     pre_queue_callback=None, page_size=_BATCH_SIZE,
-    queue=constants.TASK_QUEUE.DEFAULT, **query_options):
-  """Applies a callback to all results of a query using a task queue."""
+    queue=constants.TASK_QUEUE.DEFAULT, range_count=1,
+    completion_callback=None, **query_options):
+  """Applies a callback to all results of a query using a task queue.
+
+  By default, the results are processed a page at a time in a serial chain of
+  deferred tasks. If range_count is greater than 1, the query's key space is
+  instead split into that many ranges, each of which is processed by its own
+  chain of tasks concurrently with the others.
+
+  Args:
+    query: ndb.Query, The query whose results the callback should be applied
+        to. When fanning out, the query must not have sort orders or inequality
+        filters, as it's further restricted to each range of keys.
+    callback: func, The function to call with each page of results.
+    extra_args: list, Extra positional arguments to pass to callback.
+    extra_kwargs: dict, Extra keyword arguments to pass to callback.
+    pre_queue_callback: func, A function applied to each result before it's
+        passed to callback.
+    page_size: int, The number of results in each page.
+    queue: str, The task queue on which to run the tasks.
+    range_count: int, The number of ranges to process concurrently.
+    completion_callback: func, If provided, a function which is deferred (with
+        no arguments) once every result has been processed.
+    **query_options: dict, Any query option keyword args to pass to the query.
+
+  Raises:
+    Error: The query can't be fanned out.
+  """
+  if range_count > 1:
+    if query.orders is not None:
+      raise Error('Queries with sort orders cannot be fanned out')
+    deferred.defer(
+        _FanOutQueuedPaginatedBatchApply, query, callback, extra_args,
+        extra_kwargs, pre_queue_callback, page_size, queue, range_count,
+        completion_callback, _queue=queue, **query_options)
+    return
+
   # Call the implementation function.
   deferred.defer(
       _QueuedPaginatedBatchApply, query, callback, extra_args, extra_kwargs,
-      pre_queue_callback, page_size, queue, _queue=queue, **query_options)
+      pre_queue_callback, page_size, queue,
+      completion_callback=completion_callback, _queue=queue, **query_options)
+
+
+def _FanOutQueuedPaginatedBatchApply(
+    query, callback, extra_args, extra_kwargs, pre_queue_callback, page_size,
+    queue, range_count, completion_callback, **query_options):
+  """Splits a QueuedPaginatedBatchApply into concurrently processed ranges."""
+  range_queries = _SplitQuery(query, range_count)
+  logging.info(
+      'Fanning out %s query over %d range(s)', query.kind, len(range_queries))
+
+  progress_key = None
+  if completion_callback is not None:
+    progress = _BatchApplyProgress(range_count=len(range_queries))
+    progress_key = progress.put()
+
+  for range_index, range_query in enumerate(range_queries):
+    deferred.defer(
+        _QueuedPaginatedBatchApply, range_query, callback, extra_args,
+        extra_kwargs, pre_queue_callback, page_size, queue,
+        completion_callback=completion_callback, progress_key=progress_key,
+        range_index=range_index, _queue=queue, **query_options)
 
 
 def _QueuedPaginatedBatchApply(
     query, callback, extra_args, extra_kwargs, pre_queue_callback, page_size,
-    queue, last_page_results=None, more=True, cursor=None, **query_options):
-  """Implementation function for QueuedPaginatedBatchApply."""
+    queue, cursor=None, completion_callback=None, progress_key=None,
+    range_index=None, **query_options):
+  """Implementation function for QueuedPaginatedBatchApply.
+
+  Each task processes the page of results starting at the given cursor. Only the
+  cursor is passed between tasks, so the size of each task's payload doesn't
+  depend on the size of the entities being processed. The page itself is
+  retrieved with a keys-only query and, unless only the keys were requested,
+  the entities are then fetched by key. Projection queries can't be keys-only,
+  so their pages are fetched directly.
+  """
   if extra_args is None: extra_args = []
   if extra_kwargs is None: extra_kwargs = {}
-  if last_page_results is None: last_page_results = []
+  keys_only = query_options.pop('keys_only', False)
+  projected = bool(query_options.get('projection') or query.projection)
 
-  # Begin to retrieve the next page.
-  if more:
-    page_future = query.fetch_page_async(
+  if projected:
+    page, cursor, more = query.fetch_page(
         page_size, start_cursor=cursor, **query_options)
+  else:
+    page, cursor, more = query.fetch_page(
+        page_size, start_cursor=cursor, keys_only=True, **query_options)
+
+  # Run callback on the results of this page.
+  if page:
+    if keys_only or projected:
+      results = page
+    else:
+      # Skip any entities which were deleted since the query was run.
+      results = [entity for entity in ndb.get_multi(page) if entity is not None]
+    results = map(pre_queue_callback, results)
+    if results:
+      callback(results, *extra_args, **extra_kwargs)
 
-  # Run callback on the list of results.
-  if last_page_results:
-    callback(last_page_results, *extra_args, **extra_kwargs)
-
-  # Wait for the next page to be retrieved.
+  # Defer a task for the next page.
   if more:
-    results, cursor, more = page_future.get_result()
-    queue_results = map(pre_queue_callback, results)
-    # Defer task for next page.
     deferred.defer(
         _QueuedPaginatedBatchApply, query, callback, extra_args, extra_kwargs,
-        pre_queue_callback, page_size, queue, last_page_results=queue_results,
-        cursor=cursor, more=more, _queue=queue, **query_options)
+        pre_queue_callback, page_size, queue, cursor=cursor,
+        completion_callback=completion_callback, progress_key=progress_key,
+        range_index=range_index, _queue=queue, keys_only=keys_only,
+        **query_options)
+
+  # This was the last page, so report that the range has finished.
+  elif progress_key is not None:
+    _FinishRange(progress_key, range_index, completion_callback, queue)
+  elif completion_callback is not None:
+    deferred.defer(completion_callback, _queue=queue)
@@ -14,6 +14,7 @@
 
 """Unit tests for datastore_utils.py."""
 
+import base64
 import datetime
 import itertools
 import math
@@ -178,6 +179,147 @@ class CopyEntityTest(basetest.UpvoteTestCase):
     self.assertFalse(hasattr(copy, 'a'))
 
 
+class CopyEntitiesTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(CopyEntitiesTest, self).setUp()
+
+    class A(ndb.Model):
+      a = ndb.StringProperty()
+      b = ndb.StringProperty(repeated=True)
+
+    self.default_model = A
+
+  def testCopies(self):
+    entities = [
+        self.default_model(a='abc', b=['x']),
+        self.default_model(a='def', b=['y'])]
+    ndb.put_multi(entities)
+    entities = ndb.get_multi([entity.key for entity in entities])
+
+    copies = datastore_utils.CopyEntities(entities)
+    ndb.put_multi(copies)
+
+    self.assertEqual(['abc', 'def'], [copy.a for copy in copies])
+    self.assertEqual([['x'], ['y']], [copy.b for copy in copies])
+    for entity, copy in zip(entities, copies):
+      self.assertNotEqual(entity.key, copy.key)
+
+  def testRepeatedNotShared(self):
+    inst = self.default_model(b=['x'])
+    inst.put()
+
+    copy = datastore_utils.CopyEntities([inst])[0]
+    copy.b.append('y')
+
+    self.assertEqual(['x'], inst.b)
+    self.assertEqual(['x', 'y'], copy.b)
+
+  def testKeyFunc(self):
+    entities = [self.default_model(id=str(i), a='abc') for i in xrange(3)]
+    ndb.put_multi(entities)
+
+    parent = ndb.Key('C', 'c')
+    copies = datastore_utils.CopyEntities(
+        entities,
+        key_func=lambda entity: ndb.Key('A', entity.key.id(), parent=parent))
+    ndb.put_multi(copies)
+
+    self.assertEqual(
+        [ndb.Key('C', 'c', 'A', str(i)) for i in xrange(3)],
+        [copy.key for copy in copies])
+
+  def testNewKeys(self):
+    inst = self.default_model(a='abc')
+    inst.put()
+
+    new_keys = [ndb.Key('A', 'x'), ndb.Key('A', 'y')]
+    copies = datastore_utils.CopyEntities([inst] * 2, new_keys=new_keys)
+
+    self.assertEqual(new_keys, [copy.key for copy in copies])
+    self.assertEqual(['abc', 'abc'], [copy.a for copy in copies])
+
+  def testKeyFuncAndNewKeys(self):
+    with self.assertRaises(datastore_utils.Error):
+      datastore_utils.CopyEntities(
+          [self.default_model()], key_func=lambda entity: None,
+          new_keys=[ndb.Key('A', 'x')])
+
+  def testKeyFunc_IncompleteKey(self):
+    inst = self.default_model(a='abc')
+    inst.put()
+
+    parent = ndb.Key('C', 'c')
+    copy = datastore_utils.CopyEntities(
+        [inst], key_func=lambda _: ndb.Key('A', None, parent=parent))[0]
+    copy.put()
+
+    self.assertEqual(parent, copy.key.parent())
+    self.assertIsNotNone(copy.key.id())
+
+  def testUpdateProperties(self):
+    entities = [self.default_model(a='abc'), self.default_model(a='def')]
+    ndb.put_multi(entities)
+
+    copies = datastore_utils.CopyEntities(entities, a='xyz')
+
+    self.assertEqual(['xyz', 'xyz'], [copy.a for copy in copies])
+    self.assertEqual(['abc', 'def'], [entity.a for entity in entities])
+
+  def testId(self):
+    with self.assertRaises(datastore_utils.PropertyError):
+      datastore_utils.CopyEntities([self.default_model()], id='an_id')
+
+  def testUnknownProperty(self):
+    with self.assertRaises(datastore_utils.PropertyError):
+      datastore_utils.CopyEntities(
+          [self.default_model()], not_a_property='a')
+
+  def testComputedProperty(self):
+    class A(ndb.Model):
+      a = ndb.StringProperty()
+      b = ndb.ComputedProperty(lambda self: self.a[0])
+
+    inst = A(a='xyz')
+    inst.put()
+
+    with self.assertRaises(datastore_utils.PropertyError):
+      datastore_utils.CopyEntities([inst], b='a')
+
+    copy = datastore_utils.CopyEntities([inst], a='abc')[0]
+    copy.put()
+    self.assertEqual('a', copy.b)
+
+  def testPolyModel(self):
+    class A(datastore_utils.polymodel.PolyModel):
+      a = ndb.StringProperty()
+
+    class B(A):
+      pass
+
+    inst = B(a='abc')
+    inst.put()
+    inst = inst.key.get(use_cache=False)
+
+    copy = datastore_utils.CopyEntities([inst], a='xyz')[0]
+    copy.put()
+
+    self.assertEqual('xyz', copy.a)
+    self.assertIsInstance(copy.key.get(use_cache=False), B)
+
+  def testDeletedProperty(self):
+    inst = self.default_model(a='abc')
+    inst.put()
+
+    class A(ndb.Model):  # pylint: disable=unused-variable
+      c = ndb.StringProperty()
+
+    inst = inst.key.get(use_cache=False)
+
+    copy = datastore_utils.CopyEntities([inst])[0]
+    self.assertFalse(hasattr(copy, 'a'))
+
+
 class DeletePropertyTest(basetest.UpvoteTestCase):
 
   def setUp(self):
@@ -639,12 +781,17 @@ def CreateEntities(count, **kwargs):
 
 
 _GLOBAL_CBK_MOCK = mock.MagicMock()
+_GLOBAL_COMPLETION_MOCK = mock.MagicMock()
 
 
 def CallMock(*args, **kwargs):
   _GLOBAL_CBK_MOCK(*args, **kwargs)
 
 
+def CallCompletionMock():
+  _GLOBAL_COMPLETION_MOCK()
+
+
 def GetKey(key):
   return key.get()
 
@@ -681,19 +828,74 @@ class PaginateTest(basetest.UpvoteTestCase):
       for entity in entities:
         entity.key.delete()
 
+  def testReadAhead(self):
+
+    page_size = 3
+    for read_ahead in xrange(1, 4):
+      for entity_count in xrange(20):
+
+        entities = CreateEntities(entity_count)
+
+        pages = list(datastore_utils.Paginate(
+            TestModel.query(), page_size=page_size, read_ahead=read_ahead))
+        expected_page_count = int(math.ceil(float(entity_count) / page_size))
+        self.assertLen(pages, expected_page_count)
+        self.assertTrue(all(len(page) <= page_size for page in pages))
+
+        # Verify that every entity is returned exactly once.
+        keys = [entity.key for entity in itertools.chain(*pages)]
+        self.assertSameElements([entity.key for entity in entities], keys)
+        self.assertLen(keys, entity_count)
+
+        ndb.delete_multi(keys)
+
+  def testRanges_Ordered(self):
+    entities = CreateEntities(10)
+    sorted_keys = sorted(entity.key for entity in entities)
+    self.Patch(
+        datastore_utils, '_GetScatterSplitKeys',
+        return_value=[sorted_keys[3], sorted_keys[7]])
+
+    pages = list(datastore_utils.Paginate(
+        TestModel.query(), page_size=2, range_count=3, keys_only=True))
+
+    # Each range is yielded in turn, so the keys come out in order.
+    self.assertEqual(sorted_keys, list(itertools.chain(*pages)))
+    self.assertTrue(all(len(page) <= 2 for page in pages))
+
+  def testRanges_Unordered(self):
+    entities = CreateEntities(10)
+    sorted_keys = sorted(entity.key for entity in entities)
+    self.Patch(
+        datastore_utils, '_GetScatterSplitKeys',
+        return_value=[sorted_keys[3], sorted_keys[7]])
+
+    pages = list(datastore_utils.Paginate(
+        TestModel.query(), page_size=2, range_count=3, ordered=False))
+
+    keys = [entity.key for entity in itertools.chain(*pages)]
+    self.assertLen(keys, 10)
+    self.assertSameElements(sorted_keys, keys)
+
+  def testRanges_SortOrder(self):
+    with self.assertRaises(datastore_utils.Error):
+      datastore_utils.Paginate(
+          TestModel.query().order(TestModel.bar), range_count=3)
+
 
 class QueuedPaginatedBatchApply(basetest.UpvoteTestCase):
 
   def tearDown(self):
     super(QueuedPaginatedBatchApply, self).tearDown()
     _GLOBAL_CBK_MOCK.reset_mock()
+    _GLOBAL_COMPLETION_MOCK.reset_mock()
 
   def testSuccess(self):
     entities = CreateEntities(3)
     datastore_utils.QueuedPaginatedBatchApply(
         TestModel.query(), CallMock, page_size=2)
 
-    for _ in xrange(3):
+    for _ in xrange(2):
       self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
       self.RunDeferredTasks()
 
@@ -709,14 +911,147 @@ class QueuedPaginatedBatchApply(basetest.UpvoteTestCase):
         TestModel.query(), CallMock, extra_args=['a', 'b'],
         extra_kwargs={'c': 'c'})
 
-    for _ in xrange(2):
-      self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
-      self.RunDeferredTasks()
+    self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
+    self.RunDeferredTasks()
 
     self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 0)
 
     self.assertTrue(_GLOBAL_CBK_MOCK.called_with(entities, 'a', 'b', c='c'))
 
+  def testKeysOnly(self):
+    entities = CreateEntities(3)
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, page_size=2, keys_only=True)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    processed = [
+        key for call in _GLOBAL_CBK_MOCK.call_args_list for key in call[0][0]]
+    self.assertSameElements([entity.key for entity in entities], processed)
+
+  def testProjection(self):
+    CreateEntities(2, foo='abc')
+    CreateEntity(foo='def')
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, pre_queue_callback=ReturnFoo,
+        page_size=1, projection=['foo'], distinct=True)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    processed = [
+        foo for call in _GLOBAL_CBK_MOCK.call_args_list for foo in call[0][0]]
+    self.assertSameElements(['abc', 'def'], processed)
+
+  def testPreQueueCallback(self):
+    CreateEntities(2, foo='abc')
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, pre_queue_callback=ReturnFoo)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    _GLOBAL_CBK_MOCK.assert_called_once_with(['abc', 'abc'])
+
+  def testDeletedEntity(self):
+    entities = CreateEntities(2)
+    self.Patch(
+        datastore_utils.ndb, 'get_multi',
+        return_value=[entities[0], None])
+    datastore_utils.QueuedPaginatedBatchApply(TestModel.query(), CallMock)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    _GLOBAL_CBK_MOCK.assert_called_once_with([entities[0]])
+
+  def testPayloadExcludesResults(self):
+    CreateEntities(3, foo='x' * 1000)
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, page_size=2)
+    self.RunDeferredTasks()
+
+    # The next task should only carry a cursor, not the page's entities.
+    tasks = self.GetTasks(constants.TASK_QUEUE.DEFAULT)
+    self.assertLen(tasks, 1)
+    self.assertNotIn('x' * 1000, base64.b64decode(tasks[0]['body']))
+
+  def testCompletionCallback(self):
+    CreateEntities(3)
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, page_size=2,
+        completion_callback=CallCompletionMock)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertEqual(2, _GLOBAL_CBK_MOCK.call_count)
+    self.assertEqual(1, _GLOBAL_COMPLETION_MOCK.call_count)
+
+  def testFanOut(self):
+    entities = CreateEntities(7)
+    sorted_keys = sorted(entity.key for entity in entities)
+    self.Patch(
+        datastore_utils, '_GetScatterSplitKeys',
+        return_value=[sorted_keys[2], sorted_keys[5]])
+
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, page_size=2, range_count=3,
+        completion_callback=CallCompletionMock)
+
+    # The first task should defer one task for each of the 3 ranges.
+    self.RunDeferredTasks()
+    self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 3)
+    self.assertEntityCount(datastore_utils._BatchApplyProgress, 1)
+
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    # Every entity should have been processed exactly once.
+    processed_keys = [
+        entity.key
+        for call in _GLOBAL_CBK_MOCK.call_args_list
+        for entity in call[0][0]]
+    self.assertEqual(sorted_keys, sorted(processed_keys))
+
+    # Completion should only be reported once all ranges have finished.
+    self.assertEqual(1, _GLOBAL_COMPLETION_MOCK.call_count)
+    self.assertEntityCount(datastore_utils._BatchApplyProgress, 0)
+
+  def testFinishRange_Retried(self):
+    progress_key = datastore_utils._BatchApplyProgress(range_count=2).put()
+    queue = constants.TASK_QUEUE.DEFAULT
+
+    # A retried range shouldn't be counted twice.
+    datastore_utils._FinishRange(progress_key, 0, CallCompletionMock, queue)
+    datastore_utils._FinishRange(progress_key, 0, CallCompletionMock, queue)
+    self.assertTaskCount(queue, 0)
+    self.assertEqual([0], progress_key.get().finished_ranges)
+
+    datastore_utils._FinishRange(progress_key, 1, CallCompletionMock, queue)
+    self.assertTaskCount(queue, 1)
+    self.assertIsNone(progress_key.get())
+
+    # Once completion has been reported, a retry should be a no-op.
+    datastore_utils._FinishRange(progress_key, 1, CallCompletionMock, queue)
+    self.assertTaskCount(queue, 1)
+
+  def testFanOut_NoSplitKeys(self):
+    CreateEntities(3)
+    self.Patch(datastore_utils, '_GetScatterSplitKeys', return_value=[])
+
+    datastore_utils.QueuedPaginatedBatchApply(
+        TestModel.query(), CallMock, page_size=2, range_count=3)
+
+    # With no split points, the whole query is processed as a single range.
+    self.RunDeferredTasks()
+    self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
+
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+    self.assertEqual(2, _GLOBAL_CBK_MOCK.call_count)
+
+  def testFanOut_SortOrder(self):
+    with self.assertRaises(datastore_utils.Error):
+      datastore_utils.QueuedPaginatedBatchApply(
+          TestModel.query().order(TestModel.bar), CallMock, range_count=3)
+
+
+class GetScatterSplitKeysTest(basetest.UpvoteTestCase):
+
+  def testEmptyKind(self):
+    self.assertEqual(
+        [], datastore_utils._GetScatterSplitKeys(TestModel._get_kind(), 3))
+
 
 if __name__ == '__main__':
   basetest.main()
@@ -14,6 +14,8 @@
 
 """Metrics for binary_health."""
 
+import logging
+
 from google.appengine.ext import deferred
 from google.appengine.ext import ndb
 
@@ -38,6 +40,36 @@ def DeferLookupMetric(blockable_id, reason, queue=constants.TASK_QUEUE.METRICS):
       _transactional=ndb.in_transaction())
 
 
+def DeferLookupMetrics(
+    blockable_ids, reason, queue=constants.TASK_QUEUE.METRICS):
+  """Defer a single task to collect binary health analysis for many blockables."""
+  if not settings.ENABLE_BINARY_ANALYSIS_PRECACHING:
+    return
+
+  deferred.defer(
+      CollectLookups, blockable_ids, reason, _queue=queue,
+      _transactional=ndb.in_transaction())
+
+
+def CollectLookups(blockable_ids, reason):
+  """Collect and store binary health analysis state for several blockables.
+
+  A failure to collect analysis for one blockable is logged and doesn't prevent
+  collection for the others.
+
+  Args:
+    blockable_ids: list<str>, The IDs of the blockables for which analysis
+        should be collected.
+    reason: constants.ANALYSIS_REASON, The semantic significance of this metric
+        collection.
+  """
+  for blockable_id in blockable_ids:
+    try:
+      CollectLookup(blockable_id, reason)
+    except Exception:  # pylint: disable=broad-except
+      logging.exception('Failed to collect lookup for %s', blockable_id)
+
+
 def CollectLookup(blockable_id, reason):
   """Collect and store binary health analysis state for blockables.
 
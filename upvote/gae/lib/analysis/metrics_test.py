@@ -75,5 +75,27 @@ class MetricsTest(basetest.UpvoteTestCase):
     mock_vt_lookup.assert_called_once_with('foo')
 
 
+  def testDeferLookupMetrics(self, mock_vt_lookup, _):
+    test_utils.CreateSantaBlockable(id='foo')
+    test_utils.CreateSantaBlockable(id='bar')
+
+    metrics.DeferLookupMetrics(
+        ['foo', 'baz', 'bar'], constants.ANALYSIS_REASON.UPVOTE)
+
+    # A single task should collect all the lookups, skipping the bad one.
+    self.assertTaskCount(constants.TASK_QUEUE.METRICS, 1)
+    self.RunDeferredTasks(constants.TASK_QUEUE.METRICS)
+
+    mock_vt_lookup.assert_has_calls([mock.call('foo'), mock.call('bar')])
+    self.assertEntityCount(metrics_db.VirusTotalAnalysisMetric, 2)
+
+  def testDeferLookupMetrics_Disabled(self, *_):
+    self.PatchSetting('ENABLE_BINARY_ANALYSIS_PRECACHING', False)
+
+    metrics.DeferLookupMetrics(['foo'], constants.ANALYSIS_REASON.UPVOTE)
+
+    self.assertTaskCount(constants.TASK_QUEUE.METRICS, 0)
+
+
 if __name__ == '__main__':
   basetest.main()
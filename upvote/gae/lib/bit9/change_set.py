@@ -14,6 +14,7 @@
 
 """Module for committing Upvote Rules to the Bit9 database."""
 
+import collections
 import datetime
 import logging
 
@@ -23,6 +24,7 @@ from google.appengine.ext import ndb
 from upvote.gae.datastore.models import bit9
 from upvote.gae.lib.bit9 import api
 from upvote.gae.lib.bit9 import constants as bit9_constants
+from upvote.gae.lib.bit9 import exceptions as excs
 from upvote.gae.lib.bit9 import monitoring
 from upvote.gae.lib.bit9 import utils as bit9_utils
 from upvote.shared import constants
@@ -32,19 +34,50 @@ _COMMIT_RETRIES = 3
 # The amount of time since last sync for which a Computer is considered active.
 _ACTIVITY_WINDOW = datetime.timedelta(days=1)
 
+# The maximum number of hosts whose fileInstances are requested in a single
+# query. This keeps the query string to a reasonable length.
+_FILE_INSTANCE_QUERY_BATCH_SIZE = 50
+
+# The number of blockables whose change sets are committed by a single task.
+COMMIT_BATCH_SIZE = 25
+
+# How long a batch commit task will keep starting new commits. This leaves ample
+# room within the 10 minute task deadline for a commit that's in progress.
+_COMMIT_TASK_DURATION = datetime.timedelta(minutes=8)
+
+
+def _GetFileInstances(file_catalog_id, host_ids):
+  """Retrieves the fileInstances of a fileCatalog across a number of hosts.
+
+  Args:
+    file_catalog_id: int, The ID of the fileCatalog.
+    host_ids: list<int>, The IDs of the hosts of interest.
+
+  Returns:
+    A dict mapping each host ID to a list of its api.FileInstances.
+  """
+  file_instances = collections.defaultdict(list)
+  for i in xrange(0, len(host_ids), _FILE_INSTANCE_QUERY_BATCH_SIZE):
+    host_filter = None
+    for host_id in host_ids[i:i + _FILE_INSTANCE_QUERY_BATCH_SIZE]:
+      new_operand = (api.FileInstance.computer_id == host_id)
+      host_filter = host_filter | new_operand if host_filter else new_operand
+
+    query = api.FileInstance.query()
+    query = query.filter(host_filter)
+    query = query.filter(api.FileInstance.file_catalog_id == file_catalog_id)
+    for instance in query.execute(bit9_utils.CONTEXT):
+      file_instances[instance.computer_id].append(instance)
 
-def _ChangeLocalState(new_state, file_catalog_id, host_id):
-  """Handles requests for changing local approval state."""
   logging.info(
-      'Changing local state to %s for fileCatalog=%s, computer=%s', new_state,
-      file_catalog_id, host_id)
+      'Retrieved %d matching fileInstance(s) across %d host(s)',
+      sum(len(instances) for instances in file_instances.itervalues()),
+      len(file_instances))
+  return file_instances
 
-  query = api.FileInstance.query()
-  query = query.filter(api.FileInstance.computer_id == host_id)
-  query = query.filter(api.FileInstance.file_catalog_id == file_catalog_id)
-  file_instances = query.execute(bit9_utils.CONTEXT)
-  logging.info('Retrieved %s matching fileInstance(s)', len(file_instances))
 
+def _ChangeLocalState(new_state, file_instances):
+  """Handles requests for changing local approval state."""
   if not file_instances:
     monitoring.file_instances_missing.Increment()
     logging.info('Change could not be fulfilled')
@@ -70,13 +103,28 @@ def _ChangeLocalStates(blockable, local_rules, new_state):
     logging.warning('Cannot change local state for certificates in Bit9')
     return
 
+  # Look up the fileInstances for all affected hosts at once, rather than
+  # issuing a separate query per host.
+  file_catalog_id = int(blockable.file_catalog_id)
+  host_ids = sorted({int(local_rule.host_id) for local_rule in local_rules})
+  file_instances = _GetFileInstances(file_catalog_id, host_ids)
+
   for local_rule in local_rules:
     logging.info(
         'Locally marking %s as %s on host %s', blockable.key.id(),
         bit9_constants.APPROVAL_STATE.MAP_TO_STR[new_state], local_rule.host_id)
 
-    was_fulfilled = _ChangeLocalState(
-        new_state, int(blockable.file_catalog_id), int(local_rule.host_id))
+    # A permanent failure to update one host (e.g. its fileInstance no longer
+    # exists) shouldn't prevent the others from being updated. The rule is left
+    # unfulfilled and will be retried if the binary is blocked on that host
+    # again. Transient errors propagate so the whole change set is retried.
+    try:
+      was_fulfilled = _ChangeLocalState(
+          new_state, file_instances.get(int(local_rule.host_id)))
+    except (excs.NotFoundError, excs.ClientError):
+      logging.exception(
+          'Failed to change local state on host %s', local_rule.host_id)
+      was_fulfilled = False
 
     # Insert a special BigQuery Rule row indicating when/if this rule ultimately
     # gets fulfilled.
@@ -262,3 +310,62 @@ def DeferCommitBlockableChangeSet(
       _CommitBlockableChangeSet, blockable_key, tail_defer=tail_defer,
       tail_defer_count=tail_defer_count,
       _queue=constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, _countdown=countdown)
+
+
+def _CommitAllBlockableChangeSets(blockable_key, deadline):
+  """Commits a blockable's pending RuleChangeSets in order.
+
+  Args:
+    blockable_key: Key, The key of the blockable whose changes will be
+        committed.
+    deadline: datetime, No new commits will be started after this time.
+
+  Returns:
+    The number of change sets committed.
+  """
+  change_keys = bit9.RuleChangeSet.query(ancestor=blockable_key).order(
+      bit9.RuleChangeSet.recorded_dt).fetch(keys_only=True)
+
+  committed_count = 0
+  for change_key in change_keys:
+    if datetime.datetime.utcnow() > deadline:
+      break
+    _CommitChangeSet(change_key)
+    committed_count += 1
+  return committed_count
+
+
+def _CommitChangeSets(blockable_keys):
+  """Commits the pending RuleChangeSets for a batch of blockables.
+
+  Each blockable's change sets are committed in order, each in its own
+  transaction. If a commit fails, the remaining changes for that blockable are
+  left for a later attempt, but the other blockables are still processed.
+
+  Args:
+    blockable_keys: list<Key>, The keys of the blockables whose changes will be
+        committed.
+  """
+  deadline = datetime.datetime.utcnow() + _COMMIT_TASK_DURATION
+  committed_count = 0
+  failed_keys = []
+
+  for blockable_key in blockable_keys:
+    if datetime.datetime.utcnow() > deadline:
+      logging.info('Out of time, deferring remaining changes to the next cron')
+      break
+    try:
+      committed_count += _CommitAllBlockableChangeSets(blockable_key, deadline)
+    except Exception:  # pylint: disable=broad-except
+      logging.exception('Failed to commit changes for %s', blockable_key.id())
+      failed_keys.append(blockable_key)
+
+  logging.info(
+      'Committed %d change set(s) for %d blockable(s) (%d failed)',
+      committed_count, len(blockable_keys), len(failed_keys))
+
+
+def DeferCommitChangeSets(blockable_keys, countdown=0):
+  deferred.defer(
+      _CommitChangeSets, blockable_keys,
+      _queue=constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, _countdown=countdown)
@@ -24,6 +24,7 @@ from upvote.gae.datastore.models import bit9
 from upvote.gae.lib.bit9 import api
 from upvote.gae.lib.bit9 import change_set
 from upvote.gae.lib.bit9 import constants as bit9_constants
+from upvote.gae.lib.bit9 import exceptions as excs
 from upvote.gae.lib.testing import basetest
 from upvote.gae.lib.testing import bit9test
 from upvote.shared import constants
@@ -70,6 +71,62 @@ class ChangeLocalStatesTest(basetest.UpvoteTestCase):
     self.assertBigQueryInsertion(constants.BIGQUERY_TABLE.RULE)
 
 
+class GetFileInstancesTest(bit9test.Bit9TestCase):
+
+  def testBatched(self):
+    self.Patch(change_set, '_FILE_INSTANCE_QUERY_BATCH_SIZE', 2)
+    fi1 = api.FileInstance(id=1, file_catalog_id=1234, computer_id=1)
+    fi2 = api.FileInstance(id=2, file_catalog_id=1234, computer_id=3)
+    fi3 = api.FileInstance(id=3, file_catalog_id=1234, computer_id=3)
+    self.PatchApiRequests([fi1], [fi2, fi3])
+
+    file_instances = change_set._GetFileInstances(1234, [1, 2, 3])
+
+    self.mock_ctx.ExecuteRequest.assert_has_calls([
+        mock.call(
+            'GET', api_route='fileInstance',
+            query_args=[r'q=computerId:1|2', 'q=fileCatalogId:1234']),
+        mock.call(
+            'GET', api_route='fileInstance',
+            query_args=[r'q=computerId:3', 'q=fileCatalogId:1234'])])
+    self.assertEqual([1], [fi.id for fi in file_instances[1]])
+    self.assertNotIn(2, file_instances)
+    self.assertEqual([2, 3], [fi.id for fi in file_instances[3]])
+
+
+class ChangeLocalStatesFailureTest(bit9test.Bit9TestCase):
+
+  def testPartialFailure(self):
+    binary = test_utils.CreateBit9Binary(file_catalog_id='1234')
+    rule_1 = test_utils.CreateBit9Rule(binary.key, host_id='1')
+    rule_2 = test_utils.CreateBit9Rule(binary.key, host_id='2')
+    fi1 = api.FileInstance(id=1, file_catalog_id=1234, computer_id=1)
+    fi2 = api.FileInstance(id=2, file_catalog_id=1234, computer_id=2)
+    self.mock_ctx.ExecuteRequest.side_effect = [
+        [fi1.to_raw_dict(), fi2.to_raw_dict()], excs.NotFoundError,
+        fi2.to_raw_dict()]
+
+    change_set._ChangeLocalStates(
+        binary, [rule_1, rule_2], bit9_constants.APPROVAL_STATE.APPROVED)
+
+    self.assertFalse(rule_1.is_fulfilled)
+    self.assertTrue(rule_2.is_fulfilled)
+
+  def testTransientFailure(self):
+    binary = test_utils.CreateBit9Binary(file_catalog_id='1234')
+    rule_1 = test_utils.CreateBit9Rule(binary.key, host_id='1')
+    rule_2 = test_utils.CreateBit9Rule(binary.key, host_id='2')
+    fi1 = api.FileInstance(id=1, file_catalog_id=1234, computer_id=1)
+    fi2 = api.FileInstance(id=2, file_catalog_id=1234, computer_id=2)
+    self.mock_ctx.ExecuteRequest.side_effect = [
+        [fi1.to_raw_dict(), fi2.to_raw_dict()], excs.RequestError]
+
+    # Transient errors should propagate so that the change set is retried.
+    with self.assertRaises(excs.RequestError):
+      change_set._ChangeLocalStates(
+          binary, [rule_1, rule_2], bit9_constants.APPROVAL_STATE.APPROVED)
+
+
 class CommitBlockableChangeSetTest(bit9test.Bit9TestCase):
 
   def setUp(self):
@@ -209,14 +266,14 @@ class CommitBlockableChangeSetTest(bit9test.Bit9TestCase):
         local_state=bit9_constants.APPROVAL_STATE.UNAPPROVED)
     rule = api.FileRule(
         file_catalog_id=1234, file_state=bit9_constants.APPROVAL_STATE.APPROVED)
-    self.PatchApiRequests([fi1], fi1, [fi2], fi2, rule)
+    self.PatchApiRequests([fi1, fi2], fi1, fi2, rule)
 
     change_set._CommitBlockableChangeSet(self.binary.key)
 
     self.mock_ctx.ExecuteRequest.assert_has_calls([
         mock.call(
             'GET', api_route='fileInstance',
-            query_args=[r'q=computerId:5678', 'q=fileCatalogId:1234']),
+            query_args=[r'q=computerId:5678|9012', 'q=fileCatalogId:1234']),
         mock.call(
             'POST', api_route='fileInstance',
             data={'id': 9012,
@@ -224,9 +281,6 @@ class CommitBlockableChangeSetTest(bit9test.Bit9TestCase):
                   'fileCatalogId': 1234,
                   'computerId': 5678},
             query_args=None),
-        mock.call(
-            'GET', api_route='fileInstance',
-            query_args=[r'q=computerId:9012', 'q=fileCatalogId:1234']),
         mock.call(
             'POST', api_route='fileInstance',
             data={'id': 9012,
@@ -307,14 +361,14 @@ class CommitBlockableChangeSetTest(bit9test.Bit9TestCase):
         local_state=bit9_constants.APPROVAL_STATE.APPROVED)
     rule = api.FileRule(
         file_catalog_id=1234, file_state=bit9_constants.APPROVAL_STATE.APPROVED)
-    self.PatchApiRequests([fi1], fi1, [fi2], fi2, rule)
+    self.PatchApiRequests([fi1, fi2], fi1, fi2, rule)
 
     change_set._CommitBlockableChangeSet(self.binary.key)
 
     self.mock_ctx.ExecuteRequest.assert_has_calls([
         mock.call(
             'GET', api_route='fileInstance',
-            query_args=[r'q=computerId:5678', 'q=fileCatalogId:1234']),
+            query_args=[r'q=computerId:5678|9012', 'q=fileCatalogId:1234']),
         mock.call(
             'POST', api_route='fileInstance',
             data={'id': 9012,
@@ -322,9 +376,6 @@ class CommitBlockableChangeSetTest(bit9test.Bit9TestCase):
                   'fileCatalogId': 1234,
                   'computerId': 5678},
             query_args=None),
-        mock.call(
-            'GET', api_route='fileInstance',
-            query_args=[r'q=computerId:9012', 'q=fileCatalogId:1234']),
         mock.call(
             'POST', api_route='fileInstance',
             data={'id': 9012,
@@ -382,6 +433,42 @@ class CommitBlockableChangeSetTest(bit9test.Bit9TestCase):
       self.assertFalse(mock_commit.called)
 
 
+class CommitChangeSetsTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(CommitChangeSetsTest, self).setUp()
+
+    self.binary = test_utils.CreateBit9Binary(file_catalog_id='1234')
+    self.other_binary = test_utils.CreateBit9Binary(file_catalog_id='5678')
+    self.change_1 = test_utils.CreateRuleChangeSet(self.binary.key)
+    self.change_2 = test_utils.CreateRuleChangeSet(self.binary.key)
+    self.other_change = test_utils.CreateRuleChangeSet(self.other_binary.key)
+
+  def testCommitsAllInOrder(self):
+    with mock.patch.object(change_set, '_CommitChangeSet') as mock_commit:
+      change_set._CommitChangeSets([self.binary.key, self.other_binary.key])
+
+      mock_commit.assert_has_calls([
+          mock.call(self.change_1.key), mock.call(self.change_2.key),
+          mock.call(self.other_change.key)])
+
+  def testFailureIsolation(self):
+    with mock.patch.object(
+        change_set, '_CommitChangeSet',
+        side_effect=[Exception, None]) as mock_commit:
+      change_set._CommitChangeSets([self.binary.key, self.other_binary.key])
+
+      # The second change for the first blockable must not be committed ahead
+      # of the failed one, but the other blockable is unaffected.
+      mock_commit.assert_has_calls([
+          mock.call(self.change_1.key), mock.call(self.other_change.key)])
+      self.assertEqual(2, mock_commit.call_count)
+
+  def testDefer(self):
+    change_set.DeferCommitChangeSets([self.binary.key, self.other_binary.key])
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, 1)
+
+
 class DeferCommitBlockableChangeSetTest(basetest.UpvoteTestCase):
 
   def setUp(self):
@@ -43,6 +43,10 @@ _UNICODE_ALLOW_TRANS = {ord(c): u' ' for c in _REPLACE_CHARS}
 # Make a table of characters to delete from the string
 _DELETE_CHARS = ''.join(map(chr, xrange(128, 256)))
 
+# 4xx statuses which indicate a transient condition rather than a bad request.
+# (429 Too Many Requests isn't defined by httplib.)
+_RETRYABLE_CLIENT_STATUS_CODES = frozenset([httplib.REQUEST_TIMEOUT, 429])
+
 
 def UnicodeToAscii(value):
   return ToAsciiStr(value) if isinstance(value, unicode) else value
@@ -100,11 +104,16 @@ class BaseContext(six.with_metaclass(abc.ABCMeta)):
 
     Raises:
       NotFoundError: If the response returned a 404 (object not found).
+      ClientError: The request was rejected with a non-retryable 4xx status.
       RequestError: The response had a failure status code.
     """
     if response.status_code == httplib.NOT_FOUND:
       raise excs.NotFoundError('Object in request cannot be found')
     # All 300s and 100s should be resolved by the requests library.
+    elif (400 <= response.status_code < 500 and
+          response.status_code not in _RETRYABLE_CLIENT_STATUS_CODES):
+      raise excs.ClientError(
+          '{} Error: {}'.format(response.status_code, response.text))
     elif response.status_code >= 400:
       raise excs.RequestError(
           '{} Error: {}'.format(response.status_code, response.text))
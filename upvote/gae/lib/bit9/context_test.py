@@ -111,16 +111,26 @@ class ContextTest(absltest.TestCase):
         status_code=httplib.BAD_REQUEST)
 
     ctx = context.Context('foo.corn', 'foo', 1)
-    with self.assertRaises(excs.RequestError):
+    with self.assertRaises(excs.ClientError):
       ctx.ExecuteRequest('GET')
 
+  def testRetryableClientError(self, mock_req):
+    mock_req.return_value = test_utils.GetTestResponse(
+        status_code=httplib.REQUEST_TIMEOUT)
+
+    ctx = context.Context('foo.corn', 'foo', 1)
+    with self.assertRaises(excs.RequestError) as e:
+      ctx.ExecuteRequest('GET')
+    self.assertNotIsInstance(e.exception, excs.ClientError)
+
   def testServerError(self, mock_req):
     mock_req.return_value = test_utils.GetTestResponse(
         status_code=httplib.INTERNAL_SERVER_ERROR)
 
     ctx = context.Context('foo.corn', 'foo', 1)
-    with self.assertRaises(excs.RequestError):
+    with self.assertRaises(excs.RequestError) as e:
       ctx.ExecuteRequest('GET')
+    self.assertNotIsInstance(e.exception, excs.ClientError)
 
   def testNotFound(self, mock_req):
     mock_req.return_value = test_utils.GetTestResponse(
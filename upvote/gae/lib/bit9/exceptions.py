@@ -15,7 +15,8 @@
 """Exceptions for Bit9 API."""
 
 __all__ = [
-    'Error', 'RequestError', 'NotFoundError', 'QueryError', 'PropertyError']
+    'Error', 'RequestError', 'ClientError', 'NotFoundError', 'QueryError',
+    'PropertyError']
 
 
 class Error(Exception):
@@ -26,6 +27,13 @@ class RequestError(Error):
   """Indicates an error with the API request."""
 
 
+class ClientError(RequestError):
+  """Indicates that the API rejected the request with a 4xx status.
+
+  Excludes 404s (see NotFoundError) and statuses that may succeed on retry.
+  """
+
+
 class NotFoundError(Error):
   """Indicates that the API request returned a 404."""
 
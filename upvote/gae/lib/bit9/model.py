@@ -28,7 +28,12 @@ from absl import logging
 
 
 class Property(object):
-  """Base class for API object properties."""
+  """Base class for API object properties.
+
+  Properties are data descriptors: accessed on a Model class, they return the
+  Property itself (e.g. for building queries); accessed on a Model instance,
+  they return the decoded property value.
+  """
 
   _PYTHON_TYPE = None
 
@@ -91,6 +96,25 @@ class Property(object):
     else:
       return str(val)
 
+  # pylint: disable=protected-access
+  def __get__(self, inst, owner):
+    if inst is None:
+      return self
+
+    # Decoding can be expensive (e.g. parsing DateTimes) and the same fields
+    # tend to be read repeatedly, so memoize the decoded value per instance.
+    try:
+      return inst._values[self._name]
+    except KeyError:
+      raw = inst._obj_dict.get(inst._name_to_key(self._name))
+      value = inst._values[self._name] = self.raw_to_value(raw)
+      return value
+
+  def __set__(self, inst, value):
+    inst._obj_dict[inst._name_to_key(self._name)] = self.value_to_raw(value)
+    inst._values.pop(self._name, None)
+  # pylint: enable=protected-access
+
   def __eq__(self, other):
     return query_nodes.FilterNode(self, ':', self._value_to_query(other))
 
@@ -257,6 +281,8 @@ class Model(object):
   def __init__(self, **kwargs):
     self._obj_dict = {}
     self._prefix = None
+    # Cache of decoded property values, keyed by API property name.
+    self._values = {}
 
     for key, val in kwargs.iteritems():
       prop = self._get_and_validate_property(key)
@@ -452,21 +478,6 @@ class Model(object):
     else:
       return name
 
-  def __getattribute__(self, name):
-    attr = super(Model, self).__getattribute__(name)
-    if isinstance(attr, Property):
-      value = self._obj_dict.get(self._name_to_key(attr.name))
-      return attr.raw_to_value(value)
-    else:
-      return attr
-
-  def __setattr__(self, name, value):
-    attr = self._PROPERTIES.get(name)
-    if attr is None:
-      super(Model, self).__setattr__(name, value)
-    else:
-      self._obj_dict[self._name_to_key(attr.name)] = attr.value_to_raw(value)
-
   def __eq__(self, other):
     return self.to_dict() == other.to_dict()
 
@@ -238,6 +238,20 @@ class ModelTest(absltest.TestCase):
         {'foo': 'a', 'bar': 1, 'baz': 'b', 'foo_foo': 'c'})
     self.assertEqual('abcd', test_model.ROUTE)
 
+  def testGetAttr_Memoized(self, _):
+    test_model = TestModel.from_dict({'foo': 'a', 'bar': 1})
+    self.assertEqual(1, test_model.bar)
+
+    # Reads after the first are served from the instance's decoded values.
+    test_model._obj_dict['bar'] = 2
+    self.assertEqual(1, test_model.bar)
+
+  def testGetAttr_MemoizedPerInstance(self, _):
+    test_model = TestModel.from_dict(
+        {'foo': 'a', 'bar': 1, 'baz': 'b', 'foo_foo': 'c'})
+    self.assertEqual('a', test_model.foo)
+    self.assertEqual('c', test_model.get_expand(TestModel.foo).foo)
+
   def testGetAttr_AbsentDatetimeProperty(self, _):
 
     class FooModel(model.Model):
@@ -267,6 +281,15 @@ class ModelTest(absltest.TestCase):
     self.assertEqual('c', test_model.foo)
     self.assertEqual('c', test_model._obj_dict['foo'])
 
+  def testSetAttr_AfterGetAttr(self, _):
+    test_model = TestModel(foo='a', bar=1, baz='b')
+    self.assertEqual(1, test_model.bar)
+
+    test_model.bar = 2
+
+    self.assertEqual(2, test_model.bar)
+    self.assertEqual(2, test_model._obj_dict['bar'])
+
   def testSetAttr_WithPrefix(self, _):
     test_model = TestModel.from_dict(
         {'foo': 'a', 'bar': 1, 'baz': 'b', 'foo_foo': 'c'})
@@ -0,0 +1,114 @@
+# Copyright 2017 Google Inc. All Rights Reserved.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS-IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""A script to benchmark property access on Bit9 API Models.
+
+Builds a page of Events with fileCatalog and computer expansions (i.e. what a
+single GetEvents() call returns) and times the property reads performed by the
+Bit9 event syncing code.
+"""
+
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import timeit
+
+from upvote.gae.lib.bit9 import api
+from upvote.gae.lib.bit9 import model
+from absl import app
+from absl import flags
+
+FLAGS = flags.FLAGS
+
+flags.DEFINE_integer(
+    'page_size', 128, 'The number of Events in each page.')
+flags.DEFINE_integer(
+    'iterations', 100, 'The number of times each page should be read.')
+
+
+_RAW_VALUES = {
+    model.StringProperty: u'some string value',
+    model.Int16Property: 12,
+    model.Int32Property: 1234,
+    model.Int64Property: 123456,
+    model.DecimalProperty: 1.5,
+    model.DoubleProperty: 2.5,
+    model.BooleanProperty: True,
+    model.DateTimeProperty: '2018-01-01T12:34:56.789000Z',
+}
+
+# The properties read by bit9_syncing.GetEvents() and bit9_syncing.Process().
+_EVENT_READS = (
+    'id', 'timestamp', 'subtype', 'file_catalog_id', 'computer_id',
+    'file_name', 'path_name', 'description', 'user_name')
+_FILE_CATALOG_READS = (
+    'id', 'sha256', 'sha256_hash_type', 'sha1', 'md5', 'file_name',
+    'path_name', 'file_type', 'file_size', 'file_flags', 'date_created',
+    'company', 'publisher', 'product_name', 'product_version',
+    'certificate_id', 'computer_id', 'file_state', 'publisher_state',
+    'certificate_state')
+_COMPUTER_READS = ('id', 'name', 'policy_id', 'users')
+
+
+def _RawDict(model_cls, prefix=None):
+  """Returns a raw API dict populating every property of model_cls."""
+  raw_dict = {}
+  for prop in model_cls._PROPERTIES.values():  # pylint: disable=protected-access
+    key = prop.name if prefix is None else '_'.join((prefix, prop.name))
+    raw_dict[key] = _RAW_VALUES[type(prop)]
+  return raw_dict
+
+
+def _CreateEventPage(page_size):
+  page = []
+  for i in xrange(page_size):
+    raw_event = _RawDict(api.Event)
+    raw_event.update(
+        _RawDict(api.FileCatalog, prefix=api.Event.file_catalog_id.name))
+    raw_event.update(_RawDict(api.Computer, prefix=api.Event.computer_id.name))
+    raw_event[api.Event.id.name] = i
+    page.append(raw_event)
+  return page
+
+
+def _ReadPage(raw_page):
+  # Each page is read from freshly-constructed instances, as it would be after
+  # an API call or a datastore read.
+  for raw_event in raw_page:
+    event = api.Event.from_dict(raw_event)
+    file_catalog = event.get_expand(api.Event.file_catalog_id)
+    computer = event.get_expand(api.Event.computer_id)
+
+    # The syncing code reads most fields more than once.
+    for _ in xrange(2):
+      for name in _EVENT_READS:
+        getattr(event, name)
+      for name in _FILE_CATALOG_READS:
+        getattr(file_catalog, name)
+      for name in _COMPUTER_READS:
+        getattr(computer, name)
+
+
+def main(unused_argv):
+  raw_page = _CreateEventPage(FLAGS.page_size)
+  total_secs = timeit.timeit(
+      lambda: _ReadPage(raw_page), number=FLAGS.iterations)
+  print('Read %d page(s) of %d Event(s) in %.3fs (%.3fms per page)' % (
+      FLAGS.iterations, FLAGS.page_size, total_secs,
+      1000 * total_secs / FLAGS.iterations))
+
+
+if __name__ == '__main__':
+  app.run(main)
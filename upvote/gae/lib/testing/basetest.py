@@ -35,6 +35,7 @@ from common.testing import basetest
 
 from upvote.gae import settings
 from upvote.gae.bigquery import tables
+from upvote.gae.datastore import metadata_cache
 from upvote.gae.datastore import test_utils
 from upvote.gae.utils import handler_utils
 from upvote.gae.utils import settings_utils
@@ -70,6 +71,9 @@ class UpvoteTestCase(basetest.AppEngineTestCase):
         root_path=index_yaml_dir)
     self.testbed.init_memcache_stub()
 
+    # The metadata cache outlives each test's Datastore, so start it afresh.
+    metadata_cache.Clear()
+
     if wsgi_app is not None:
       # Workaround for lack of "runtime" variable in test env.
       adapter = lambda r, h: webapp2.Webapp2HandlerAdapter(h)
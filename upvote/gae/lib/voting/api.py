@@ -15,8 +15,11 @@
 """Logic associated with voting."""
 
 import abc
+import functools
 import logging
 
+from google.appengine.api import datastore_errors
+from google.appengine.ext import deferred
 from google.appengine.ext import ndb
 
 from upvote.gae import settings
@@ -35,6 +38,38 @@ from upvote.gae.utils import user_utils
 from upvote.shared import constants
 
 
+# The maximum number of local whitelisting Rules to create per transaction.
+_LOCAL_WHITELISTING_RULE_BATCH_SIZE = 100
+
+# The maximum number of usernames included in a single IN query when resolving
+# the Bit9Hosts of many users at once. The Datastore limits the number of
+# subqueries an IN filter may expand to.
+_HOST_USERS_QUERY_BATCH_SIZE = 30
+
+# The maximum number of host IDs included in a single IN query when checking for
+# the existing local Rules of a batch of hosts.
+_RULE_HOST_IDS_QUERY_BATCH_SIZE = 30
+
+# The number of Blockables audited by each AuditAll task.
+_AUDIT_PAGE_SIZE = 100
+
+# The number of Rule projections classified at a time when checking Rules.
+_RULE_PAGE_SIZE = 1000
+
+# How long to wait after a PendingVote is cast before applying it to the
+# Blockable. PendingVotes cast in the meantime are applied by the same task.
+_PENDING_VOTE_APPLY_DELAY_SECS = 10
+
+# The maximum number of PendingVotes applied per transaction. Each PendingVote is
+# its own entity group, and an XG transaction may span at most 25.
+_PENDING_VOTE_BATCH_SIZE = 20
+
+# Users with these permissions may modify a Blockable in ways that can't be
+# deferred, so their votes are never cast as PendingVotes.
+_UNDEFERRABLE_VOTER_PERMISSIONS = frozenset([
+    constants.PERMISSIONS.UNFLAG, constants.PERMISSIONS.MARK_MALWARE])
+
+
 class Error(Exception):
   """Base error class for the voting module."""
 
@@ -85,50 +120,180 @@ def _GetUpvoters(blockable):
           for vote in upvotes_query.fetch()}
 
 
-def _CheckBlockableFlagStatus(blockable):
-  """Check the flagged property of a blockable and fix if needed."""
-  change_made = False
+@ndb.non_transactional
+def _GetUsers(emails):
+  """Fetches the Users with the given emails outside of any transaction."""
+  return ndb.get_multi(ndb.Key(user_models.User, email) for email in emails)
 
-  # NOTE: If called within _TransactionalVoting, the returned vote
-  # may have been changed within the transaction but the index not yet
-  # updated. This means there's a possibility that was_yes_vote is True.
-  # pylint: disable=g-explicit-bool-comparison, singleton-comparison
-  maybe_down_votes = vote_models.Vote.query(
-      vote_models.Vote.was_yes_vote == False,
-      vote_models.Vote.in_effect == True,
-      ancestor=blockable.key).fetch()
-  # pylint: enable=g-explicit-bool-comparison, singleton-comparison
-  down_votes_exist = any(not vote.was_yes_vote for vote in maybe_down_votes)
+
+class _VoterPermissions(object):
+  """Resolves and memoizes the permissions of the users who cast votes.
+
+  All unknown voters of a given list of Votes are fetched with a single batch
+  get and the result of each HasPermissionTo check is cached, so walking the
+  votes of a blockable costs at most one round-trip regardless of their number.
+  """
+
+  def __init__(self):
+    self._users = {}
+    self._permissions = {}
+
+  def Prefetch(self, votes):
+    """Fetches the Users who cast the provided votes, if not already fetched.
+
+    Args:
+      votes: list<Vote>, The Votes whose voters should be fetched.
+    """
+    emails = sorted(
+        {vote.user_email.lower() for vote in votes} - set(self._users))
+    if emails:
+      self._users.update(zip(emails, _GetUsers(emails)))
+
+  def HasPermissionTo(self, user_email, permission):
+    """Returns whether the given voter has the provided permission.
+
+    Args:
+      user_email: str, The email of the voter.
+      permission: str, One of constants.PERMISSIONS.*
+
+    Returns:
+      bool, Whether the voter exists and has the permission.
+    """
+    user_email = user_email.lower()
+    cache_key = (user_email, permission)
+    if cache_key not in self._permissions:
+      if user_email not in self._users:
+        self._users[user_email] = _GetUsers([user_email])[0]
+      user = self._users[user_email]
+      if user is None:
+        logging.warning('Voter %s does not exist', user_email)
+      self._permissions[cache_key] = bool(
+          user and user.HasPermissionTo(permission))
+    return self._permissions[cache_key]
+
+
+def _GetAnalysisReason(was_yes_vote):
+  return (
+      constants.ANALYSIS_REASON.UPVOTE
+      if was_yes_vote
+      else constants.ANALYSIS_REASON.DOWNVOTE)
+
+
+def _SortVotesByRecency(votes):
+  return list(reversed(sorted(votes, key=lambda vote: vote.recorded_dt)))
+
+
+def _ShouldBeFlagged(blockable, votes, voter_permissions):
+  """Determines whether a blockable should be flagged based on its votes.
+
+  Args:
+    blockable: The Blockable whose flagged status should be determined.
+    votes: list<Vote>, The in-effect Votes for the blockable.
+    voter_permissions: _VoterPermissions, The resolver for the voters'
+        permissions.
+
+  Returns:
+    bool, Whether the blockable should be flagged.
+  """
+  # If there are no 'no' votes, the blockable shouldn't be flagged.
+  if all(vote.was_yes_vote for vote in votes):
+    return False
+
+  # Otherwise, a flagged blockable stays flagged until an authorized upvote
+  # unflags it while voting.
+  if blockable.flagged:
+    return True
 
   # If the blockable has any no votes but is not flagged make sure there
   # is a yes vote from someone who can unflag since the last no vote.
-  if down_votes_exist and not blockable.flagged:
-    # This needs to determine if the blockable should be flagged or not.
-    # pylint: disable=g-explicit-bool-comparison, singleton-comparison
-    all_votes = vote_models.Vote.query(
-        vote_models.Vote.in_effect == True,
-        ancestor=blockable.key).order(-vote_models.Vote.recorded_dt)
-    # pylint: enable=g-explicit-bool-comparison, singleton-comparison
-    for vote in all_votes:
-      if vote.was_yes_vote:
-        user = user_models.User.GetById(vote.user_email)
-        if user.HasPermissionTo(constants.PERMISSIONS.UNFLAG):
-          break
-      else:
-        logging.info(
-            'Blockable %s should have been flagged, but was not.',
-            blockable.key.id())
-        blockable.flagged = True
-        change_made = True
-        break
-
-  # If the blockable is flagged, but there are no 'no' votes, unflag it.
-  elif not down_votes_exist and blockable.flagged:
+  sorted_votes = _SortVotesByRecency(votes)
+  voter_permissions.Prefetch([vote for vote in votes if vote.was_yes_vote])
+  for vote in sorted_votes:
+    if not vote.was_yes_vote:
+      return True
+    elif voter_permissions.HasPermissionTo(
+        vote.user_email, constants.PERMISSIONS.UNFLAG):
+      return False
+  return False
+
+
+def _IsSuspectStateJustified(votes, voter_permissions):
+  """Determines whether a SUSPECT blockable should remain so based on its votes.
+
+  Args:
+    votes: list<Vote>, The in-effect Votes for the blockable.
+    voter_permissions: _VoterPermissions, The resolver for the voters'
+        permissions.
+
+  Returns:
+    bool, Whether the most recent vote from a user authorized to mark malware
+    was a 'no' vote.
+  """
+  sorted_votes = _SortVotesByRecency(votes)
+  voter_permissions.Prefetch(sorted_votes)
+  for vote in sorted_votes:
+    if voter_permissions.HasPermissionTo(
+        vote.user_email, constants.PERMISSIONS.MARK_MALWARE):
+      return not vote.was_yes_vote
+  return False
+
+
+def _CheckBlockableFlagStatus(blockable, voter_permissions=None):
+  """Check the flagged property of a blockable and fix if needed.
+
+  Args:
+    blockable: The Blockable whose flagged property will be checked.
+    voter_permissions: _VoterPermissions, If provided, a (possibly shared)
+        resolver for the voters' permissions.
+
+  Returns:
+    bool, Whether the blockable was modified.
+  """
+  voter_permissions = voter_permissions or _VoterPermissions()
+
+  # NOTE: If called within _TransactionalVoting, the votes returned
+  # won't reflect any vote changes made within the transaction.
+  should_be_flagged = _ShouldBeFlagged(
+      blockable, blockable.GetVotes(), voter_permissions)
+  if should_be_flagged == blockable.flagged:
+    return False
+
+  if should_be_flagged:
+    logging.info(
+        'Blockable %s should have been flagged, but was not.',
+        blockable.key.id())
+  else:
     logging.info(
         'Blockable: %s was flagged, but should not be.', blockable.key.id())
-    blockable.flagged = False
-    change_made = True
-  return change_made
+  blockable.flagged = should_be_flagged
+  return True
+
+
+def _GetPendingVotes(blockable_key):
+  return vote_models.PendingVote.query(
+      vote_models.PendingVote.blockable_key == blockable_key).fetch()
+
+
+def _GetRuleProjectionQuery(blockable_key):
+  """Returns a query projecting the in-effect Rules for a blockable.
+
+  The projection includes only those properties needed to audit the Rules.
+
+  Args:
+    blockable_key: Key, The key of the blockable whose Rules should be queried.
+
+  Returns:
+    An ndb.Query.
+  """
+  # pylint: disable=g-explicit-bool-comparison, singleton-comparison
+  query = rule_models.Rule.query(
+      rule_models.Rule.in_effect == True,
+      ancestor=blockable_key,
+      projection=[
+          rule_models.Rule.rule_type, rule_models.Rule.policy,
+          rule_models.Rule.host_id])
+  # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+  return query
 
 
 def _GetRulesForBlockable(blockable):
@@ -171,11 +336,63 @@ def Vote(user, sha256, upvote, weight):
   if weight < 0:
     raise InvalidVoteWeightError(weight)
 
-  ballot_box = _BALLOT_BOX_MAP[platform](sha256)
+  ballot_box = _BALLOT_BOX_MAP[platform](sha256, blockable=blockable)
   ballot_box.Vote(upvote, user, weight)
   return ballot_box.new_vote
 
 
+def VoteMulti(user, sha256s, upvote, weight):
+  """Casts votes for several Blockables.
+
+  All of the Blockables are fetched at once and then voted on one at a time. A
+  failure to vote on one Blockable doesn't prevent the votes on the others.
+
+  Args:
+    user: User entity representing the person casting the votes.
+    sha256s: list<str>, The SHA256s of the Blockables being voted on.
+    upvote: bool, whether the votes are 'yes' votes.
+    weight: int, The weight with which the votes will be cast. The weight must
+        be >= 0 (UNTRUSTED_USERs have vote weight 0).
+
+  Returns:
+    A dict mapping each SHA256 to either the newly-created Vote entity or the
+    Error which prevented the vote from being cast.
+
+  Raises:
+    InvalidVoteWeightError: if the vote weight is less than zero.
+  """
+  if weight < 0:
+    raise InvalidVoteWeightError(weight)
+
+  # Vote on each Blockable at most once, regardless of repetition.
+  sha256s = sorted(set(sha256s))
+  blockables = ndb.get_multi(
+      ndb.Key(base.Blockable, sha256) for sha256 in sha256s)
+
+  results = {}
+  ballot_boxes = []
+  for sha256, blockable in zip(sha256s, blockables):
+    try:
+      if blockable is None:
+        raise BlockableNotFoundError('SHA256: %s' % sha256)
+      platform = _GetPlatform(blockable)
+    except Error as e:
+      results[sha256] = e
+    else:
+      ballot_boxes.append(
+          _BALLOT_BOX_MAP[platform](sha256, blockable=blockable))
+
+  errors = BallotBox.VoteMulti(ballot_boxes, upvote, user, weight)
+  for ballot_box, error in zip(ballot_boxes, errors):
+    if error is not None:
+      logging.warning(
+          'Failed to vote on blockable %s: %s', ballot_box.blockable_id, error)
+    results[ballot_box.blockable_id] = (
+        ballot_box.new_vote if error is None else error)
+
+  return results
+
+
 def Recount(sha256):
   """Checks votes, state, and rules for the specified Blockable.
 
@@ -194,6 +411,99 @@ def Recount(sha256):
   ballot_box.Recount()
 
 
+def AuditAll():
+  """Audits the voting state of every Blockable, recounting where necessary.
+
+  The Blockables are processed a page at a time in a chain of deferred tasks.
+  """
+  datastore_utils.QueuedPaginatedBatchApply(
+      base.Blockable.query(), _AuditBlockables, page_size=_AUDIT_PAGE_SIZE,
+      queue=constants.TASK_QUEUE.QUERY, keys_only=True)
+
+
+def _AuditBlockables(blockable_keys):
+  """Recounts any of the given Blockables whose voting state is inconsistent.
+
+  The Votes and Rules of all the Blockables are fetched concurrently and checked
+  in memory, so only those Blockables that actually need fixing incur a Recount
+  transaction.
+
+  Args:
+    blockable_keys: list<Key>, The keys of the Blockables to audit.
+
+  Returns:
+    A list of the IDs of the Blockables that were recounted.
+  """
+  blockables = [
+      blockable for blockable in ndb.get_multi(blockable_keys)
+      if blockable is not None]
+
+  # pylint: disable=g-explicit-bool-comparison, singleton-comparison
+  vote_futures = [
+      vote_models.Vote.query(
+          vote_models.Vote.in_effect == True,
+          ancestor=blockable.key).fetch_async()
+      for blockable in blockables]
+  # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+  rule_futures = [
+      _GetRuleProjectionQuery(blockable.key).fetch_async()
+      for blockable in blockables]
+
+  voter_permissions = _VoterPermissions()
+  recounted_ids = []
+  for blockable, vote_future, rule_future in zip(
+      blockables, vote_futures, rule_futures):
+
+    blockable_id = blockable.key.id()
+    platform = blockable.GetPlatformName()
+    if platform not in _BALLOT_BOX_MAP:
+      logging.warning(
+          'Skipping blockable %s with unsupported platform %s', blockable_id,
+          platform)
+      continue
+
+    ballot_box = _BALLOT_BOX_MAP[platform](blockable_id, blockable=blockable)
+    needs_recount = ballot_box._NeedsRecount(  # pylint: disable=protected-access
+        vote_future.get_result(), rule_future.get_result(), voter_permissions)
+    if not needs_recount:
+      continue
+
+    # Don't let a single failure prevent the rest of the page from being
+    # recounted.
+    try:
+      ballot_box.Recount()
+    except Exception:  # pylint: disable=broad-except
+      logging.exception('Failed to recount blockable %s', blockable_id)
+    else:
+      recounted_ids.append(blockable_id)
+
+  logging.info(
+      'Audited %d blockable(s), recounted %d', len(blockables),
+      len(recounted_ids))
+  return recounted_ids
+
+
+def ApplyPendingVotes(sha256):
+  """Applies any PendingVotes to the specified Blockable.
+
+  Args:
+    sha256: The SHA256 of the Blockable whose PendingVotes should be applied.
+
+  Returns:
+    bool, Whether any PendingVotes were applied.
+
+  Raises:
+    BlockableNotFoundError: if the target blockable ID is not a known Blockable.
+    UnsupportedPlatformError: if the specified Blockable has an unsupported
+        platform.
+  """
+  blockable = _GetBlockable(sha256)
+  platform = _GetPlatform(blockable)
+
+  ballot_box = _BALLOT_BOX_MAP[platform](sha256)
+  return ballot_box.ApplyPendingVotes()
+
+
 def Reset(sha256):
   """Resets all policy (i.e. votes, rules, score) for the specified Blockable.
 
@@ -212,6 +522,10 @@ def Reset(sha256):
   ballot_box = _BALLOT_BOX_MAP[platform](sha256)
   ballot_box.Reset()
 
+  # Discard any votes which were cast before the reset but not yet applied.
+  ndb.delete_multi(
+      pending_vote.key for pending_vote in _GetPendingVotes(blockable.key))
+
 
 class BallotBox(object):
   """Class that modifies the voting state of a given Blockable.
@@ -219,20 +533,25 @@ class BallotBox(object):
   Args:
     blockable_id: str, The ID of the Blockable entity on which the vote methods
         will operate.
+    blockable: Blockable, If provided, an already-fetched copy of the Blockable
+        entity which may be used for checks outside of a transaction.
   """
 
   __metaclass__ = abc.ABCMeta
 
-  def __init__(self, blockable_id):
+  def __init__(self, blockable_id, blockable=None):
     self.blockable_id = blockable_id
 
     self._voting_thresholds = settings.VOTING_THRESHOLDS
 
     self.user = None
-    self.blockable = None
+    self.blockable = blockable
     self.old_vote = None
     self.new_vote = None
 
+    self._voter_permissions = _VoterPermissions()
+    self._authorized_host_count_stale = False
+
   def _CheckVotingAllowed(self):
     """Check whether the voting on the blockable is permitted.
 
@@ -265,6 +584,12 @@ class BallotBox(object):
           vote by the user on this blockable existed).
       new_vote: The vote entity of the newly-cast vote.
 
+    If the blockable is too contended to be updated directly, votes from users
+    without the UNFLAG or MARK_MALWARE permissions are instead cast as a
+    PendingVote, outside of the blockable's entity group. In that case, old_vote
+    and new_vote are None, and neither the Votes nor the blockable reflect the
+    vote until a deferred task applies it.
+
     Args:
       was_yes_vote: bool, whether the vote was a 'yes' vote.
       user: User entity representing the person casting the vote.
@@ -279,6 +604,22 @@ class BallotBox(object):
           whitelisted). The possible causes are enumerated in
           VOTING_PROHIBITED_REASONS.
     """
+    self._Vote(was_yes_vote, user, vote_weight=vote_weight)
+
+    # Record Lookup Metrics for the vote.
+    if not isinstance(self.blockable, base.Package):
+      metrics.DeferLookupMetric(
+          self.blockable.key.id(), _GetAnalysisReason(was_yes_vote))
+
+  def _Vote(self, was_yes_vote, user, vote_weight=None):
+    """Performs all of Vote except for the recording of lookup metrics.
+
+    Args:
+      was_yes_vote: bool, whether the vote was a 'yes' vote.
+      user: User entity representing the person casting the vote.
+      vote_weight: int, If provided, the weight with which the vote will be
+          cast.
+    """
     self.user = user
 
     if vote_weight is None:
@@ -295,14 +636,24 @@ class BallotBox(object):
     # or certs (this check can't be run from the transaction).
     self._CheckVotingAllowed()
 
-    self.blockable = _GetBlockable(self.blockable_id)
-    initial_score = self.blockable.score
-    initial_state = self.blockable.state
-
-    # Perform the vote.
-    self._TransactionalVoting(self.blockable_id, was_yes_vote, vote_weight)
+    # Perform the vote. The blockable and the user's prior vote are each read
+    # exactly once, within the voting transaction.
+    try:
+      initial_state, initial_score = self._TransactionalVoting(
+          self.blockable_id, was_yes_vote, vote_weight)
+    except datastore_errors.TransactionFailedError:
+      if not self._CanDeferVote():
+        raise
+      logging.warning(
+          'Voting on blockable %s is contended, casting a pending vote instead',
+          self.blockable_id)
+      self._CastPendingVote(was_yes_vote, vote_weight)
+
+      # The blockable is unchanged until the PendingVote is applied.
+      return
 
-    self.blockable = _GetBlockable(self.blockable_id)
+    # Once the transaction has committed, the in-memory blockable reflects the
+    # persisted state so there's no need to re-read it.
     new_score = self.blockable.score
     new_state = self.blockable.state
 
@@ -334,28 +685,71 @@ class BallotBox(object):
       elif was_yes_vote:
         self._LocallyWhitelist(user_keys=[self.user.key]).get_result()
 
-    # NOTE: Blockable.score is not properly updated by puts executed
-    # within the transaction as the Vote ancestor query in
-    # Blockable._CalculateScore() does not reflect the newly-created Vote
-    # entity. As such, we must 'turn the crank' and force a recount.
-    ndb.transaction(lambda: self.blockable.key.get().put())
-    self.blockable = self.blockable.key.get()
+  @staticmethod
+  def VoteMulti(ballot_boxes, was_yes_vote, user, vote_weight=None):
+    """Resolves votes on several blockables, one at a time.
 
-    # Record Lookup Metrics for the vote.
-    if not isinstance(self.blockable, base.Package):
-      reason = (
-          constants.ANALYSIS_REASON.UPVOTE
-          if was_yes_vote
-          else constants.ANALYSIS_REASON.DOWNVOTE)
-      metrics.DeferLookupMetric(self.blockable.key.id(), reason)
+    Each blockable is voted on in its own transaction so a failure to vote on
+    one doesn't prevent the votes on the others. The votes aren't cast
+    concurrently because the voting transaction blocks on its reads and writes,
+    so running them as tasklets would only nest their event loops. Upon return, each BallotBox
+    which voted successfully is populated as described in Vote.
+
+    Args:
+      ballot_boxes: list<BallotBox>, The BallotBoxes of the target blockables.
+          Each should have been created with its blockable already fetched.
+      was_yes_vote: bool, whether the votes were 'yes' votes.
+      user: User entity representing the person casting the votes.
+      vote_weight: int, If provided, the weight with which the votes will be
+          cast.
+
+    Returns:
+      A list containing, for each BallotBox, None if the vote succeeded or the
+      exception which prevented it.
+    """
+    # The voters of all the blockables are likely to overlap so share the
+    # resolution of their permissions.
+    voter_permissions = _VoterPermissions()
+    for ballot_box in ballot_boxes:
+      ballot_box._voter_permissions = voter_permissions  # pylint: disable=protected-access
+
+    errors = []
+    for ballot_box in ballot_boxes:
+      try:
+        ballot_box._Vote(was_yes_vote, user, vote_weight=vote_weight)  # pylint: disable=protected-access
+      except Exception as e:  # pylint: disable=broad-except
+        errors.append(e)
+      else:
+        errors.append(None)
+
+    # Record Lookup Metrics for all the votes with a single task.
+    metric_blockable_ids = [
+        ballot_box.blockable.key.id()
+        for ballot_box, error in zip(ballot_boxes, errors)
+        if error is None and not isinstance(ballot_box.blockable, base.Package)]
+    if metric_blockable_ids:
+      metrics.DeferLookupMetrics(
+          metric_blockable_ids, _GetAnalysisReason(was_yes_vote))
+
+    return errors
 
   @ndb.transactional(xg=True)
   def _TransactionalVoting(self, blockable_id, was_yes_vote, vote_weight):
-    """Performs part of the voting that should be handled in a transaction."""
+    """Performs part of the voting that should be handled in a transaction.
+
+    Args:
+      blockable_id: str, The ID of the Blockable being voted on.
+      was_yes_vote: bool, whether the vote was a 'yes' vote.
+      vote_weight: int, The weight with which the vote will be cast.
+
+    Returns:
+      A (state, score) tuple of the blockable prior to voting.
+    """
 
     # To accommodate transaction retries, re-get the Blockable entity at the
     # start of each transaction. This ensures up-to-date state+score values.
     self.blockable = _GetBlockable(blockable_id)
+    self._authorized_host_count_stale = False
     self._CheckVotingAllowed()
 
     if isinstance(self.blockable, santa.SantaBundle) and not was_yes_vote:
@@ -365,13 +759,94 @@ class BallotBox(object):
     logging.info('Initial blockable state: %s', initial_state)
 
     initial_score = self.blockable.score
+    initial_flagged = self.blockable.flagged
     self._CreateOrUpdateVote(was_yes_vote, vote_weight)
     assert self.new_vote is not None
 
     new_score = self._GetNewScore(initial_score)
     self._UpdateBlockable(new_score)
 
-    return initial_state
+    if self.blockable.flagged != initial_flagged:
+      self._OnFlaggedChange()
+
+    self._FlushAuthorizedHostCount()
+    return initial_state, initial_score
+
+  def _CanDeferVote(self):
+    """Returns whether the user's vote may be cast as a PendingVote."""
+    return not any(
+        self.user.HasPermissionTo(permission)
+        for permission in _UNDEFERRABLE_VOTER_PERMISSIONS)
+
+  def _CastPendingVote(self, was_yes_vote, vote_weight):
+    """Casts a vote without reading or writing the blockable's entity group.
+
+    Args:
+      was_yes_vote: bool, whether the vote was a 'yes' vote.
+      vote_weight: int, The weight with which the vote will be cast.
+
+    Raises:
+      DuplicateVoteError: The user has already cast the same vote.
+      OperationNotAllowedError: The user may not vote on the blockable.
+    """
+    # Everything in the blockable's entity group is read outside of the
+    # transaction, so that concurrent votes don't cause it to be retried. These
+    # checks are repeated when the vote is applied.
+    self.blockable = _GetBlockable(self.blockable_id)
+    allowed, reason = self.blockable.IsVotingAllowed(current_user=self.user)
+    if not allowed:
+      message = 'Voting on this Blockable is not allowed (%s)' % reason
+      logging.warning(message)
+      raise OperationNotAllowedError(message)
+
+    if isinstance(self.blockable, santa.SantaBundle) and not was_yes_vote:
+      raise OperationNotAllowedError('Downvoting not supported for Bundles')
+
+    vote = vote_models.Vote.GetKey(self.blockable.key, self.user.key).get()
+    self._TransactionalPendingVote(vote, was_yes_vote, vote_weight)
+
+    self.old_vote = None
+    self.new_vote = None
+
+  @ndb.transactional
+  def _TransactionalPendingVote(self, vote, was_yes_vote, vote_weight):
+    """Stores a PendingVote and schedules it to be applied.
+
+    Args:
+      vote: Vote, The user's in-effect vote on the blockable, if any.
+      was_yes_vote: bool, whether the vote was a 'yes' vote.
+      vote_weight: int, The weight with which the vote will be cast.
+
+    Raises:
+      DuplicateVoteError: The user has already cast the same vote.
+    """
+    pending_key = vote_models.PendingVote.GetKey(
+        self.blockable.key, self.user.key)
+    pending_vote = pending_key.get()
+
+    # The user's most recent vote is the pending one, if there is one.
+    latest_vote = pending_vote or vote
+    if latest_vote is not None and latest_vote.was_yes_vote == was_yes_vote:
+      raise DuplicateVoteError(
+          'The user %s has already cast a %s vote for blockable %s' % (
+              self.user.email, was_yes_vote, self.blockable.key.id()))
+
+    # Reverting a pending vote to the one already in effect just cancels it.
+    if vote is not None and vote.was_yes_vote == was_yes_vote:
+      pending_key.delete()
+      return
+
+    vote_models.PendingVote(
+        key=pending_key,
+        blockable_key=self.blockable.key,
+        user_email=self.user.email,
+        was_yes_vote=was_yes_vote,
+        weight=vote_weight).put()
+
+    deferred.defer(
+        ApplyPendingVotes, self.blockable_id,
+        _countdown=_PENDING_VOTE_APPLY_DELAY_SECS,
+        _queue=constants.TASK_QUEUE.DEFAULT, _transactional=True)
 
   def _CreateOrUpdateVote(self, was_yes_vote, vote_weight):
     """Creates a new vote or updates an existing one."""
@@ -425,6 +900,10 @@ class BallotBox(object):
 
   def _UpdateBlockable(self, new_score):
     """Modifies the blockable according to the updated vote score."""
+    # Set the new score first so that any puts or BigQuery rows resulting from
+    # a state change below reflect it.
+    self.blockable.score = new_score
+
     if self.new_vote.was_yes_vote:
       # Unflag the blockable on a privileged upvote.
       if self.blockable.flagged:
@@ -432,7 +911,8 @@ class BallotBox(object):
           self.blockable.flagged = False
         else:
           # Double-checks that there's an extant downvote.
-          _CheckBlockableFlagStatus(self.blockable)
+          _CheckBlockableFlagStatus(
+              self.blockable, voter_permissions=self._voter_permissions)
       # If the blockable is marked SUSPECT, only permit state change if the user
       # is authorized to do so.
       if (self.blockable.state != constants.STATE.SUSPECT or
@@ -446,11 +926,15 @@ class BallotBox(object):
           self.blockable.state not in constants.STATE.SET_BANNED):
         self.blockable.ChangeState(constants.STATE.SUSPECT)
 
-    # NOTE: Blockable.score will not be updated properly for a
-    # newly-cast Vote (i.e. not a changed vote) because the new Vote entity
-    # won't be created until the transaction has been committed.
     self.blockable.put()
 
+  def _OnFlaggedChange(self):
+    """Called within a transaction when the blockable's flagged status changes.
+
+    Subclasses may override this to update state that depends on the flagged
+    status of the target blockable.
+    """
+
   @abc.abstractmethod
   def _GenerateRule(self, **kwargs):
     """Generate the rule for the blockable being voted on.
@@ -462,15 +946,128 @@ class BallotBox(object):
       An un-persisted Rule corresponding to the blockable being voted on.
     """
 
+  def ApplyPendingVotes(self):
+    """Turns any PendingVotes into Votes and applies them to the blockable.
+
+    Returns:
+      bool, Whether any PendingVotes were applied.
+    """
+    self.blockable = _GetBlockable(self.blockable_id)
+    pending_votes = _GetPendingVotes(self.blockable.key)
+
+    # The voters are fetched up front so that their entity groups don't count
+    # against those of the applying transactions.
+    user_keys = list(set(pending_vote.user_key for pending_vote in pending_votes))
+    users_by_key = {
+        user.key: user for user in ndb.get_multi(user_keys) if user is not None}
+
+    applied = False
+    for i in xrange(0, len(pending_votes), _PENDING_VOTE_BATCH_SIZE):
+      pending_keys = [
+          pending_vote.key
+          for pending_vote in pending_votes[i:i + _PENDING_VOTE_BATCH_SIZE]]
+      result = self._TransactionalApplyPendingVotes(pending_keys, users_by_key)
+      if result is None:
+        continue
+      applied = True
+      initial_state, initial_score, yes_voter_keys = result
+
+      new_score = self.blockable.score
+      new_state = self.blockable.state
+
+      if initial_score != new_score:
+        logging.info(
+            'Blockable %s changed score from %d to %d',
+            self.blockable.key.id(), initial_score, new_score)
+
+        self.blockable.InsertBigQueryRow(
+            constants.BLOCK_ACTION.SCORE_CHANGE,
+            timestamp=self.blockable.updated_dt)
+
+      # As when voting, local whitelisting must be handled outside the
+      # transaction.
+      if new_state == constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING:
+        if initial_state != new_state:
+          self._LocallyWhitelist().get_result()
+        elif yes_voter_keys:
+          self._LocallyWhitelist(user_keys=yes_voter_keys).get_result()
+
+    return applied
+
+  @ndb.transactional(xg=True)
+  def _TransactionalApplyPendingVotes(self, pending_keys, users_by_key):
+    """Applies a batch of PendingVotes to the blockable, as Vote would have.
+
+    PendingVotes which are no longer valid (e.g. duplicates, or those on a
+    blockable which can no longer be voted on) are discarded.
+
+    Args:
+      pending_keys: list<Key>, The keys of the PendingVotes to apply.
+      users_by_key: dict<Key, User>, The Users who cast the PendingVotes.
+
+    Returns:
+      A (state, score, yes_voter_keys) tuple, where state and score are those of
+      the blockable prior to applying the PendingVotes, and yes_voter_keys lists
+      the keys of the Users whose "Yes" votes were applied. None if none of the
+      PendingVotes remain.
+    """
+    self.blockable = _GetBlockable(self.blockable_id)
+    self._authorized_host_count_stale = False
+    pending_votes = [
+        pending_vote for pending_vote in ndb.get_multi(pending_keys)
+        if pending_vote is not None]
+    if not pending_votes:
+      return None
+
+    initial_state = self.blockable.state
+    initial_score = self.blockable.score
+    initial_flagged = self.blockable.flagged
+
+    yes_voter_keys = []
+    for pending_vote in pending_votes:
+      self.user = users_by_key.get(pending_vote.user_key)
+      if self.user is None:
+        logging.warning(
+            'Discarding pending vote by unknown user %s',
+            pending_vote.user_email)
+        continue
+
+      try:
+        self._CheckVotingAllowed()
+        self._CreateOrUpdateVote(pending_vote.was_yes_vote, pending_vote.weight)
+      except (DuplicateVoteError, OperationNotAllowedError) as e:
+        logging.warning(
+            'Discarding pending vote by %s: %s', pending_vote.user_email, e)
+        continue
+
+      self._UpdateBlockable(self._GetNewScore(self.blockable.score))
+      if pending_vote.was_yes_vote:
+        yes_voter_keys.append(self.user.key)
+
+    ndb.delete_multi(pending_vote.key for pending_vote in pending_votes)
+
+    if self.blockable.flagged != initial_flagged:
+      self._OnFlaggedChange()
+
+    self._FlushAuthorizedHostCount()
+    return initial_state, initial_score, yes_voter_keys
+
   @ndb.transactional(xg=True)
   def Recount(self):
     """Checks votes, state, and rules for the target blockable."""
     logging.info('Recount for blockable: %s', self.blockable_id)
 
     self.blockable = base.Blockable.get_by_id(self.blockable_id)
+    self._authorized_host_count_stale = False
+
+    # First reconcile the stored score with the votes actually cast.
+    change_made = self._ReconcileScore()
 
     # Then check to see if the blockable should be flagged and if it is.
-    change_made = _CheckBlockableFlagStatus(self.blockable)
+    if _CheckBlockableFlagStatus(
+        self.blockable, voter_permissions=self._voter_permissions):
+      self._OnFlaggedChange()
+      change_made = True
 
     # Check that the blockable's state is set correctly.
     change_made = self._AuditBlockableState() or change_made
@@ -478,6 +1075,7 @@ class BallotBox(object):
     # Finally check that the right rules exist and are in effect.
     # Since this doesn't alter the blockable the change_made flag isn't used.
     self._CheckRules()
+    self._FlushAuthorizedHostCount()
 
     if change_made:
       logging.info(
@@ -488,11 +1086,27 @@ class BallotBox(object):
     else:
       return False
 
+  def _ReconcileScore(self):
+    """Recalculates the blockable's score from its votes and fixes if needed.
+
+    Returns:
+      bool, Whether the stored score was changed.
+    """
+    calculated_score = self.blockable.CalculateScore()
+    if self.blockable.score == calculated_score:
+      return False
+
+    logging.info(
+        'Blockable %s had score %s, but should have %d',
+        self.blockable.key.id(), self.blockable.score, calculated_score)
+    self.blockable.score = calculated_score
+    return True
+
   @abc.abstractmethod
   def _GenerateRemoveRules(self, existing_rules):
     """Creates removal rules to undo all policy for the target blockable."""
 
-  @ndb.transactional
+  @ndb.transactional(xg=True)
   def Reset(self):
     """Resets all policy (i.e. votes, rules, score) for the target blockable.
 
@@ -502,6 +1116,7 @@ class BallotBox(object):
     logging.info('Resetting blockable: %s', self.blockable_id)
 
     self.blockable = base.Blockable.get_by_id(self.blockable_id)
+    self._authorized_host_count_stale = False
 
     votes = self.blockable.GetVotes()
 
@@ -521,52 +1136,65 @@ class BallotBox(object):
     for rule in existing_rules:
       rule.MarkDisabled()
     ndb.put_multi_async(existing_rules)
+    if existing_rules:
+      self._InvalidateAuthorizedHostCount()
 
     # Create REMOVE-type rules from the existing blockable rules.
     self._GenerateRemoveRules(existing_rules)
 
     # Ensure past votes are deleted and then reset the blockable score.
     ndb.Future.wait_all(delete_futures)
+    initial_flagged = self.blockable.flagged
     self.blockable.ResetState()
 
-  def _CheckAndSetBlockableState(self, score):
-    """Checks a blockable's score and changes its state if needed."""
+    if initial_flagged:
+      self._OnFlaggedChange()
+
+    self._FlushAuthorizedHostCount()
+
+  def _GetNewState(self, score):
+    """Determines the state to which the blockable should transition.
 
+    Args:
+      score: int, The score of the blockable.
+
+    Returns:
+      The new state for the blockable, or None if it shouldn't change.
+    """
     # Shortened because 50 characters is a bit much for an identifier
     local_whitelisting = constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING
 
     if score >= self._voting_thresholds[
         constants.STATE.GLOBALLY_WHITELISTED]:
-      if self.blockable.state != constants.STATE.GLOBALLY_WHITELISTED:
-        logging.info(
-            'Setting state for blockable %s to globally whitelisted',
-            self.blockable.key.id())
-        self.blockable.ChangeState(constants.STATE.GLOBALLY_WHITELISTED)
-        self._GloballyWhitelist().get_result()
-        return True
+      new_state = constants.STATE.GLOBALLY_WHITELISTED
     elif (local_whitelisting in self._voting_thresholds and
           score >= self._voting_thresholds[local_whitelisting]):
-      if self.blockable.state != local_whitelisting:
-        logging.info(
-            'Setting state for blockable %s to locally whitelistable.',
-            self.blockable.key.id())
-        self.blockable.ChangeState(local_whitelisting)
-        return True
+      new_state = local_whitelisting
     elif score <= self._voting_thresholds[constants.STATE.BANNED]:
-      if self.blockable.state not in constants.STATE.SET_BANNED:
-        logging.info(
-            'Setting state for blockable %s to banned.',
-            self.blockable.key.id())
-        self.blockable.ChangeState(constants.STATE.BANNED)
-        self._Blacklist().get_result()
-        return True
-    elif self.blockable.state != constants.STATE.UNTRUSTED:
-      logging.info(
-          'Setting state for blockable %s to untrusted.',
-          self.blockable.key.id())
-      self.blockable.ChangeState(constants.STATE.UNTRUSTED)
-      return True
-    return False
+      # Any of the banned states is appropriate for a banning score.
+      if self.blockable.state in constants.STATE.SET_BANNED:
+        return None
+      new_state = constants.STATE.BANNED
+    else:
+      new_state = constants.STATE.UNTRUSTED
+
+    return None if new_state == self.blockable.state else new_state
+
+  def _CheckAndSetBlockableState(self, score):
+    """Checks a blockable's score and changes its state if needed."""
+    new_state = self._GetNewState(score)
+    if new_state is None:
+      return False
+
+    logging.info(
+        'Setting state for blockable %s to %s', self.blockable.key.id(),
+        new_state)
+    self.blockable.ChangeState(new_state)
+    if new_state == constants.STATE.GLOBALLY_WHITELISTED:
+      self._GloballyWhitelist().get_result()
+    elif new_state == constants.STATE.BANNED:
+      self._Blacklist().get_result()
+    return True
 
   @ndb.tasklet
   def _GloballyWhitelist(self):
@@ -581,10 +1209,11 @@ class BallotBox(object):
     # Disable all local or blacklisting rules.
     changed_rules = []
     for rule in existing_rules:
-      if rule.policy not in {constants.RULE_POLICY.WHITELIST,
-                             constants.RULE_POLICY.WHITELIST_COMPILER} or rule.host_id:
+      if rule.policy not in constants.RULE_POLICY.SET_WHITELIST or rule.host_id:
         rule.MarkDisabled()
         changed_rules.append(rule)
+    if changed_rules:
+      self._InvalidateAuthorizedHostCount()
 
     # Create the new globally whitelist rule.
     if self.blockable.is_compiler:
@@ -600,68 +1229,130 @@ class BallotBox(object):
     raise ndb.Return([whitelist_rule])
 
   @ndb.tasklet
-  def _CreateNewLocalWhitelistingRules(self, local_rule_dict):
-    """Creates any missing local Rules for a given Blockable.
+  def _CreateLocalWhitelistingRuleBatch(self, user_host_pairs):
+    """Creates any missing local Rules for a batch of (user, host) pairs.
+
+    NOTE: This should be run in a transaction so that concurrent votes
+    can't create duplicate Rules.
 
     Args:
-      local_rule_dict: A dict which maps user Keys to lists of host IDs
-          belonging to those users. Each (user_key, host_id) pair represents a
-          new local whitelisting Rule to be created for a given Blockable (if
-          one does not already exist).
+      user_host_pairs: list<(Key, str)>, The (user_key, host_id) pairs for
+          which local whitelisting Rules should exist.
 
     Returns:
       A list of newly-created Rules.
     """
-    # Query for all active local whitelisting rules for this blockable.
-    # pylint: disable=g-explicit-bool-comparison, singleton-comparison
-    existing_rule_query = rule_models.Rule.query(
-        rule_models.Rule.policy == constants.RULE_POLICY.WHITELIST,
-        rule_models.Rule.in_effect == True,
-        rule_models.Rule.rule_type == self.blockable.rule_type,
-        ancestor=self.blockable.key)
-    # pylint: enable=g-explicit-bool-comparison, singleton-comparison
-    existing_rules = yield existing_rule_query.fetch_async()
+    # Query for the active local whitelisting rules on this batch's hosts only,
+    # so the cost of each batch doesn't grow with the number of Rules created
+    # by those preceding it.
+    host_ids = sorted({host_id for _, host_id in user_host_pairs})
+    batch_size = _RULE_HOST_IDS_QUERY_BATCH_SIZE
+    query_futures = []
+    for i in xrange(0, len(host_ids), batch_size):
+      # pylint: disable=g-explicit-bool-comparison, singleton-comparison
+      query = rule_models.Rule.query(
+          rule_models.Rule.host_id.IN(host_ids[i:i + batch_size]),
+          rule_models.Rule.in_effect == True,
+          rule_models.Rule.rule_type == self.blockable.rule_type,
+          ancestor=self.blockable.key)
+      # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+      query_futures.append(query.fetch_async())
+    rule_batches = yield query_futures
+    existing_rules = [
+        rule for rules in rule_batches for rule in rules
+        if rule.policy in constants.RULE_POLICY.SET_WHITELIST]
 
     # Create a set of (user_key, host_id) tuples so we can easily determine if a
     # new local rule needs to be created for a given (user_key, host_id) pair.
     existence_set = set((r.user_key, r.host_id) for r in existing_rules)
 
+    if self.blockable.is_compiler:
+      policy = constants.RULE_POLICY.WHITELIST_COMPILER
+    else:
+      policy = constants.RULE_POLICY.WHITELIST
+
     new_rules = []
+    for user_key, host_id in user_host_pairs:
+
+      # If a Rule already exists for this user and host, skip it.
+      if (user_key, host_id) in existence_set:
+        logging.info(
+            'Rule already exists for %s on %s', user_key.id(), host_id)
+
+      # Otherwise, create a new Rule to persist.
+      else:
+        logging.info('Creating new Rule for %s on %s', user_key.id(), host_id)
+        new_rule = self._GenerateRule(
+            policy=policy,
+            in_effect=True,
+            host_id=host_id,
+            user_key=user_key)
+        new_rule.InsertBigQueryRow()
+        new_rules.append(new_rule)
+
+    # Count the hosts which weren't already authorized to run the Blockable.
+    new_host_ids = (
+        set(rule.host_id for rule in new_rules) -
+        set(rule.host_id for rule in existing_rules))
+    if new_host_ids:
+      base.DeferCounterIncrements(
+          constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS,
+          {self.blockable.key: len(new_host_ids)})
+
+    yield ndb.put_multi_async(new_rules)
+    if new_rules:
+      self._OnLocalWhitelistingRulesCreated(new_rules)
+    raise ndb.Return(new_rules)
+
+  def _OnLocalWhitelistingRulesCreated(self, rules):
+    """Called within the transaction in which local Rules are created.
+
+    Local Rules are created in several transactions, so any Rules from earlier
+    batches remain committed if a later batch fails. Subclasses which need to
+    act on the Rules should do so here, so that every committed batch is handled.
+
+    Args:
+      rules: list<Rule>, The newly-created Rules.
+    """
+
+  @ndb.tasklet
+  def _CreateNewLocalWhitelistingRules(self, local_rule_dict):
+    """Creates any missing local Rules for a given Blockable.
 
-    for user_key, host_ids in local_rule_dict.iteritems():
+    The Rules are created in bounded batches, each in its own transaction, so
+    that the size of any one transaction doesn't grow with the number of voters.
+    The batches share an entity group so they're run sequentially rather than
+    concurrently to avoid contention. If a batch fails, the Rules from earlier
+    batches remain committed and have been passed to
+    _OnLocalWhitelistingRulesCreated.
 
+    Args:
+      local_rule_dict: A dict which maps user Keys to lists of host IDs
+          belonging to those users. Each (user_key, host_id) pair represents a
+          new local whitelisting Rule to be created for a given Blockable (if
+          one does not already exist).
+
+    Returns:
+      A list of newly-created Rules.
+    """
+    user_host_pairs = []
+    for user_key, host_ids in sorted(
+        local_rule_dict.iteritems(), key=lambda item: item[0].id()):
       logging.info(
           'Locally whitelisting %s for %s, on the following hosts: %s',
           self.blockable.key.id(), user_key.id(), host_ids)
+      user_host_pairs.extend((user_key, host_id) for host_id in host_ids)
 
-      for host_id in host_ids:
-
-        # If a Rule already exists for this user and host, skip it.
-        if (user_key, host_id) in existence_set:
-          logging.info(
-              'Rule already exists for %s on %s', user_key.id(), host_id)
+    new_rules = []
+    batch_size = _LOCAL_WHITELISTING_RULE_BATCH_SIZE
+    for i in xrange(0, len(user_host_pairs), batch_size):
+      batch = user_host_pairs[i:i + batch_size]
+      batch_rules = yield ndb.transaction_async(
+          functools.partial(self._CreateLocalWhitelistingRuleBatch, batch))
+      new_rules.extend(batch_rules)
 
-        # Otherwise, create a new Rule to persist.
-        else:
-          logging.info('Creating new Rule for %s on %s', user_key.id(), host_id)
-          if self.blockable.is_compiler:
-            policy = constants.RULE_POLICY.WHITELIST_COMPILER
-          else:
-            policy = constants.RULE_POLICY.WHITELIST
-
-          new_rule = self._GenerateRule(
-              policy=policy,
-              in_effect=True,
-              host_id=host_id,
-              user_key=user_key)
-          new_rule.InsertBigQueryRow()
-          new_rules.append(new_rule)
-
-    # Once we've accumulated all the new Rules needed for this Blockable,
-    # persist them all at once.
     logging.info(
-        'Creating %d new Rules for %s', len(new_rules), self.blockable.key.id())
-    yield ndb.put_multi_async(new_rules)
+        'Created %d new Rules for %s', len(new_rules), self.blockable.key.id())
     raise ndb.Return(new_rules)
 
   def _LocallyWhitelist(self, user_keys=None):
@@ -677,22 +1368,41 @@ class BallotBox(object):
     # If no users are specified, default to the voters.
     if not user_keys:
       user_keys = _GetUpvoters(self.blockable)
+    user_keys = sorted(user_keys, key=lambda user_key: user_key.id())
     logging.info(
         'Locally whitelisting %s for the following users: %s',
-        self.blockable.key.id(),
-        sorted([user_key.id() for user_key in user_keys]))
+        self.blockable.key.id(), [user_key.id() for user_key in user_keys])
 
-    # For each user, retrieve a list of assoicated host_ids. Compose a dict
-    # which maps the user to their host_ids. This has to be done outside of the
-    # upcoming transaction, otherwise it would become cross-group.
+    # Resolve the hosts of every user in a single pass, and compose a dict which
+    # maps each user to their host_ids. This has to be done outside of the
+    # upcoming transactions, otherwise they would become cross-group.
+    host_ids_dict = self._GetHostsToWhitelistMulti(user_keys).get_result()
     local_rule_dict = {
-        user_key: sorted(list(self._GetHostsToWhitelist(user_key)))
+        user_key: sorted(host_ids_dict.get(user_key, ()))
         for user_key in user_keys}
 
-    # Initiate a transaction to retrieve any existing local whitelisting rules
-    # for this blockable, and create any that are missing.
-    return ndb.transaction_async(
-        lambda: self._CreateNewLocalWhitelistingRules(local_rule_dict))
+    # Retrieve any existing local whitelisting rules for this blockable, and
+    # create any that are missing.
+    return self._CreateNewLocalWhitelistingRules(local_rule_dict)
+
+  @ndb.tasklet
+  def _GetHostsToWhitelistMulti(self, user_keys):
+    """Returns hosts for which whitelist rules should be created for users.
+
+    By default, the hosts of each user are resolved concurrently. Subclasses
+    whose Hosts can be looked up for many users at once should override this.
+
+    Args:
+      user_keys: list<Key>, The users for whom hosts to whitelist should be
+          fetched.
+
+    Returns:
+      A Future resolving to a dict mapping each user Key to a set<str> of IDs of
+      Hosts for which whitelist rules should be created.
+    """
+    host_id_sets = yield [
+        self._GetHostsToWhitelist(user_key) for user_key in user_keys]
+    raise ndb.Return(dict(zip(user_keys, host_id_sets)))
 
   @abc.abstractmethod
   def _GetHostsToWhitelist(self, user_key):
@@ -702,7 +1412,8 @@ class BallotBox(object):
       user_key: Key, The user for whom hosts to whitelist should be fetched.
 
     Returns:
-      set<str>, IDs of Hosts for which whitelist rules should be created.
+      A Future resolving to a set<str> of IDs of Hosts for which whitelist rules
+      should be created.
     """
 
   @ndb.tasklet
@@ -721,6 +1432,8 @@ class BallotBox(object):
     for rule in existing_rules:
       rule.MarkDisabled()
       changed_rules.append(rule)
+    if changed_rules:
+      self._InvalidateAuthorizedHostCount()
 
     # Create global blacklist rule.
     blacklist_rule = self._GenerateRule(
@@ -734,50 +1447,60 @@ class BallotBox(object):
 
   def _AuditBlockableState(self):
     """Audit the state of a blockable against past voting."""
+    # If the current state is Suspect, make sure there was a no vote from
+    # a qualified user. This does not check to see if a blockable that
+    # is not suspect should be.
     if self.blockable.state == constants.STATE.SUSPECT:
-      # If the current state is Suspect, make sure there was a no vote from
-      # a qualified user. This does not check to see if a blockable that
-      # is not suspect should be.
-      change_made = False
-      sorted_votes = reversed(sorted(
-          self.blockable.GetVotes(), key=lambda vote: vote.recorded_dt))
-      for vote in sorted_votes:
-        user = user_models.User.GetById(vote.user_email)
-        if user.HasPermissionTo(constants.PERMISSIONS.MARK_MALWARE):
-          if vote.was_yes_vote:
-            logging.info(
-                'Blockable %s was suspect, but should not be because there was '
-                'a subsequent authoritative yes vote.',
-                self.blockable.key.id())
-            change_made = self._CheckAndSetBlockableState(
-                self.blockable.score)
-          break
-      else:
-        logging.info(
-            'Blockable %s was suspect, but should not be because no '
-            'authoritative no vote was found.',
-            self.blockable.key.id())
-        change_made = self._CheckAndSetBlockableState(self.blockable.score)
-    # If the blockable is not suspect, just check and set state.
-    else:
-      change_made = self._CheckAndSetBlockableState(self.blockable.score)
-    return change_made
+      if _IsSuspectStateJustified(
+          self.blockable.GetVotes(), self._voter_permissions):
+        return False
+      logging.info(
+          'Blockable %s was suspect, but should not be because no '
+          'authoritative no vote is in effect.', self.blockable.key.id())
 
-  def _CheckRules(self):
-    """Checks that only appropriate rules exist for a blockable."""
-    # pylint: disable=g-explicit-bool-comparison, singleton-comparison
-    all_rules = rule_models.Rule.query(
-        rule_models.Rule.in_effect == True, ancestor=self.blockable.key)
-    # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+    return self._CheckAndSetBlockableState(self.blockable.score)
+
+  def _AuditRules(self, rules):
+    """Determines whether the blockable's rules are appropriate for its state.
+
+    Args:
+      rules: list<Rule>, The in-effect Rules for the blockable.
+
+    Returns:
+      A (rules_to_disable, missing_policy) tuple where rules_to_disable is a
+      list of the Rules which should be marked as not in effect and
+      missing_policy is the RULE_POLICY of a global Rule which should be
+      created, or None if no Rule is missing.
+    """
+    rules_to_disable, global_whitelist_rule_exists, blacklist_rule_exists = (
+        self._ClassifyRules(rules))
+    missing_policy = self._GetMissingPolicy(
+        global_whitelist_rule_exists, blacklist_rule_exists)
+    return rules_to_disable, missing_policy
+
+  def _ClassifyRules(self, rules):
+    """Classifies some of the blockable's rules against its state.
+
+    Only the rule_type, policy, and host_id properties of the Rules are used
+    so projections of the Rules may be provided.
+
+    Args:
+      rules: list<Rule>, A subset of the in-effect Rules for the blockable.
+
+    Returns:
+      A (rules_to_disable, global_whitelist_rule_exists, blacklist_rule_exists)
+      tuple where rules_to_disable is a list of the provided Rules which should
+      be marked as not in effect and the latter two are bools indicating
+      whether an appropriate global Rule of the respective kind was provided.
+    """
     global_whitelist_rule_exists = False
     blacklist_rule_exists = False
-    modified_rules = []
-    for rule in all_rules:
+    rules_to_disable = []
+    for rule in rules:
       # Check to make sure none of the rules that exist are inappropriate.
       if self.blockable.rule_type != rule.rule_type:
         # Make sure the rule is for the right sort of blockable.
-        rule.MarkDisabled()
-        modified_rules.append(rule)
+        rules_to_disable.append(rule)
       elif self.blockable.state == constants.STATE.UNTRUSTED:
         # Untrusted blockables might be locally whitelisted if they were
         # whitelisted when in a different state. They cannot be blacklisted or
@@ -786,9 +1509,8 @@ class BallotBox(object):
           logging.info('Rule %s for blockable %s in state %s found '
                        'and marked not in effect.', rule.key.id(),
                        self.blockable.key.id(), self.blockable.state)
-          rule.MarkDisabled()
-          modified_rules.append(rule)
-      elif rule.policy == constants.RULE_POLICY.WHITELIST:
+          rules_to_disable.append(rule)
+      elif rule.policy in constants.RULE_POLICY.SET_WHITELIST:
         if self.blockable.state in constants.STATE.SET_WHITELISTABLE:
           if not rule.host_id:
             global_whitelist_rule_exists = True
@@ -796,8 +1518,7 @@ class BallotBox(object):
           logging.info('Whitelist rule %s for blockable %s in state %s found '
                        'and marked not in effect.', rule.key.id(),
                        self.blockable.key.id(), self.blockable.state)
-          rule.MarkDisabled()
-          modified_rules.append(rule)
+          rules_to_disable.append(rule)
       else:
         if self.blockable.state in constants.STATE.SET_BANNED:
           blacklist_rule_exists = True
@@ -805,22 +1526,133 @@ class BallotBox(object):
           logging.info('Blacklist rule %s for blockable %s in state %s found '
                        'and marked not in effect.', rule.key.id(),
                        self.blockable.key.id(), self.blockable.state)
-          rule.MarkDisabled()
-          modified_rules.append(rule)
-    ndb.put_multi(modified_rules)
+          rules_to_disable.append(rule)
+
+    return rules_to_disable, global_whitelist_rule_exists, blacklist_rule_exists
 
-    # Check to make sure there is at least one appropriate rule created.
+  def _GetMissingPolicy(
+      self, global_whitelist_rule_exists, blacklist_rule_exists):
+    """Returns the policy of a global Rule missing for the blockable's state.
+
+    Args:
+      global_whitelist_rule_exists: bool, Whether an appropriate global
+          whitelist Rule is in effect for the blockable.
+      blacklist_rule_exists: bool, Whether an appropriate blacklist Rule is in
+          effect for the blockable.
+
+    Returns:
+      The RULE_POLICY of a global Rule which should be created, or None if no
+      Rule is missing.
+    """
+    missing_policy = None
     if (self.blockable.state == constants.STATE.GLOBALLY_WHITELISTED and
         not global_whitelist_rule_exists):
       logging.info('No global whitelist rule for blockable %s in '
                    'state %s.', self.blockable.key.id(), self.blockable.state)
-      self._GloballyWhitelist().get_result()
+      missing_policy = constants.RULE_POLICY.WHITELIST
     elif (self.blockable.state == constants.STATE.BANNED and
           not blacklist_rule_exists):
       logging.info('No blacklist rule for blockable %s in state %s.',
                    self.blockable.key.id(), self.blockable.state)
+      missing_policy = constants.RULE_POLICY.BLACKLIST
+
+    return missing_policy
+
+  def _InvalidateAuthorizedHostCount(self):
+    """Marks the count of hosts authorized to run the Blockable as stale.
+
+    Rules may be disabled wholesale, so rather than decrementing the counter,
+    it's reset and recomputed the next time it's read. The reset itself is
+    deferred by _FlushAuthorizedHostCount.
+    """
+    self._authorized_host_count_stale = True
+
+  def _FlushAuthorizedHostCount(self):
+    """Resets the authorized host count if any Rules changed it.
+
+    This should be called once at the end of each transaction which may change
+    Rules. A transaction may enqueue at most 5 transactional tasks, so the
+    reset is deferred once rather than each time Rules are changed.
+    """
+    if not self._authorized_host_count_stale:
+      return
+    self._authorized_host_count_stale = False
+    base.DeferCounterReset(
+        self.blockable.key, constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS)
+
+  @ndb.tasklet
+  def _DisableRules(self, rule_keys):
+    """Marks the Rules with the given keys as not in effect."""
+    rules = yield ndb.get_multi_async(rule_keys)
+    for rule in rules:
+      rule.MarkDisabled()
+    yield ndb.put_multi_async(rules)
+    self._InvalidateAuthorizedHostCount()
+
+  def _CheckRules(self):
+    """Checks that only appropriate rules exist for a blockable."""
+    # The rules are classified a page at a time using only the properties
+    # needed to do so. Full entities are only loaded for the (usually few)
+    # rules that must be disabled.
+    query = _GetRuleProjectionQuery(self.blockable.key)
+
+    global_whitelist_rule_exists = False
+    blacklist_rule_exists = False
+    disable_futures = []
+    for page in datastore_utils.Paginate(query, page_size=_RULE_PAGE_SIZE):
+      rules_to_disable, page_has_whitelist, page_has_blacklist = (
+          self._ClassifyRules(page))
+      global_whitelist_rule_exists = (
+          global_whitelist_rule_exists or page_has_whitelist)
+      blacklist_rule_exists = blacklist_rule_exists or page_has_blacklist
+      if rules_to_disable:
+        disable_futures.append(
+            self._DisableRules([rule.key for rule in rules_to_disable]))
+
+    for future in disable_futures:
+      future.get_result()
+
+    missing_policy = self._GetMissingPolicy(
+        global_whitelist_rule_exists, blacklist_rule_exists)
+
+    if missing_policy == constants.RULE_POLICY.WHITELIST:
+      self._GloballyWhitelist().get_result()
+    elif missing_policy == constants.RULE_POLICY.BLACKLIST:
       self._Blacklist().get_result()
 
+  def _NeedsRecount(self, votes, rules, voter_permissions):
+    """Determines whether a Recount would modify the blockable or its rules.
+
+    This mirrors the checks performed by Recount, but only operates on
+    already-fetched entities and doesn't modify anything.
+
+    Args:
+      votes: list<Vote>, The in-effect Votes for the blockable.
+      rules: list<Rule>, The in-effect Rules for the blockable.
+      voter_permissions: _VoterPermissions, The resolver for the voters'
+          permissions.
+
+    Returns:
+      bool, Whether a Recount is needed.
+    """
+    score = self.blockable.CalculateScore(votes=votes)
+    if score != self.blockable.score:
+      return True
+
+    should_be_flagged = _ShouldBeFlagged(
+        self.blockable, votes, voter_permissions)
+    if should_be_flagged != self.blockable.flagged:
+      return True
+
+    suspect_state_justified = (
+        self.blockable.state == constants.STATE.SUSPECT and
+        _IsSuspectStateJustified(votes, voter_permissions))
+    if not suspect_state_justified and self._GetNewState(score) is not None:
+      return True
+
+    rules_to_disable, missing_policy = self._AuditRules(rules)
+    return bool(rules_to_disable) or missing_policy is not None
+
 
 class SantaBallotBox(BallotBox):
   """Class that modifies the voting state of a SantaBlockable."""
@@ -842,6 +1674,10 @@ class SantaBallotBox(BallotBox):
       OperationNotAllowedError: The user may not vote on the blockable due to
           one of the VOTING_PROHIBITED_REASONS.
     """
+    # Outside of a transaction, the blockable may not have been fetched yet.
+    if self.blockable is None and not ndb.in_transaction():
+      self.blockable = _GetBlockable(self.blockable_id)
+
     if isinstance(self.blockable, santa.SantaBundle):
       allowed, reason = self.blockable.IsVotingAllowed(
           current_user=self.user,
@@ -853,6 +1689,15 @@ class SantaBallotBox(BallotBox):
     else:
       super(SantaBallotBox, self)._CheckVotingAllowed()
 
+  def _OnFlaggedChange(self):
+    # SantaBundles cache whether any of their binaries or certs are flagged so
+    # those containing this blockable must be told to re-check.
+    if not isinstance(self.blockable, santa.SantaBundle):
+      deferred.defer(
+          santa.SantaBundle.InvalidateFlaggedMemberStatus, self.blockable.key,
+          _queue=constants.TASK_QUEUE.DEFAULT,
+          _transactional=ndb.in_transaction())
+
   def _GenerateRule(self, **kwargs):
     """Generate the rule for the blockable being voted on.
 
@@ -867,6 +1712,7 @@ class SantaBallotBox(BallotBox):
         rule_type=self.blockable.rule_type,
         **kwargs)
 
+  @ndb.tasklet
   def _GetHostsToWhitelist(self, user_key):
     """Returns hosts for which whitelist rules should be created for a user.
 
@@ -877,12 +1723,14 @@ class SantaBallotBox(BallotBox):
       user_key: Key, The user for whom hosts to whitelist should be fetched.
 
     Returns:
-      set<str>, IDs of Hosts for which whitelist rules should be created.
+      A Future resolving to a set<str> of IDs of Hosts for which whitelist rules
+      should be created.
     """
     username = user_utils.EmailToUsername(user_key.id())
     query = host_models.SantaHost.query(
         host_models.SantaHost.primary_user == username)
-    return {host_key.id() for host_key in query.fetch(keys_only=True)}
+    host_keys = yield query.fetch_async(keys_only=True)
+    raise ndb.Return({host_key.id() for host_key in host_keys})
 
   def _LocallyWhitelist(self, user_keys=None):
     future = super(SantaBallotBox, self)._LocallyWhitelist(user_keys=user_keys)
@@ -895,7 +1743,7 @@ class SantaBallotBox(BallotBox):
     removal_rule.put_async()
     removal_rule.InsertBigQueryRow()
 
-  @ndb.transactional
+  @ndb.transactional(xg=True)
   def Reset(self):
     self.blockable = base.Blockable.get_by_id(self.blockable_id)
     if isinstance(self.blockable, santa.SantaBundle):
@@ -948,6 +1796,7 @@ class Bit9BallotBox(BallotBox):
         self._CreateRuleChangeSet, future, constants.RULE_POLICY.WHITELIST)
     return future
 
+  @ndb.tasklet
   def _GetHostsToWhitelist(self, user_key):
     """Returns hosts for which whitelist rules should be created for a user.
 
@@ -958,17 +1807,59 @@ class Bit9BallotBox(BallotBox):
       user_key: Key, The user for whom hosts to whitelist should be fetched.
 
     Returns:
-      set<str>, IDs of Hosts for which whitelist rules should be created.
+      A Future resolving to a set<str> of IDs of Hosts for which whitelist rules
+      should be created.
     """
     username = user_utils.EmailToUsername(user_key.id())
     query = host_models.Bit9Host.query(host_models.Bit9Host.users == username)
-    return {host_key.id() for host_key in query.fetch(keys_only=True)}
+    host_keys = yield query.fetch_async(keys_only=True)
+    raise ndb.Return({host_key.id() for host_key in host_keys})
 
-  def _LocallyWhitelist(self, user_keys=None):
-    future = super(Bit9BallotBox, self)._LocallyWhitelist(user_keys=user_keys)
-    future.add_callback(
-        self._CreateRuleChangeSet, future, constants.RULE_POLICY.WHITELIST)
-    return future
+  @ndb.tasklet
+  def _GetHostsToWhitelistMulti(self, user_keys):
+    """Returns hosts for which whitelist rules should be created for users.
+
+    Rather than querying for each user's Bit9Hosts separately, the Bit9Hosts of
+    all users are fetched with a handful of concurrent IN queries and mapped back
+    to their users. Combined with the RuleChangeSet created for each batch of
+    Rules, this results in a handful of consolidated changes covering every
+    affected host, regardless of the number of voters.
+
+    Args:
+      user_keys: list<Key>, The users for whom hosts to whitelist should be
+          fetched.
+
+    Returns:
+      A Future resolving to a dict mapping each user Key to a set<str> of IDs of
+      Hosts for which whitelist rules should be created.
+    """
+    usernames = {
+        user_utils.EmailToUsername(user_key.id()): user_key
+        for user_key in user_keys}
+    sorted_usernames = sorted(usernames)
+
+    query_futures = []
+    batch_size = _HOST_USERS_QUERY_BATCH_SIZE
+    for i in xrange(0, len(sorted_usernames), batch_size):
+      batch = sorted_usernames[i:i + batch_size]
+      query = host_models.Bit9Host.query(host_models.Bit9Host.users.IN(batch))
+      query_futures.append(query.fetch_async())
+    host_batches = yield query_futures
+
+    host_ids_dict = {user_key: set() for user_key in user_keys}
+    for hosts in host_batches:
+      for host in hosts:
+        for username in host.users:
+          user_key = usernames.get(username)
+          if user_key is not None:
+            host_ids_dict[user_key].add(host.key.id())
+    raise ndb.Return(host_ids_dict)
+
+  def _OnLocalWhitelistingRulesCreated(self, rules):
+    # Creating the RuleChangeSet in the same transaction as its Rules ensures
+    # that no committed Rule is left without a change to send it to Bit9.
+    self._CreateRuleChangeSet(
+        datastore_utils.GetNoOpFuture(rules), constants.RULE_POLICY.WHITELIST)
 
   def _Blacklist(self):
     future = super(Bit9BallotBox, self)._Blacklist()
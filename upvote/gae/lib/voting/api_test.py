@@ -16,6 +16,7 @@
 
 import mock
 
+from google.appengine.api import datastore_errors
 from google.appengine.ext import ndb
 
 from upvote.gae import settings
@@ -86,6 +87,46 @@ class GetRulesForBlockableTest(basetest.UpvoteTestCase):
     self.assertLen(api._GetRulesForBlockable(blockable), in_effect_rule_count)
 
 
+class VoterPermissionsTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(VoterPermissionsTest, self).setUp()
+    self.blockable = test_utils.CreateSantaBlockable()
+    self.user = test_utils.CreateUser()
+    self.admin = test_utils.CreateUser(admin=True)
+    self.votes = [
+        test_utils.CreateVote(self.blockable, user_email=self.user.email),
+        test_utils.CreateVote(self.blockable, user_email=self.admin.email)]
+
+  def testPrefetch(self):
+    get_users = self.Patch(api, '_GetUsers', side_effect=api._GetUsers)
+    voter_permissions = api._VoterPermissions()
+
+    voter_permissions.Prefetch(self.votes)
+    voter_permissions.Prefetch(self.votes)
+    self.assertEqual(1, get_users.call_count)
+
+    self.assertFalse(voter_permissions.HasPermissionTo(
+        self.user.email, constants.PERMISSIONS.MARK_MALWARE))
+    self.assertTrue(voter_permissions.HasPermissionTo(
+        self.admin.email, constants.PERMISSIONS.MARK_MALWARE))
+    self.assertEqual(1, get_users.call_count)
+
+  def testNoPrefetch(self):
+    get_users = self.Patch(api, '_GetUsers', side_effect=api._GetUsers)
+    voter_permissions = api._VoterPermissions()
+
+    for _ in xrange(3):
+      self.assertTrue(voter_permissions.HasPermissionTo(
+          self.admin.email.upper(), constants.PERMISSIONS.MARK_MALWARE))
+    self.assertEqual(1, get_users.call_count)
+
+  def testUnknownVoter(self):
+    voter_permissions = api._VoterPermissions()
+    self.assertFalse(voter_permissions.HasPermissionTo(
+        'nobody@example.com', constants.PERMISSIONS.UNFLAG))
+
+
 class VoteTest(basetest.UpvoteTestCase):
 
   def testInvalidVoteWeightError(self):
@@ -95,6 +136,88 @@ class VoteTest(basetest.UpvoteTestCase):
       with self.LoggedInUser() as user:
         api.Vote(user, sha256, True, -1)
 
+  def testSingleTransactionalRead(self):
+    sha256 = test_utils.RandomSHA256()
+    test_utils.CreateBit9Binary(id=sha256)
+    get_blockable = self.Patch(
+        api, '_GetBlockable', side_effect=api._GetBlockable)
+
+    with self.LoggedInUser() as user:
+      vote = api.Vote(user, sha256, True, 1)
+
+    # One read to determine the platform and one within the transaction.
+    self.assertEqual(2, get_blockable.call_count)
+    self.assertEqual(1, vote.key.parent().parent().get().score)
+
+
+class VoteMultiTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(VoteMultiTest, self).setUp()
+    self.PatchSetting('ENABLE_BINARY_ANALYSIS_PRECACHING', True)
+
+  def testInvalidVoteWeightError(self):
+    blockable = test_utils.CreateSantaBlockable()
+    with self.assertRaises(api.InvalidVoteWeightError):
+      with self.LoggedInUser() as user:
+        api.VoteMulti(user, [blockable.key.id()], True, -1)
+
+  def testSuccess(self):
+    santa_blockable = test_utils.CreateSantaBlockable()
+    bit9_binary = test_utils.CreateBit9Binary()
+    sha256s = [santa_blockable.key.id(), bit9_binary.key.id()]
+
+    with self.LoggedInUser() as user:
+      results = api.VoteMulti(user, sha256s + sha256s, True, 1)
+
+    self.assertSetEqual(set(sha256s), set(results))
+    for sha256 in sha256s:
+      vote = results[sha256]
+      self.assertIsInstance(vote, vote_models.Vote)
+      self.assertEqual(1, base.Blockable.get_by_id(sha256).score)
+
+    # The lookup metrics should be collected by a single task.
+    self.assertTaskCount(constants.TASK_QUEUE.METRICS, 1)
+
+  def testPartialFailure(self):
+    blockable = test_utils.CreateSantaBlockable()
+    voted_blockable = test_utils.CreateSantaBlockable()
+    unknown_sha256 = test_utils.RandomSHA256()
+
+    with self.LoggedInUser() as user:
+      test_utils.CreateVote(voted_blockable, user_email=user.email)
+      results = api.VoteMulti(
+          user,
+          [blockable.key.id(), voted_blockable.key.id(), unknown_sha256],
+          True, 1)
+
+    self.assertIsInstance(results[blockable.key.id()], vote_models.Vote)
+    self.assertIsInstance(
+        results[voted_blockable.key.id()], api.DuplicateVoteError)
+    self.assertIsInstance(results[unknown_sha256], api.BlockableNotFoundError)
+    self.assertEqual(1, blockable.key.get().score)
+
+  def testLocalWhitelisting(self):
+    blockables = test_utils.CreateSantaBlockables(2)
+    user = test_utils.CreateUser()
+    test_utils.CreateSantaHost(primary_user=user.nickname)
+
+    with self.LoggedInUser(user=user):
+      api.VoteMulti(
+          user, [blockable.key.id() for blockable in blockables], True, 1)
+
+    for blockable in blockables:
+      self.assertEqual(
+          constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING,
+          blockable.key.get().state)
+      # pylint: disable=g-explicit-bool-comparison, singleton-comparison
+      rules = rule_models.SantaRule.query(
+          rule_models.SantaRule.in_effect == True,
+          ancestor=blockable.key).fetch()
+      # pylint: enable=g-explicit-bool-comparison, singleton-comparison
+      self.assertLen(rules, 1)
+      self.assertTrue(rules[0].host_id)
+
 
 class BallotBoxTest(basetest.UpvoteTestCase):
 
@@ -166,7 +289,7 @@ class BallotBoxTest(basetest.UpvoteTestCase):
     with self.LoggedInUser(user=user):
       ballot_box.Vote(True, user, vote_weight=self.local_threshold)
 
-    self.assertEqual(self.local_threshold, binary.score)
+    self.assertEqual(self.local_threshold, binary.key.get().score)
 
     rules = api._GetRulesForBlockable(binary)
     self.assertLen(rules, 1)
@@ -193,7 +316,7 @@ class BallotBoxTest(basetest.UpvoteTestCase):
     with self.LoggedInUser() as user:
       ballot_box.Vote(True, user, vote_weight=self.local_threshold)
 
-    self.assertEqual(self.local_threshold, binary.score)
+    self.assertEqual(self.local_threshold, binary.key.get().score)
     self.assertLen(api._GetRulesForBlockable(binary), 0)
     self.assertEqual(0, bit9.RuleChangeSet.query().count())
 
@@ -212,6 +335,10 @@ class BallotBoxTest(basetest.UpvoteTestCase):
 
     self.assertEqual(blockable.score, 1)
 
+    # The ballot box's blockable should reflect the committed state.
+    self.assertEqual(blockable.score, ballot_box.blockable.score)
+    self.assertEqual(blockable.updated_dt, ballot_box.blockable.updated_dt)
+
     self.assertBigQueryInsertions([TABLE.VOTE, TABLE.BINARY], reset_mock=False)
 
     # Verify the score change in BigQuery.
@@ -250,6 +377,23 @@ class BallotBoxTest(basetest.UpvoteTestCase):
       with self.LoggedInUser() as user:
         ballot_box.Vote(False, user)
 
+  def testNoVote_InvalidatesBundles(self):
+    """Flagging a bundled binary invalidates the bundle's cached status."""
+    bundle = test_utils.CreateSantaBundle(
+        bundle_binaries=[self.santa_blockable1])
+    self.assertEqual((False, False), bundle.GetFlaggedMemberStatus())
+
+    ballot_box = api.SantaBallotBox(self.santa_blockable1.key.id())
+    with self.LoggedInUser() as user:
+      ballot_box.Vote(False, user)
+
+    self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    status = santa.BundleFlagStatus.GetKey(bundle.key).get()
+    self.assertIsNotNone(status.changed_dt)
+    self.assertEqual((True, False), bundle.GetFlaggedMemberStatus())
+
   def testFromUser_WithCert(self):
     """Normal vote on signed blockable."""
 
@@ -555,7 +699,8 @@ class BallotBoxTest(basetest.UpvoteTestCase):
 
     users = test_utils.CreateUsers(self.local_threshold)
     with mock.patch.object(
-        ballot_box, '_GetHostsToWhitelist', return_value={'a_host'}):
+        ballot_box, '_GetHostsToWhitelist',
+        return_value=datastore_utils.GetNoOpFuture({'a_host'})):
       for user in users:
         ballot_box.Vote(True, user)
 
@@ -820,6 +965,70 @@ class BallotBoxTest(basetest.UpvoteTestCase):
         [TABLE.BINARY] * num_binary_rows +
         [TABLE.RULE])
 
+  def testLocallyWhitelist_AuthorizedHostCounter(self):
+    blockable = test_utils.CreateSantaBlockable()
+    user = test_utils.CreateUser()
+    hosts = test_utils.CreateSantaHosts(3, primary_user=user.nickname)
+    test_utils.CreateSantaRule(
+        blockable.key,
+        policy=constants.RULE_POLICY.WHITELIST,
+        in_effect=True,
+        rule_type=constants.RULE_TYPE.BINARY,
+        user_key=user.key,
+        host_id=hosts[0].key.id())
+
+    counter = constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS
+    base.BlockableCounterShard.Initialize(blockable.key, counter, 1)
+
+    ballot_box = api.SantaBallotBox(blockable.key.id())
+    for other_user in test_utils.CreateUsers(self.local_threshold - 1):
+      with self.LoggedInUser(user=other_user):
+        ballot_box.Vote(True, other_user)
+    with self.LoggedInUser(user=user):
+      ballot_box.Vote(True, user)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    # Only the hosts which gained a Rule should be counted.
+    self.assertEqual(
+        len(hosts), base.BlockableCounterShard.GetCount(blockable.key, counter))
+
+    # Disabling the Rules should discard the counter.
+    api.SantaBallotBox(blockable.key.id()).Reset()
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+    self.assertIsNone(
+        base.BlockableCounterShard.GetCount(blockable.key, counter))
+
+  def testLocallyWhitelist_AuthorizedHostCounter_Compiler(self):
+    blockable = test_utils.CreateSantaBlockable(is_compiler=True)
+    user = test_utils.CreateUser()
+    hosts = test_utils.CreateSantaHosts(3, primary_user=user.nickname)
+    test_utils.CreateSantaRule(
+        blockable.key,
+        policy=constants.RULE_POLICY.WHITELIST_COMPILER,
+        in_effect=True,
+        rule_type=constants.RULE_TYPE.BINARY,
+        user_key=user.key,
+        host_id=hosts[0].key.id())
+
+    counter = constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS
+    base.BlockableCounterShard.Initialize(blockable.key, counter, 1)
+
+    ballot_box = api.SantaBallotBox(blockable.key.id())
+    for other_user in test_utils.CreateUsers(self.local_threshold - 1):
+      with self.LoggedInUser(user=other_user):
+        ballot_box.Vote(True, other_user)
+    with self.LoggedInUser(user=user):
+      ballot_box.Vote(True, user)
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    # The existing compiler Rule shouldn't be duplicated or counted again.
+    rules = rule_models.SantaRule.query(
+        rule_models.SantaRule.host_id == hosts[0].key.id(),
+        ancestor=blockable.key).fetch()
+    self.assertLen(rules, 1)
+    self.assertEqual(
+        len(hosts), base.BlockableCounterShard.GetCount(blockable.key, counter))
+
   def testLocallyWhitelist_AlteredThreshold(self):
 
     local_threshold = 10
@@ -865,6 +1074,131 @@ class BallotBoxTest(basetest.UpvoteTestCase):
         [TABLE.BINARY] * (num_voters + 1) +
         [TABLE.RULE] * expected_rule_count)
 
+  def testLocallyWhitelist_Batched(self):
+    self.Patch(api, '_LOCAL_WHITELISTING_RULE_BATCH_SIZE', 3)
+    batch_mock = self.Patch(
+        api.SantaBallotBox, '_CreateLocalWhitelistingRuleBatch',
+        autospec=True,
+        side_effect=api.SantaBallotBox._CreateLocalWhitelistingRuleBatch)
+
+    blockable = test_utils.CreateSantaBlockable(
+        state=constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING)
+    users = test_utils.CreateUsers(2)
+    for user in users:
+      for _ in xrange(4):
+        test_utils.CreateSantaHost(primary_user=user.nickname)
+
+    ballot_box = api.SantaBallotBox(blockable.key.id())
+    ballot_box.blockable = blockable
+    rules = ballot_box._LocallyWhitelist(
+        user_keys=[user.key for user in users]).get_result()
+
+    # 8 Rules should be created in batches of 3, 3, and 2.
+    self.assertLen(rules, 8)
+    self.assertEntityCount(rule_models.SantaRule, 8)
+    self.assertEqual(
+        [3, 3, 2], [len(c[0][1]) for c in batch_mock.call_args_list])
+
+    # Re-running shouldn't create any duplicates.
+    rules = ballot_box._LocallyWhitelist(
+        user_keys=[user.key for user in users]).get_result()
+    self.assertLen(rules, 0)
+    self.assertEntityCount(rule_models.SantaRule, 8)
+
+    self.assertBigQueryInsertions([TABLE.RULE] * 8)
+
+  def testLocallyWhitelist_BatchHostsQueriedInChunks(self):
+    self.Patch(api, '_RULE_HOST_IDS_QUERY_BATCH_SIZE', 2)
+
+    blockable = test_utils.CreateSantaBlockable(
+        state=constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING)
+    user = test_utils.CreateUser()
+    hosts = test_utils.CreateSantaHosts(5, primary_user=user.nickname)
+
+    # Only the hosts without a whitelisting Rule should get a new one.
+    for host in hosts[:3]:
+      test_utils.CreateSantaRule(
+          blockable.key, policy=constants.RULE_POLICY.WHITELIST,
+          user_key=user.key, host_id=host.key.id())
+
+    ballot_box = api.SantaBallotBox(blockable.key.id())
+    ballot_box.blockable = blockable
+    rules = ballot_box._LocallyWhitelist(user_keys=[user.key]).get_result()
+
+    self.assertEqual(
+        sorted(host.key.id() for host in hosts[3:]),
+        sorted(rule.host_id for rule in rules))
+    self.assertEntityCount(rule_models.SantaRule, 5)
+
+  def testLocallyWhitelist_Bit9Consolidated(self):
+    self.Patch(api, '_HOST_USERS_QUERY_BATCH_SIZE', 2)
+    query_spy = self.Patch(
+        host_models.Bit9Host, 'query', side_effect=host_models.Bit9Host.query)
+
+    binary = test_utils.CreateBit9Binary(
+        state=constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING)
+    users = test_utils.CreateUsers(3)
+    host1 = test_utils.CreateBit9Host(users=[users[0].nickname])
+    host2 = test_utils.CreateBit9Host(
+        users=[users[0].nickname, users[1].nickname])
+    test_utils.CreateBit9Host(users=['someone_else'])
+
+    ballot_box = api.Bit9BallotBox(binary.key.id())
+    ballot_box.blockable = binary
+    rules = ballot_box._LocallyWhitelist(
+        user_keys=[user.key for user in users]).get_result()
+
+    # The hosts of all 3 users should be resolved with 2 batched queries.
+    self.assertEqual(2, query_spy.call_count)
+
+    expected = {
+        (users[0].key, host1.key.id()),
+        (users[0].key, host2.key.id()),
+        (users[1].key, host2.key.id())}
+    self.assertSetEqual(
+        expected, {(rule.user_key, rule.host_id) for rule in rules})
+
+    # A single change set should cover every affected host.
+    changes = bit9.RuleChangeSet.query().fetch()
+    self.assertLen(changes, 1)
+    self.assertSameElements(
+        [rule.key for rule in rules], changes[0].rule_keys)
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, 1)
+
+    self.assertBigQueryInsertions([TABLE.RULE] * 3)
+
+  def testLocallyWhitelist_Bit9_PartialFailure(self):
+    self.Patch(api, '_LOCAL_WHITELISTING_RULE_BATCH_SIZE', 2)
+    create_batch = api.Bit9BallotBox._CreateLocalWhitelistingRuleBatch
+
+    def _FailSecondBatch(ballot_box, user_host_pairs):
+      if batch_mock.call_count > 1:
+        raise datastore_errors.TransactionFailedError
+      return create_batch(ballot_box, user_host_pairs)
+
+    batch_mock = self.Patch(
+        api.Bit9BallotBox, '_CreateLocalWhitelistingRuleBatch', autospec=True,
+        side_effect=_FailSecondBatch)
+
+    binary = test_utils.CreateBit9Binary(
+        state=constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING)
+    user = test_utils.CreateUser()
+    test_utils.CreateBit9Hosts(4, users=[user.nickname])
+
+    ballot_box = api.Bit9BallotBox(binary.key.id())
+    ballot_box.blockable = binary
+    with self.assertRaises(datastore_errors.TransactionFailedError):
+      ballot_box._LocallyWhitelist(user_keys=[user.key]).get_result()
+
+    # The Rules of the first batch should still be sent to Bit9.
+    rules = rule_models.Bit9Rule.query().fetch()
+    self.assertLen(rules, 2)
+    changes = bit9.RuleChangeSet.query().fetch()
+    self.assertLen(changes, 1)
+    self.assertSameElements(
+        [rule.key for rule in rules], changes[0].rule_keys)
+    self.assertTaskCount(constants.TASK_QUEUE.BIT9_COMMIT_CHANGE, 1)
+
   def testKeyStructure(self):
     ballot_box = api.SantaBallotBox(self.santa_blockable1.key.id())
 
@@ -994,8 +1328,9 @@ class BallotBoxTest(basetest.UpvoteTestCase):
       self.assertFalse(change_made)
       # Don't compare score because it should be lower due to new vote.
       santa_blockable_dict = santa_blockable.to_dict()
-      del original_blockable_dict['score']
-      del santa_blockable_dict['score']
+      for dict_ in (original_blockable_dict, santa_blockable_dict):
+        del dict_['score']
+        del dict_['updated_dt']
       self.assertEqual(original_blockable_dict, santa_blockable_dict)
       self.assertEqual(-1, santa_blockable.score)
 
@@ -1087,6 +1422,7 @@ class BallotBoxTest(basetest.UpvoteTestCase):
     ballot_box = api.SantaBallotBox(santa_blockable.key.id())
     ballot_box.blockable = santa_blockable
 
+    get_users = self.Patch(api, '_GetUsers', side_effect=api._GetUsers)
     with mock.patch.object(ballot_box, '_CheckAndSetBlockableState',
                            return_value=True, autospec=True):
       change_made = ballot_box._AuditBlockableState()
@@ -1094,6 +1430,9 @@ class BallotBoxTest(basetest.UpvoteTestCase):
     self.assertEqual(vote_models.Vote.query().count(), 2)
     self.assertTrue(change_made)
 
+    # Both voters should have been fetched in a single batch.
+    self.assertEqual(1, get_users.call_count)
+
   def testSuspectWithoutNoVoteFromAppropriateUser(self):
     """A blockable improperly marked as suspect."""
     santa_blockable = test_utils.CreateSantaBlockable()
@@ -1372,6 +1711,230 @@ class BallotBoxTest(basetest.UpvoteTestCase):
 
     self.assertFalse(rule.in_effect)
 
+  def testPaged(self):
+    """Rules spanning several pages are classified together."""
+    self.Patch(api, '_RULE_PAGE_SIZE', 2)
+
+    santa_blockable = test_utils.CreateSantaBlockable(
+        state=constants.STATE.GLOBALLY_WHITELISTED)
+
+    # The single global whitelist rule and the blacklist rule which doesn't
+    # belong may land on any page.
+    local_rules = [
+        test_utils.CreateSantaRule(
+            santa_blockable.key, policy=constants.RULE_POLICY.WHITELIST,
+            host_id='host-%d' % i)
+        for i in xrange(3)]
+    whitelist_rule = test_utils.CreateSantaRule(
+        santa_blockable.key, policy=constants.RULE_POLICY.WHITELIST)
+    blacklist_rule = test_utils.CreateSantaRule(
+        santa_blockable.key, policy=constants.RULE_POLICY.BLACKLIST,
+        custom_msg='foo')
+
+    ballot_box = api.SantaBallotBox(santa_blockable.key.id())
+    ballot_box.blockable = santa_blockable
+
+    ballot_box._CheckRules()
+
+    # No new rules should have been created.
+    self.assertEntityCount(rule_models.SantaRule, 5)
+    for rule in local_rules + [whitelist_rule]:
+      self.assertTrue(rule.key.get().in_effect)
+
+    # The full entity should have been rewritten.
+    blacklist_rule = blacklist_rule.key.get()
+    self.assertIsInstance(blacklist_rule, rule_models.SantaRule)
+    self.assertFalse(blacklist_rule.in_effect)
+    self.assertEqual('foo', blacklist_rule.custom_msg)
+
+
+class AuditBlockablesTest(basetest.UpvoteTestCase):
+
+  def testConsistent(self):
+    blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateVotes(blockable, 2)
+    recount = self.Patch(api.BallotBox, 'Recount')
+
+    self.assertEqual([], api._AuditBlockables([blockable.key]))
+    self.assertFalse(recount.called)
+
+  def testScoreOutOfSync(self):
+    blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateVotes(blockable, 2)
+    blockable.score = 0
+    blockable.put()
+
+    self.assertEqual(
+        [blockable.key.id()], api._AuditBlockables([blockable.key]))
+    self.assertEqual(2, blockable.key.get().score)
+
+  def testInappropriateRule(self):
+    blockable = test_utils.CreateSantaBlockable()
+    rule = test_utils.CreateSantaRule(
+        blockable.key, policy=constants.RULE_POLICY.BLACKLIST)
+
+    self.assertEqual(
+        [blockable.key.id()], api._AuditBlockables([blockable.key]))
+    self.assertFalse(rule.key.get().in_effect)
+
+  def testMixed(self):
+    consistent = test_utils.CreateSantaBlockable()
+    inconsistent = test_utils.CreateBit9Binary(flagged=True)
+    unsupported = test_utils.CreateBlockable(flagged=True)
+    missing_key = ndb.Key(base.Blockable, 'doesnotexist')
+
+    recounted_ids = api._AuditBlockables(
+        [consistent.key, inconsistent.key, unsupported.key, missing_key])
+
+    self.assertEqual([inconsistent.key.id()], recounted_ids)
+    self.assertFalse(inconsistent.key.get().flagged)
+    self.assertTrue(unsupported.key.get().flagged)
+
+  def testRecountFailure(self):
+    blockables = [
+        test_utils.CreateSantaBlockable(flagged=True) for _ in xrange(2)]
+    self.Patch(
+        api.BallotBox, 'Recount', autospec=True,
+        side_effect=[Exception, True])
+
+    recounted_ids = api._AuditBlockables(
+        [blockable.key for blockable in blockables])
+
+    self.assertEqual([blockables[1].key.id()], recounted_ids)
+
+  def testAuditAll(self):
+    test_utils.CreateSantaBlockables(3)
+
+    api.AuditAll()
+
+    self.assertTaskCount(constants.TASK_QUEUE.QUERY, 1)
+
+
+class PendingVoteTest(basetest.UpvoteTestCase):
+
+  def setUp(self):
+    super(PendingVoteTest, self).setUp()
+    self.blockable = test_utils.CreateSantaBlockable()
+
+    # Simulate contention on the blockable.
+    self.Patch(
+        api.BallotBox, '_TransactionalVoting',
+        side_effect=datastore_errors.TransactionFailedError)
+
+  def _Vote(self, user, was_yes_vote, vote_weight=1):
+    ballot_box = api.SantaBallotBox(self.blockable.key.id())
+    with self.LoggedInUser(user=user):
+      ballot_box.Vote(was_yes_vote, user, vote_weight=vote_weight)
+    return ballot_box
+
+  def testYesVote(self):
+    user = test_utils.CreateUser()
+    ballot_box = self._Vote(user, True, vote_weight=3)
+
+    # Nothing in the blockable's entity group should be written yet.
+    self.assertIsNone(ballot_box.new_vote)
+    self.assertEntityCount(vote_models.Vote, 0)
+    self.assertEqual(0, self.blockable.key.get().score)
+    pending_vote = vote_models.PendingVote.GetKey(
+        self.blockable.key, user.key).get()
+    self.assertIsNone(pending_vote.key.parent())
+    self.assertEqual(3, pending_vote.weight)
+    self.assertTaskCount(constants.TASK_QUEUE.DEFAULT, 1)
+
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    blockable = self.blockable.key.get()
+    self.assertEqual(3, blockable.score)
+    self.assertEqual(
+        constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING, blockable.state)
+    self.assertIsNotNone(
+        vote_models.Vote.GetKey(self.blockable.key, user.key).get())
+    self.assertEntityCount(vote_models.PendingVote, 0)
+
+  def testNoVote(self):
+    self._Vote(test_utils.CreateUser(), False)
+
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    blockable = self.blockable.key.get()
+    self.assertEqual(-1, blockable.score)
+    self.assertTrue(blockable.flagged)
+    self.assertEqual(constants.STATE.BANNED, blockable.state)
+    self.assertEntityCount(rule_models.SantaRule, 1)
+
+  def testDuplicateVote(self):
+    user = test_utils.CreateUser()
+    self._Vote(user, True)
+
+    with self.assertRaises(api.DuplicateVoteError):
+      self._Vote(user, True)
+
+  def testDuplicateVote_AlreadyApplied(self):
+    user = test_utils.CreateUser()
+    test_utils.CreateVote(self.blockable, user_email=user.email)
+
+    with self.assertRaises(api.DuplicateVoteError):
+      self._Vote(user, True)
+
+  def testChangedVote_Cancelled(self):
+    user = test_utils.CreateUser()
+    test_utils.CreateVote(self.blockable, user_email=user.email)
+    self._Vote(user, False)
+
+    # Changing back to the vote already in effect cancels the pending one.
+    self._Vote(user, True)
+
+    self.assertEntityCount(vote_models.PendingVote, 0)
+
+  def testMultipleVotes_SingleApply(self):
+    for _ in xrange(3):
+      self._Vote(test_utils.CreateUser(), True)
+
+    self.assertTrue(api.ApplyPendingVotes(self.blockable.key.id()))
+    self.assertEqual(3, self.blockable.key.get().score)
+    self.assertEntityCount(vote_models.Vote, 3)
+
+    # The remaining tasks shouldn't have anything left to do.
+    self.assertFalse(api.ApplyPendingVotes(self.blockable.key.id()))
+    self.assertEqual(3, self.blockable.key.get().score)
+
+  def testApply_Batched(self):
+    self.Patch(api, '_PENDING_VOTE_BATCH_SIZE', 2)
+    for _ in xrange(3):
+      self._Vote(test_utils.CreateUser(), True)
+
+    self.assertTrue(api.ApplyPendingVotes(self.blockable.key.id()))
+    self.assertEqual(3, self.blockable.key.get().score)
+
+  def testApply_AlreadyLocallyWhitelisted(self):
+    self.blockable.state = constants.STATE.APPROVED_FOR_LOCAL_WHITELISTING
+    self.blockable.put()
+    user = test_utils.CreateUser()
+    test_utils.CreateSantaHost(primary_user=user.nickname)
+    self._Vote(user, True)
+
+    api.ApplyPendingVotes(self.blockable.key.id())
+
+    # The voter should still get a local whitelist rule.
+    self.assertEntityCount(rule_models.SantaRule, 1)
+
+  def testPrivilegedUser_NotDeferred(self):
+    user = test_utils.CreateUser(admin=True)
+    with self.assertRaises(datastore_errors.TransactionFailedError):
+      self._Vote(user, True)
+
+    self.assertEntityCount(vote_models.Vote, 0)
+    self.assertEntityCount(vote_models.PendingVote, 0)
+
+  def testReset_DiscardsPendingVotes(self):
+    self._Vote(test_utils.CreateUser(), True)
+
+    api.Reset(self.blockable.key.id())
+
+    self.assertEntityCount(vote_models.PendingVote, 0)
+    self.assertFalse(api.ApplyPendingVotes(self.blockable.key.id()))
+    self.assertEqual(0, self.blockable.key.get().score)
+
 
 class RecountTest(basetest.UpvoteTestCase):
 
@@ -1382,10 +1945,64 @@ class RecountTest(basetest.UpvoteTestCase):
     user = test_utils.CreateUser()
     test_utils.CreateVote(
         santa_blockable, user_email=user.email, was_yes_vote=True)
+
+    # Knock the stored score out of sync with the Votes.
+    santa_blockable.score = 0
+    santa_blockable.put()
+
     api.Recount(santa_blockable.key.id())
     santa_blockable = santa_blockable.key.get()
     self.assertEqual(santa_blockable.score, 1)
 
+  def testAuthorizedHostCount_ResetOnce(self):
+    """Disabling Rules across several pages resets the counter only once."""
+    self.Patch(api, '_RULE_PAGE_SIZE', 2)
+    mock_reset = self.Patch(
+        api.base, 'DeferCounterReset', wraps=base.DeferCounterReset)
+
+    # Global Rules aren't appropriate for an untrusted blockable.
+    santa_blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateSantaRules(santa_blockable.key, 12)
+
+    counter = constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS
+    base.BlockableCounterShard.Initialize(santa_blockable.key, counter, 1)
+
+    api.Recount(santa_blockable.key.id())
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertEqual(1, mock_reset.call_count)
+    self.assertIsNone(
+        base.BlockableCounterShard.GetCount(santa_blockable.key, counter))
+
+  def testAuthorizedHostCount_NoRuleChanges(self):
+    mock_reset = self.Patch(api.base, 'DeferCounterReset')
+    santa_blockable = test_utils.CreateSantaBlockable()
+
+    api.Recount(santa_blockable.key.id())
+
+    self.assertFalse(mock_reset.called)
+
+  def testReconcileScore_InSync(self):
+    santa_blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateVote(santa_blockable, was_yes_vote=False)
+
+    ballot_box = api.SantaBallotBox(santa_blockable.key.id())
+    ballot_box.blockable = santa_blockable.key.get()
+
+    self.assertFalse(ballot_box._ReconcileScore())
+    self.assertEqual(-1, ballot_box.blockable.score)
+
+  def testReconcileScore_OutOfSync(self):
+    santa_blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateVotes(santa_blockable, 3)
+
+    ballot_box = api.SantaBallotBox(santa_blockable.key.id())
+    ballot_box.blockable = santa_blockable.key.get()
+    ballot_box.blockable.score = 10
+
+    self.assertTrue(ballot_box._ReconcileScore())
+    self.assertEqual(3, ballot_box.blockable.score)
+
 
 class ResetTest(basetest.UpvoteTestCase):
 
@@ -1436,13 +2053,13 @@ class ResetTest(basetest.UpvoteTestCase):
     with self.LoggedInUser(user=user):
       api.Vote(user, binary.key.id(), True, self.local_threshold)
 
-    self.assertEqual(self.local_threshold, binary.score)
+    self.assertEqual(self.local_threshold, binary.key.get().score)
     self.assertEntityCount(rule_models.Bit9Rule, 1)
     self.assertEntityCount(bit9.RuleChangeSet, 1)
 
     api.Reset(binary.key.id())
 
-    self.assertEqual(0, binary.score)
+    self.assertEqual(0, binary.key.get().score)
 
     self.assertEntityCount(rule_models.Bit9Rule, 2)
     self.assertEntityCount(bit9.RuleChangeSet, 2)
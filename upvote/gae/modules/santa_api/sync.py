@@ -33,7 +33,9 @@ from google.appengine.api import mail
 
 from upvote.gae import settings
 from upvote.gae.bigquery import tables
+from upvote.gae.datastore import metadata_cache
 from upvote.gae.datastore import utils as datastore_utils
+from upvote.gae.datastore.models import base as base_models
 from upvote.gae.datastore.models import host as host_models
 from upvote.gae.datastore.models import rule as rule_models
 from upvote.gae.datastore.models import santa as santa_models
@@ -170,6 +172,11 @@ class BaseSantaApiHandler(handler_utils.UpvoteRequestHandler):
     super(BaseSantaApiHandler, self).dispatch()
 
 
+def _GetRuleCopyKey(rule):
+  """Returns an incomplete key for a copy of a rule on the same Blockable."""
+  return ndb.Key(rule.key.kind(), None, parent=rule.key.parent())
+
+
 def _CopyLocalRules(user_key, dest_host_id):
   """Creates copies of all local rules for the new host."""
 
@@ -196,18 +203,29 @@ def _CopyLocalRules(user_key, dest_host_id):
 
   # Copy the local rules to the new host.
   new_rules = []
+  authorized_host_deltas = {}
   for src_rules in datastore_utils.Paginate(query):
-    for src_rule in src_rules:
-      logging.info('Copying local rule for %s', src_rule.key.parent().id())
-      new_rule = datastore_utils.CopyEntity(
-          src_rule, new_parent=src_rule.key.parent(), host_id=dest_host_id,
-          user_key=user_key)
+    page_rules = datastore_utils.CopyEntities(
+        src_rules, key_func=_GetRuleCopyKey, host_id=dest_host_id,
+        user_key=user_key)
+    for new_rule in page_rules:
+      logging.info('Copying local rule for %s', new_rule.key.parent().id())
       new_rules.append(new_rule)
       new_rule.InsertBigQueryRow()
+      if (new_rule.in_effect and
+          new_rule.policy in constants.RULE_POLICY.SET_WHITELIST):
+        authorized_host_deltas[new_rule.key.parent()] = 1
 
   logging.info('Copying %d rule(s) to host %s', len(new_rules), dest_host_id)
-  futures = ndb.put_multi_async(new_rules)
-  return datastore_utils.GetMultiFuture(futures)
+  return _PutCopiedRules(new_rules, authorized_host_deltas)
+
+
+@ndb.tasklet
+def _PutCopiedRules(new_rules, authorized_host_deltas):
+  """Puts copied rules, then counts the hosts they newly authorize."""
+  yield ndb.put_multi_async(new_rules)
+  base_models.DeferCounterIncrements(
+      constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS, authorized_host_deltas)
 
 
 class PreflightHandler(BaseSantaApiHandler):
@@ -507,9 +525,8 @@ class EventUploadHandler(BaseSantaApiHandler):
 
     event_keys = model_utils.GetEventKeysToInsert(
         dbevent, usernames, [host.primary_user])
-    events = [
-        datastore_utils.CopyEntity(dbevent, new_key=event_key)
-        for event_key in event_keys]
+    events = datastore_utils.CopyEntities(
+        [dbevent] * len(event_keys), new_keys=event_keys)
 
     for event in events:
       if event.event_type in constants.EVENT_TYPE.SET_BLOCKED_TYPES:
@@ -539,7 +556,7 @@ class EventUploadHandler(BaseSantaApiHandler):
     certs = itertools.chain.from_iterable(
         cls._GenerateCertificatesFromJsonEvent(event) for event in json_events)
     unique_cert_map = {cert.key: cert for cert in certs}
-    existing_certs = yield ndb.get_multi_async(unique_cert_map.keys())
+    existing_certs = yield metadata_cache.GetMultiAsync(unique_cert_map.keys())
     unknown_certs = [
         cert
         for cert, existing in zip(unique_cert_map.values(), existing_certs)
@@ -562,13 +579,16 @@ class EventUploadHandler(BaseSantaApiHandler):
     # is transactional and, consequently, may be retried with the same
     # parameters in the event of a failure. If we modify the event objects in
     # place, subsequent retries will see the changes made by previous attempts.
-    event_copies = [
-        datastore_utils.CopyEntity(event, new_key=event.key)
-        for event in events]
+    event_copies = datastore_utils.CopyEntities(
+        events, key_func=lambda event: event.key)
     existing_events = yield ndb.get_multi_async(event.key for event in events)
+    new_events = []
     for event, existing_event in zip(event_copies, existing_events):
       if existing_event:
         event.Dedupe(existing_event)
+      else:
+        new_events.append(event)
+    base_models.DeferCountNewEvents(new_events)
     yield ndb.put_multi_async(event_copies)
 
   @classmethod
@@ -775,14 +795,38 @@ class EventUploadHandler(BaseSantaApiHandler):
 
   @classmethod
   def _CreateEvents(cls, events):
-    """Create each users' Events asynchronously in their own transactions."""
+    """Creates new Events and buffers updates to existing ones.
+
+    Each users' new Events are created asynchronously in their own
+    transactions. Updates to Events which already exist are buffered as
+    EventUpdates and applied in bulk later, so that an Event which is reported
+    on every sync doesn't incur a transactional read-modify-write each time.
+
+    Args:
+      events: list<SantaEvent>, The Events generated from this upload.
+
+    Returns:
+      A list of Futures which resolve once the Events are persisted.
+    """
     futures = []
     distinct_events = santa_models.SantaEvent.DedupeMultiple(events)
-    unique_user_keys = {event.user_key for event in events}
+    existing_events = ndb.get_multi([event.key for event in distinct_events])
+    new_events = []
+    updated_events = []
+    for event, existing_event in zip(distinct_events, existing_events):
+      if existing_event is None:
+        new_events.append(event)
+      else:
+        updated_events.append(event)
+
+    if updated_events:
+      futures.append(base_models.EventUpdate.BufferAsync(updated_events))
+
+    unique_user_keys = {event.user_key for event in new_events}
     for user_key in unique_user_keys:
       events_for_user = [
           event
-          for event in distinct_events
+          for event in new_events
           if event.user_key == user_key]
       futures.append(cls._DedupeExistingAndPut(events_for_user))
     return futures
@@ -865,9 +909,9 @@ class EventUploadHandler(BaseSantaApiHandler):
     # Determine which blockables are already known to Upvote.
     unique_blockable_keys = set(blockable_event_map.keys())
     existing_blockable_keys = {
-        blockable.key
-        for blockable in ndb.get_multi(list(unique_blockable_keys))
-        if blockable}
+        metadata.key
+        for metadata in metadata_cache.GetMulti(unique_blockable_keys)
+        if metadata}
     unknown_blockable_keys = unique_blockable_keys - existing_blockable_keys
 
     # Create previously unknown blockables.
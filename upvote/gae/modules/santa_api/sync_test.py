@@ -26,6 +26,7 @@ from google.appengine.ext import ndb
 from upvote.gae import settings
 from upvote.gae.datastore import test_utils
 from upvote.gae.datastore import utils as datastore_utils
+from upvote.gae.datastore.models import base as base_models
 from upvote.gae.datastore.models import host as host_models
 from upvote.gae.datastore.models import rule as rule_models
 from upvote.gae.datastore.models import santa as santa_models
@@ -249,6 +250,60 @@ class CopyLocalRulesTest(SantaApiTestCase):
 
     self.assertBigQueryInsertions([TABLE.RULE] * blockable_count)
 
+  def testAuthorizedHostCounter(self):
+    user = test_utils.CreateUser()
+    now = datetime.datetime.utcnow()
+    host_1 = test_utils.CreateSantaHost(
+        primary_user=user.nickname, last_postflight_dt=now)
+    host_2 = test_utils.CreateSantaHost(
+        primary_user=user.nickname, last_postflight_dt=now)
+
+    counter = constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS
+    blockables = test_utils.CreateSantaBlockables(2)
+    policies = [
+        constants.RULE_POLICY.WHITELIST,
+        constants.RULE_POLICY.WHITELIST_COMPILER]
+    for blockable, policy in zip(blockables, policies):
+      test_utils.CreateSantaRule(
+          blockable.key, policy=policy, host_id=host_1.key.id(),
+          user_key=user.key)
+      base_models.BlockableCounterShard.Initialize(blockable.key, counter, 1)
+
+    sync._CopyLocalRules(user.key, host_2.key.id()).get_result()
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    # Compiler rules authorize hosts just as whitelisting rules do.
+    for blockable in blockables:
+      self.assertEqual(
+          2, base_models.BlockableCounterShard.GetCount(blockable.key, counter))
+
+  def testAuthorizedHostCounter_PutFailure(self):
+    user = test_utils.CreateUser()
+    now = datetime.datetime.utcnow()
+    host_1 = test_utils.CreateSantaHost(
+        primary_user=user.nickname, last_postflight_dt=now)
+    host_2 = test_utils.CreateSantaHost(
+        primary_user=user.nickname, last_postflight_dt=now)
+
+    counter = constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS
+    blockable = test_utils.CreateSantaBlockable()
+    test_utils.CreateSantaRule(
+        blockable.key, policy=constants.RULE_POLICY.WHITELIST,
+        host_id=host_1.key.id(), user_key=user.key)
+    base_models.BlockableCounterShard.Initialize(blockable.key, counter, 1)
+
+    failed_future = ndb.Future()
+    failed_future.set_exception(Exception('put failed'))
+    self.Patch(sync.ndb, 'put_multi_async', return_value=[failed_future])
+
+    with self.assertRaises(Exception):
+      sync._CopyLocalRules(user.key, host_2.key.id()).get_result()
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    # The counter shouldn't be incremented for rules which weren't persisted.
+    self.assertEqual(
+        1, base_models.BlockableCounterShard.GetCount(blockable.key, counter))
+
 
 class PreflightHandlerTest(SantaApiTestCase):
 
@@ -909,15 +964,35 @@ class EventUploadHandlerTest(SantaApiTestCase):
 
     self.assertEqual(1, santa_models.SantaEvent.query().count())
 
+    # The updates to the existing Event should be buffered until flushed.
+    self.assertEntityCount(base_models.EventUpdate, 2)
+    base_models.FlushEventUpdates()
+    self.assertEntityCount(base_models.EventUpdate, 0)
+
     parent = ndb.Key(user_models.User, user_utils.UsernameToEmail('user'),
                      host_models.SantaHost, 'my-uuid',
                      santa_models.SantaBlockable, 'the-sha256')
     event = santa_models.SantaEvent.query(ancestor=parent).get()
+    self.assertEqual(3, event.count)
     expected_time = datetime.datetime.utcfromtimestamp(latest_timestamp)
     self.assertEqual(expected_time, event.last_blocked_dt)
 
     self.assertBigQueryInsertions([TABLE.BINARY] + [TABLE.EXECUTION] * 3)
 
+  def testMultipleEvents_UniqueEventCounter(self):
+    blockable_key = ndb.Key(santa_models.SantaBlockable, 'the-sha256')
+    counter = constants.BLOCKABLE_COUNTER.UNIQUE_EVENTS
+    base_models.BlockableCounterShard.Initialize(blockable_key, counter, 0)
+
+    # Only the first upload should create a new Event.
+    event = self._CreateEvent('the-sha256')
+    for _ in xrange(2):
+      self.testapp.post_json('/my-uuid', {EVENT_UPLOAD.EVENTS: [event]})
+    self.DrainTaskQueue(constants.TASK_QUEUE.DEFAULT)
+
+    self.assertEqual(
+        1, base_models.BlockableCounterShard.GetCount(blockable_key, counter))
+
   def testMultipleEvents_DifferentUserTxns(self):
     self.PatchSetting(
         'EVENT_CREATION', constants.EVENT_CREATION.EXECUTING_USER)
@@ -959,6 +1034,7 @@ class EventUploadHandlerTest(SantaApiTestCase):
 
     request_json = {EVENT_UPLOAD.EVENTS: [event3, event4]}
     self.testapp.post_json('/my-uuid', request_json)
+    base_models.FlushEventUpdates()
 
     self.assertEqual(2, santa_models.SantaEvent.query().count())
 
@@ -342,13 +342,21 @@ class AuthorizedHostCountHandler(handler_utils.UserFacingHandler):
 
     if blockable.state == constants.STATE.GLOBALLY_WHITELISTED:
       self.respond_json(-1)
-    else:
+      return
+
+    counter = constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS
+    num_hosts = base_models.BlockableCounterShard.GetCount(
+        blockable.key, counter)
+
+    # If the counter hasn't been initialized, or has been reset since, count
+    # the hosts directly and seed the counter with the result.
+    if num_hosts is None:
       # NOTE: This should really be a projection on SantaRule.host_id
       # but this is not currently supported due to an issue in ndb:
       # https://github.com/GoogleCloudPlatform/datastore-ndb-python/issues/261
 
       rule_query = rule_models.SantaRule.query(
-          rule_models.SantaRule.policy == constants.RULE_POLICY.WHITELIST,
+          rule_models.SantaRule.policy.IN(constants.RULE_POLICY.SET_WHITELIST),
           rule_models.SantaRule.in_effect == True,  # pylint: disable=g-explicit-bool-comparison, singleton-comparison
           rule_models.SantaRule.rule_type == blockable.rule_type,
           ancestor=blockable.key)
@@ -356,9 +364,11 @@ class AuthorizedHostCountHandler(handler_utils.UserFacingHandler):
       # Fetch used here should be fine as the number of rules returned shouldn't
       # greatly exceed the global whitelist vote threshold (currently 50).
       rules = rule_query.fetch()
-      authorized_hosts = {rule.host_id for rule in rules}
+      num_hosts = len({rule.host_id for rule in rules})
+      base_models.BlockableCounterShard.Initialize(
+          blockable.key, counter, num_hosts)
 
-      self.respond_json(len(authorized_hosts))
+    self.respond_json(num_hosts)
 
 
 class UniqueEventCountHandler(handler_utils.UserFacingHandler):
@@ -381,7 +391,16 @@ class UniqueEventCountHandler(handler_utils.UserFacingHandler):
           explanation=(
               'Unsupported Blockable type: %s' % type(blockable).__name__))
 
-    num_events = query.count()
+    counter = constants.BLOCKABLE_COUNTER.UNIQUE_EVENTS
+    num_events = base_models.BlockableCounterShard.GetCount(
+        blockable.key, counter)
+
+    # If the counter hasn't been initialized, count the Events directly and
+    # seed the counter with the result.
+    if num_events is None:
+      num_events = query.count()
+      base_models.BlockableCounterShard.Initialize(
+          blockable.key, counter, num_events)
 
     self.respond_json(num_events)
 
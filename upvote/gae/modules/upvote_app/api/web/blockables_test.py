@@ -431,9 +431,7 @@ class BlockableHandlerTest(BlockablesTest):
   def testPost_Admin_RecountThenReset(self):
     """Test private reset method."""
 
-    # Create a vote and trigger a recount on the blockable to update the score.
     test_utils.CreateVote(self.santa_blockable)
-    self.santa_blockable.put()
 
     # Ensure Vote properly updated the blockable score.
     with self.LoggedInUser(admin=True):
@@ -588,6 +586,35 @@ class AuthorizedHostCountHandlerTest(BlockablesTest):
 
       self.assertEqual(expected, output)
 
+  def testGet_CompilerRules(self):
+    test_utils.CreateSantaRule(
+        self.santa_blockable.key,
+        policy=constants.RULE_POLICY.WHITELIST_COMPILER,
+        host_id='host1')
+
+    with self.LoggedInUser(admin=True):
+      response = self.testapp.get(self.ROUTE % self.santa_blockable.key.id())
+      output = response.json
+
+      self.assertEqual(1, output)
+
+  def testGet_Counter(self):
+    test_utils.CreateSantaRule(
+        self.santa_blockable.key,
+        policy=constants.RULE_POLICY.WHITELIST,
+        host_id='host1')
+
+    with self.LoggedInUser(admin=True):
+      self.assertEqual(1, self.testapp.get(
+          self.ROUTE % self.santa_blockable.key.id()).json)
+
+      # Subsequent reads should be served from the initialized counter.
+      base.BlockableCounterShard.IncrementMulti(
+          constants.BLOCKABLE_COUNTER.AUTHORIZED_HOSTS,
+          {self.santa_blockable.key: 2})
+      self.assertEqual(3, self.testapp.get(
+          self.ROUTE % self.santa_blockable.key.id()).json)
+
   def testGet_BlockableNotFoundError(self):
     with self.LoggedInUser(admin=True):
       self.testapp.get(
@@ -637,6 +664,20 @@ class UniqueEventCountHandlerTest(BlockablesTest):
 
     self.assertEqual(1, output)
 
+  def testGet_Counter(self):
+    test_utils.CreateSantaEvent(self.santa_blockable)
+
+    with self.LoggedInUser():
+      self.assertEqual(1, self.testapp.get(
+          self.ROUTE % self.santa_blockable.key.id()).json)
+
+      # Subsequent reads should be served from the initialized counter.
+      base.BlockableCounterShard.IncrementMulti(
+          constants.BLOCKABLE_COUNTER.UNIQUE_EVENTS,
+          {self.santa_blockable.key: 1})
+      self.assertEqual(2, self.testapp.get(
+          self.ROUTE % self.santa_blockable.key.id()).json)
+
   def testGet_BlockableNotFoundError(self):
     self.santa_blockable.key.delete()
     with self.LoggedInUser():
@@ -159,6 +159,34 @@ class EventQueryHandlerTest(EventsTest):
     self.assertIsInstance(output, dict)
     self.assertLen(output['content'], 6)
 
+  def testAdminGetListAllEvents_Summary(self):
+    params = {'asAdmin': 'true', 'summary': 'true'}
+
+    with self.LoggedInUser(admin=True):
+      response = self.testapp.get(self.ROUTE, params)
+
+    output = response.json
+
+    self.assertLen(output['content'], 6)
+    for event in output['content']:
+      self.assertIn('lastBlockedDt', event)
+      self.assertNotIn('filePath', event)
+
+  def testAdminGetListAllEvents_SummaryWithContext(self):
+    params = {'asAdmin': 'true', 'summary': 'true', 'withContext': 'true'}
+
+    with self.LoggedInUser(admin=True):
+      response = self.testapp.get(self.ROUTE, params)
+
+    # The entities within each context dict should be summarized.
+    output = response.json
+    self.assertLen(output['content'], 6)
+    for context in output['content']:
+      self.assertIn('lastBlockedDt', context['event'])
+      self.assertNotIn('filePath', context['event'])
+      self.assertIn('state', context['blockable'])
+      self.assertNotIn('isVotingAllowed', context['blockable'])
+
   def testAdminGetListAllEventsWithBlockable(self):
     """Admin user getting list of all events for a blockable_id."""
     params = {'blockableKey': self.santa_blockable1.key.urlsafe(),
@@ -276,6 +304,38 @@ class EventQueryHandlerTest(EventsTest):
         if dict_['blockable']['id'] == self.santa_blockable2.key.id()][0]
     self.assertIsNone(event2['vote'])
 
+  def testUserGetListOwnEvents_ListPage(self):
+    """The request made by the web UI's list page is summarized."""
+    test_utils.CreateVote(
+        self.santa_blockable1, user_email=self.user_1.email,
+        was_yes_vote=True)
+
+    params = {'perPage': '10', 'withContext': 'true', 'summary': 'true'}
+    with self.LoggedInUser(user=self.user_1):
+      response = self.testapp.get(self.ROUTE, params)
+
+    content = response.json['content']
+    self.assertLen(content, 4)
+
+    context = [
+        dict_ for dict_ in content
+        if dict_['blockable']['id'] == self.santa_blockable1.key.id()][0]
+
+    # Everything the list page displays should be present...
+    blockable = context['blockable']
+    self.assertEqual('Product.app', blockable['fileName'])
+    self.assertIn('SantaBlockable', blockable['class_'])
+    self.assertEqual(
+        constants.PLATFORM.MACOS, blockable['operatingSystemFamily'])
+    self.assertIn('state', blockable)
+    self.assertIn('state', context['cert'])
+    self.assertIn('hostname', context['host'])
+    self.assertTrue(context['vote']['wasYesVote'])
+
+    # ...but the fields computed by the full entities' to_dict() shouldn't be.
+    self.assertNotIn('isVotingAllowed', blockable)
+    self.assertNotIn('filePath', context['event'])
+
   def testUserGetListOwnEventsWithBlockable(self):
     """Normal user getting list of their events with a blockable param."""
     params = {'blockableKey': self.santa_blockable1.key.urlsafe()}
@@ -82,6 +82,18 @@ class HostQueryHandlerTest(HostsTest):
     self.assertIsInstance(output['content'], list)
     self.assertLen(output['content'], 4)
 
+  def testAdminGetList_Summary(self):
+    with self.LoggedInUser(admin=True):
+      response = self.testapp.get(self.ROUTE + '/santa', {'summary': 'true'})
+
+    output = response.json
+
+    self.assertLen(output['content'], 3)
+    for host in output['content']:
+      self.assertIn('hostname', host)
+      self.assertIn('id', host)
+      self.assertNotIn('serialNum', host)
+
   def testAdminGetListPlatform(self):
     """Admin gets a list of all hosts specific to a single platform."""
 
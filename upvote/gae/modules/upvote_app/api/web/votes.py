@@ -33,6 +33,18 @@ from upvote.gae.utils import xsrf_utils
 from upvote.shared import constants
 
 
+# The maximum number of blockables which may be voted on in a single request.
+_MAX_BULK_VOTE_COUNT = 100
+
+# The HTTP statuses reported for errors encountered when bulk voting.
+_BULK_VOTE_ERROR_STATUSES = {
+    voting_api.BlockableNotFoundError: httplib.NOT_FOUND,
+    voting_api.UnsupportedPlatformError: httplib.BAD_REQUEST,
+    voting_api.DuplicateVoteError: httplib.CONFLICT,
+    voting_api.OperationNotAllowedError: httplib.FORBIDDEN,
+}
+
+
 def _PopulateCandidateId(votes):
   vote_dicts = []
   for vote in votes:
@@ -88,8 +100,8 @@ class VoteHandler(handler_utils.UserFacingHandler):
       self.abort(httplib.NOT_FOUND, explanation='Vote not found.')
 
 
-class VoteCastHandler(handler_utils.UserFacingHandler):
-  """Handler for casting votes."""
+class _BaseVoteCastHandler(handler_utils.UserFacingHandler):
+  """Base class for handlers which cast votes."""
 
   def _GetVoteWeight(self, role):
     if not role:
@@ -111,6 +123,10 @@ class VoteCastHandler(handler_utils.UserFacingHandler):
 
     return vote_weight
 
+
+class VoteCastHandler(_BaseVoteCastHandler):
+  """Handler for casting votes."""
+
   @xsrf_utils.RequireToken
   def post(self, blockable_id):
     """Handle votes from users."""
@@ -161,8 +177,69 @@ class VoteCastHandler(handler_utils.UserFacingHandler):
     self.respond_json(vote)
 
 
+class BulkVoteCastHandler(_BaseVoteCastHandler):
+  """Handler for casting votes on several blockables at once."""
+
+  @xsrf_utils.RequireToken
+  def post(self):
+    """Handle bulk votes from users."""
+
+    blockable_ids = self.request.get_all('blockableIds')
+    if not blockable_ids:
+      self.abort(httplib.BAD_REQUEST, explanation='No blockable IDs provided')
+    elif len(blockable_ids) > _MAX_BULK_VOTE_COUNT:
+      self.abort(
+          httplib.BAD_REQUEST,
+          explanation='At most %d blockables may be voted on at once' % (
+              _MAX_BULK_VOTE_COUNT))
+
+    was_yes_vote = (self.request.get('wasYesVote') == 'true')
+    role = self.request.get('asRole', default_value=self.user.highest_role)
+    vote_weight = self._GetVoteWeight(role)
+
+    logging.info(
+        'User %s is using the %s role to cast %s%s votes for %d blockable(s)',
+        self.user.nickname, role, '+' if was_yes_vote else '-', vote_weight,
+        len(blockable_ids))
+
+    try:
+      results = voting_api.VoteMulti(
+          self.user, blockable_ids, was_yes_vote, vote_weight)
+    except voting_api.InvalidVoteWeightError:
+      self.abort(httplib.BAD_REQUEST, explanation='Invalid voting weight')
+    except Exception as e:  # pylint: disable=broad-except
+      self.abort(httplib.INTERNAL_SERVER_ERROR, explanation=e.message)
+
+    votes = {}
+    errors = {}
+    for blockable_id, result in results.iteritems():
+      if isinstance(result, Exception):
+        errors[blockable_id] = {
+            'status': _BULK_VOTE_ERROR_STATUSES.get(
+                type(result), httplib.INTERNAL_SERVER_ERROR),
+            'message': result.message}
+      else:
+        votes[blockable_id] = result
+
+    # Update the user's last vote date
+    if votes:
+      self.user.last_vote_dt = datetime.datetime.utcnow()
+      self.user.put()
+
+    blockables = ndb.get_multi(
+        ndb.Key(base_models.Blockable, blockable_id)
+        for blockable_id in votes)
+    self.respond_json({
+        'blockables': blockables,
+        'votes': votes,
+        'errors': errors})
+
+
 # The Webapp2 routes defined for these handlers.
 ROUTES = routes.PathPrefixRoute('/votes', [
+    webapp2.Route(
+        '/cast',
+        handler=BulkVoteCastHandler),
     webapp2.Route(
         '/cast/<blockable_id>',
         handler=VoteCastHandler),
@@ -381,5 +381,73 @@ class VoteCastHandlerTest(VotesTest):
     self.assertEqual(self.vote_2.key.urlsafe(), response.json['key'])
 
 
+class BulkVoteCastHandlerTest(VotesTest):
+
+  ROUTE = '/votes/cast'
+
+  def testPost_Success(self):
+    blockables = test_utils.CreateSantaBlockables(3)
+    params = [('wasYesVote', 'true')] + [
+        ('blockableIds', blockable.key.id()) for blockable in blockables]
+
+    with self.LoggedInUser(email_addr=self.user_2.email):
+      response = self.testapp.post(self.ROUTE, params)
+
+    output = response.json
+    self.assertIn('application/json', response.headers['Content-type'])
+    self.assertLen(output['blockables'], 3)
+    self.assertLen(output['votes'], 3)
+    self.assertEqual({}, output['errors'])
+    for blockable in blockables:
+      self.assertTrue(output['votes'][blockable.key.id()]['wasYesVote'])
+    self.assertIsNotNone(self.user_2.key.get().last_vote_dt)
+
+  def testPost_PartialFailure(self):
+    unknown_id = test_utils.RandomSHA256()
+    params = [
+        ('wasYesVote', 'true'),
+        ('blockableIds', self.santa_blockable.key.id()),
+        ('blockableIds', self.other_blockable.key.id()),
+        ('blockableIds', unknown_id)]
+
+    # user_1 has already upvoted both of the existing blockables.
+    with self.LoggedInUser(email_addr=self.user_1.email):
+      response = self.testapp.post(self.ROUTE, params)
+
+    output = response.json
+    self.assertEqual({}, output['votes'])
+    self.assertEqual(
+        httplib.CONFLICT,
+        output['errors'][self.santa_blockable.key.id()]['status'])
+    self.assertEqual(
+        httplib.NOT_FOUND, output['errors'][unknown_id]['status'])
+
+  def testPost_NoBlockableIds(self):
+    with self.LoggedInUser():
+      self.testapp.post(
+          self.ROUTE, params={'wasYesVote': 'true'},
+          status=httplib.BAD_REQUEST)
+
+  def testPost_TooManyBlockableIds(self):
+    self.Patch(votes, '_MAX_BULK_VOTE_COUNT', 1)
+    params = [
+        ('wasYesVote', 'true'),
+        ('blockableIds', self.santa_blockable.key.id()),
+        ('blockableIds', self.other_blockable.key.id())]
+
+    with self.LoggedInUser():
+      self.testapp.post(self.ROUTE, params, status=httplib.BAD_REQUEST)
+
+  @mock.patch.object(
+      votes.voting_api, 'VoteMulti',
+      side_effect=voting_api.InvalidVoteWeightError)
+  def testPost_InvalidVoteWeightError(self, mock_vote):
+    with self.LoggedInUser():
+      self.testapp.post(
+          self.ROUTE,
+          params={'wasYesVote': 'true', 'blockableIds': 'foo'},
+          status=httplib.BAD_REQUEST)
+
+
 if __name__ == '__main__':
   basetest.main()
@@ -83,7 +83,12 @@ upvote.listpage.BlockableListController = class {
   loadItems_(numItems, opt_cursor) {
     let deferred = this.q_.defer();
     let queryArgs = Object.assign(
-        {'cursor': opt_cursor, 'perPage': numItems, 'withContext': true},
+        {
+          'cursor': opt_cursor,
+          'perPage': numItems,
+          'withContext': true,
+          'summary': true,
+        },
         this.getQueryFilters());
     this.eventQueryResource_['getPage'](queryArgs)['$promise']
         .then((newPage) => {
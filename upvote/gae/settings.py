@@ -46,6 +46,16 @@ ENABLE_BINARY_ANALYSIS_PRECACHING = False
 # See docs for further discussion.
 EVENT_CREATION = constants.EVENT_CREATION.HOST_OWNER
 
+# The number of days after which Events that haven't recurred are rolled up into
+# summaries and deleted by the /cron/retention/enforce cron. Events are retained
+# regardless while their Host has an open Exemption, or while their Blockable is
+# still seeing voting activity. Set to None to retain Events indefinitely.
+EVENT_RETENTION_DAYS = 365
+
+# The number of days after which Votes that have been archived (i.e. are no
+# longer in effect) are deleted. Set to None to retain them indefinitely.
+ARCHIVED_VOTE_RETENTION_DAYS = 365
+
 # The default execution mode for clients syncing for the first time.
 SANTA_DEFAULT_CLIENT_MODE = constants.SANTA_CLIENT_MODE.LOCKDOWN
 # If provided, a regex string that matches execution paths (read: not files)
@@ -184,6 +194,14 @@ AD_DOMAIN = 'TODO-EXAMPLE-DOMAIN'
 # NOTE: Must be all lowercase.
 AD_HOSTNAME = 'ad.todo-example-domain.com'
 
+# **Bit9-only** The number of event ID ranges pulled from Bit9 concurrently.
+#
+# When set to 1, events are pulled by a single sequential task. Larger values
+# split the outstanding backlog into disjoint ID ranges which are each pulled by
+# their own task on the bit9-pull-range queue, which can help to catch up on a
+# large backlog.
+BIT9_PULL_RANGE_COUNT = 1
+
 # NOTE: Incomplete.
 # Sets a static alert (aka "blood bar") for all users of the system to
 # communicate abnormal system conditions.
@@ -24,6 +24,10 @@ from upvote.shared import constants
 _COMMIT_KEY = 'DO-COMMIT'
 _DELAYED_TASKS = {}
 
+# The URL and headers with which the deferred library handles its tasks.
+_DEFERRED_URL = '/_ah/queue/deferred'
+_DEFERRED_HEADERS = {'Content-Type': 'application/octet-stream'}
+
 
 def QueueSize(queue=constants.TASK_QUEUE.DEFAULT, deadline=10):
   queue = taskqueue.Queue(name=queue)
@@ -38,3 +42,49 @@ def CappedDefer(
   if can_defer:
     deferred.defer(callable_obj, _queue=queue, *args, **kwargs)
   return can_defer
+
+
+def CreateDeferredTask(callable_obj, *args, **kwargs):
+  """Creates, but doesn't add, a Task which runs a callable like defer() does.
+
+  Unlike deferred.defer(), the Task can then be added in a batch with others.
+
+  Args:
+    callable_obj: The callable to run.
+    *args: Positional arguments to pass to the callable.
+    **kwargs: Keyword arguments to pass to the callable. Those prefixed with an
+        underscore (e.g. _name, _countdown) are instead passed to the Task.
+
+  Returns:
+    The new taskqueue.Task.
+  """
+  task_kwargs = {
+      key[1:]: kwargs.pop(key) for key in kwargs.keys() if key.startswith('_')}
+  payload = deferred.serialize(callable_obj, *args, **kwargs)
+  return taskqueue.Task(
+      payload=payload, url=_DEFERRED_URL, headers=_DEFERRED_HEADERS,
+      **task_kwargs)
+
+
+def AddTasks(tasks, queue=constants.TASK_QUEUE.DEFAULT):
+  """Adds Tasks to a queue in as few calls as possible.
+
+  Named Tasks which already exist, or did recently, are skipped.
+
+  Args:
+    tasks: list<taskqueue.Task>, The Tasks to add.
+    queue: str, The queue to which the Tasks should be added.
+
+  Returns:
+    The number of Tasks which were added.
+  """
+  queue = taskqueue.Queue(name=queue)
+  added_count = 0
+  for i in xrange(0, len(tasks), taskqueue.MAX_TASKS_PER_ADD):
+    batch = tasks[i:i + taskqueue.MAX_TASKS_PER_ADD]
+    try:
+      queue.add(batch)
+    except (taskqueue.TaskAlreadyExistsError, taskqueue.TombstonedTaskError):
+      pass
+    added_count += sum(1 for task in batch if task.was_enqueued)
+  return added_count
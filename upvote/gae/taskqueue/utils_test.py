@@ -14,6 +14,7 @@
 
 """Tests for taskqueue_utils."""
 
+from google.appengine.api import taskqueue
 from google.appengine.ext import deferred
 
 from upvote.gae.lib.testing import basetest
@@ -46,6 +47,37 @@ class CappedDeferTest(basetest.UpvoteTestCase):
     self.assertEqual(expected_results, actual_results)
 
 
+class CreateDeferredTaskTest(basetest.UpvoteTestCase):
+
+  def testSuccess(self):
+    task = utils.CreateDeferredTask(_FreeFunction, a=1, _name='task-name')
+    self.assertEqual('task-name', task.name)
+
+    utils.AddTasks([task])
+    self.assertTaskCount(_DEFAULT, 1)
+    self.assertEqual(
+        [(_FreeFunction, (), {'a': 1})], self.UnpackTaskQueue())
+
+
+class AddTasksTest(basetest.UpvoteTestCase):
+
+  def testBatches(self):
+    task_count = taskqueue.MAX_TASKS_PER_ADD + 1
+    tasks = [utils.CreateDeferredTask(dir) for _ in xrange(task_count)]
+
+    self.assertEqual(task_count, utils.AddTasks(tasks, queue=_METRICS))
+    self.assertTaskCount(_METRICS, task_count)
+
+  def testNamedDuplicates(self):
+    utils.AddTasks([utils.CreateDeferredTask(dir, _name='a')])
+    tasks = [
+        utils.CreateDeferredTask(dir, _name='a'),
+        utils.CreateDeferredTask(dir, _name='b')]
+
+    self.assertEqual(1, utils.AddTasks(tasks))
+    self.assertTaskCount(_DEFAULT, 2)
+
+
 _DEFAULT = constants.TASK_QUEUE.DEFAULT
 _METRICS = constants.TASK_QUEUE.METRICS
 
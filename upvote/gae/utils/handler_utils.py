@@ -346,6 +346,41 @@ def _CoerceQueryParam(field, query_param):
     return query_param
 
 
+def _Summarize(value):
+  """Reduces an entity, or the entities in a dict, to their summaries.
+
+  Entities whose models don't declare SUMMARY_PROPERTIES are left whole.
+
+  Args:
+    value: A query result, or the result of a callback applied to one.
+
+  Returns:
+    The summarized value.
+  """
+  if isinstance(value, dict):
+    return {name: _Summarize(item) for name, item in value.iteritems()}
+  elif (isinstance(value, ndb.Model) and
+        getattr(value, 'SUMMARY_PROPERTIES', None) is not None):
+    return value.ToSummaryDict()
+  return value
+
+
+def _GetSummaryCallback(callback=None):
+  """Returns a query page callback which summarizes its results.
+
+  Args:
+    callback: func(entities), If provided, a callback to apply to the query
+        results before they're summarized.
+
+  Returns:
+    The summarizing callback.
+  """
+  def _Callback(entities):
+    results = callback(entities) if callback else entities
+    return [_Summarize(result) for result in results]
+  return _Callback
+
+
 class UserFacingQueryHandler(UserFacingHandler):
   """Base handler class for model queries.
 
@@ -387,10 +422,18 @@ class UserFacingQueryHandler(UserFacingHandler):
     parameter. The searchBase parameter differentiates the two queries because
     an empty searchBase will never yield a valid field query.
 
+    If the summary query parameter is true, each entity in the response is
+    reduced to the summary declared by its model. This includes the entities
+    returned by the callback (e.g. those in a context dict), as the summaries
+    are only taken once it has run.
+
     Args:
       callback: func(entity), If provided, the callback to apply to each query
           result.
     """
+    if self.request.get('summary').lower() == 'true':
+      callback = _GetSummaryCallback(callback)
+
     search_base = self.request.get('searchBase', None)
     search_term = self.request.get('search', None)
 
@@ -303,6 +303,8 @@ RULE_POLICY.DefineSet('BIT9', [
 RULE_POLICY.DefineSet('SANTA', [
     RULE_POLICY.WHITELIST, RULE_POLICY.BLACKLIST, RULE_POLICY.REMOVE,
     RULE_POLICY.WHITELIST_COMPILER])
+RULE_POLICY.DefineSet('WHITELIST', [
+    RULE_POLICY.WHITELIST, RULE_POLICY.WHITELIST_COMPILER])
 
 
 EXEMPTION_REASON = UppercaseNamespace(names=[
@@ -414,6 +416,10 @@ BLOCK_ACTION = UppercaseNamespace(names=[
     'FIRST_SEEN', 'SCORE_CHANGE', 'STATE_CHANGE',
     'RESET', 'COMMENT', 'UPLOADED'])
 
+# The statistics about Blockables which are maintained in sharded counters.
+BLOCKABLE_COUNTER = UppercaseNamespace(names=[
+    'UNIQUE_EVENTS', 'AUTHORIZED_HOSTS'])
+
 USER_ACTION = UppercaseNamespace(names=[
     'FIRST_SEEN', 'ROLE_CHANGE', 'COMMENT'])
 
@@ -438,6 +444,9 @@ TASK_QUEUE = Namespace(tuples=[
     # Used for pulling new events out of Bit9.
     ('BIT9_PULL', 'bit9-pull'),
 
+    # Used for pulling disjoint ranges of events out of Bit9 concurrently.
+    ('BIT9_PULL_RANGE', 'bit9-pull-range'),
+
     # Used for dispatching event processing tasks onto bit9-event-process.
     ('BIT9_DISPATCH', 'bit9-dispatch'),
 